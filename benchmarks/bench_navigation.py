@@ -0,0 +1,53 @@
+"""
+Compares mobs that each search a path to the player with mobs that follow one shared distance field to the player.
+
+Run with ``python -m benchmarks.bench_navigation``.
+"""
+import contextlib
+import io
+import time
+
+import numpy as np
+
+from klistam.world import HEIGHT, WIDTH
+from klistam.world.create_world import LOAD_RADIUS, World
+from klistam.world.navigation import UNREACHABLE, Navigation
+
+MOBS = 200
+SEED = 500
+
+
+def main() -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        world = World.generate(SEED)
+    navigation = Navigation(world)
+    assert world.player and world.player.position
+    player = world.player.position
+    # The terrain only, so that both sides see the same fields.
+    distances = navigation.distance_field([player], avoid_mobs=False)
+    reachable = np.flatnonzero(distances.distances != UNREACHABLE)
+    rng = np.random.default_rng(0)
+    starts = [distances.window.coordinates(int(index)) for index in rng.choice(reachable, MOBS)]
+    # Within the scene of the player and its neighbours, as find_path looks no further.
+    starts = [start for start in starts if max(abs(start[0] // WIDTH - player.scene[0]),
+                                               abs(start[1] // HEIGHT - player.scene[1])) <= 1]
+
+    start_time = time.perf_counter()
+    for start in starts:
+        navigation.find_path(start, player, avoid_mobs=False)
+    searches = time.perf_counter() - start_time
+
+    navigation = Navigation(world)
+    start_time = time.perf_counter()
+    distances = navigation.distance_field([player], LOAD_RADIUS, avoid_mobs=False)
+    field_time = time.perf_counter() - start_time
+    xs, ys = np.array(starts).T
+    start_time = time.perf_counter()
+    distances.steps(xs, ys)
+    steps = time.perf_counter() - start_time
+    print(f"{len(starts)} mobs: A* each {searches * 1e3:.1f} ms, distance field {field_time * 1e3:.1f} ms "
+          f"+ steps {steps * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Compares encounters as Mob objects in the scenes with encounters in a MobStore, at a spawn rate high enough to fill
+the loaded scenes, and ticks a world whose store holds encounters all over the explored area.
+
+Run with ``python -m benchmarks.bench_population``.
+"""
+import contextlib
+import io
+
+import numpy as np
+
+from klistam import headless
+from klistam.klista import CLASSES
+from klistam.world import HEIGHT, WIDTH
+from klistam.world.create_world import ENCOUNTER_TIME, World
+from klistam.world.mob import Sprite
+from klistam.world.mob_store import ENCOUNTER, MobStore
+
+SPAWN_RATE = 2.
+TICKS = 2000
+# Side length in scenes of the area that is filled with encounters.
+AREA = 20
+FILL = 0.5
+
+
+def main() -> None:
+    for mob_store in (False, True):
+        result = headless.run(500, TICKS, mob_store=mob_store, spawn_rate=SPAWN_RATE)
+        print(f"{'mob store' if mob_store else 'mob objects'}: {result.ticks_per_second:.0f} ticks/s with "
+              f"{result.mobs} mobs, spawn {result.phases['spawn'] / TICKS * 1e6:.0f} µs, "
+              f"expire {result.phases['expire'] / TICKS * 1e6:.0f} µs per tick")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        world = World.generate(500)
+    world.mob_store = store = MobStore()
+    rng = np.random.default_rng(0)
+    cells = rng.choice(AREA * WIDTH * AREA * HEIGHT, size=int(FILL * AREA * WIDTH * AREA * HEIGHT), replace=False)
+    x, y = cells % (AREA * WIDTH) - AREA * WIDTH // 2, cells // (AREA * WIDTH) - AREA * HEIGHT // 2
+    # Keep the fields around the player free.
+    free = (np.abs(x - WIDTH // 2) > 2) | (np.abs(y - HEIGHT // 2) > 2)
+    start = rng.uniform(-ENCOUNTER_TIME, 0, size=free.sum())
+    # Through the world, which marks the fields of the scenes in memory as occupied.
+    world.store_mobs(x[free], y[free], ENCOUNTER, store.sprite_id_of(Sprite("encounter")), CLASSES.id_of("wood_idol"),
+                     start, start + ENCOUNTER_TIME)
+    live = len(store)
+    result = headless.simulate(world, TICKS)
+    print(f"prefilled mob store: {result.ticks_per_second:.0f} ticks/s with {live} to {len(store)} encounters, "
+          f"expire {result.phases['expire'] / TICKS * 1e6:.0f} µs per tick")
+
+
+if __name__ == "__main__":
+    main()
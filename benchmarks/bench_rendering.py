@@ -0,0 +1,70 @@
+"""
+Compares full redraws with dirty-rectangle rendering, while the player walks through the world, and measures the
+camera that scrolls with the player across scene borders in a world crowded with encounters.
+
+Run with ``python -m benchmarks.bench_rendering``. Set SDL_VIDEODRIVER to measure on a real display; by default the
+dummy driver is used, which makes pygame.display.update itself almost free.
+"""
+import contextlib
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from klistam.game import Game
+from klistam.world.mob import DIRECTIONS
+from klistam.world.mob_store import MobStore
+
+FRAMES = 2000
+# How many times more encounters spawn for the camera than in the game.
+CROWD = 50
+
+
+def run(game: Game, camera: bool = False) -> tuple[float, float]:
+    """Render FRAMES frames as fast as possible and return the wall and CPU time per frame. With camera, the view
+    follows the player in steps of a frame instead of showing the scene of the player."""
+    player = game.world.player
+    assert player and player.position
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _frame in range(FRAMES):
+        if not player.movement:
+            game.world.walk(player, DIRECTIONS["right"])
+        player.advance_movement()
+        game.world.tick()
+        if camera:
+            game.camera.follow(player)
+            dirty = game.scene_view.draw_view(game.screen, game.world, game.camera)
+        else:
+            dirty = game.scene_view.draw(game.screen, game.world.get_player_scene())
+        if dirty is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty)
+    return (time.perf_counter() - wall) / FRAMES, (time.process_time() - cpu) / FRAMES
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as folder:
+        for name, dirty_rendering, camera in (("full redraw", False, False), ("dirty rectangles", True, False),
+                                              ("scrolling camera", True, True)):
+            with contextlib.redirect_stdout(io.StringIO()):
+                # A new world, not the save of the player.
+                game = Game.create(dirty_rendering=dirty_rendering, save_path=Path(folder) / "world.sav")
+                if camera:
+                    game.world.mob_store = MobStore()
+                    game.world.spawn_rate *= CROWD
+                wall, cpu = run(game, camera)
+                mobs = sum(1 for _mob in game.world.get_mobs_in_rect(*game.camera.get_fields()))
+            game.world.close()
+            pygame.quit()
+            print(f"{name}: {1 / wall:.0f} FPS, {cpu * 1000:.2f} ms CPU per frame"
+                  + (f", {mobs} mobs in view at the end" if camera else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Load test of the world server: many players on localhost who keep walking in random directions. Reports how long it
+takes until the server acknowledges a walk in a tick message, and how long the ticks of the server take.
+
+Run with ``python -m benchmarks.bench_server --players 300``. Without ``--connect host:port``, a server is started.
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from collections.abc import Sequence
+from itertools import count
+
+import numpy as np
+
+from klistam.server import percentiles
+from klistam.world.mob import DIRECTIONS
+
+PLAYERS = 300
+SECONDS = 10.
+# The mean time between two walks of a player. A walk of one field takes 20 ticks, half a second.
+WALK_INTERVAL = 0.5
+
+
+async def play(host: str, port: int, seconds: float, seed: int, latencies: list[float], received: list[int]) -> None:
+    """Connect as a player and walk around for a while, recording the time until each walk is acknowledged."""
+    reader, writer = await asyncio.open_connection(host, port)
+    rng = np.random.default_rng(seed)
+    sent: dict[int, float] = {}
+
+    async def read() -> None:
+        while line := await reader.readline():
+            received.append(len(line))
+            now = time.perf_counter()
+            for walk_id in json.loads(line).get("ack", ()):
+                latencies.append(now - sent.pop(walk_id))
+
+    reading = asyncio.create_task(read())
+    end = time.perf_counter() + seconds
+    names = list(DIRECTIONS)
+    for walk_id in count():
+        if time.perf_counter() > end:
+            break
+        sent[walk_id] = time.perf_counter()
+        writer.write(json.dumps({"type": "walk", "direction": names[rng.integers(len(names))], "id": walk_id}).encode()
+                     + b"\n")
+        await asyncio.sleep(rng.uniform(0.5, 1.5) * WALK_INTERVAL)
+    writer.close()
+    reading.cancel()
+
+
+async def request_stats(host: str, port: int) -> dict:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'{"type": "stats"}\n')
+    while (message := json.loads(await reader.readline()))["type"] != "stats":
+        pass
+    writer.close()
+    return message
+
+
+async def load_test(host: str, port: int, players: int, seconds: float) -> None:
+    latencies: list[float] = []
+    received: list[int] = []
+    await asyncio.gather(*(play(host, port, seconds, seed, latencies, received) for seed in range(players)))
+    stats = await request_stats(host, port)
+    acknowledged = percentiles(latencies)
+    print(f"{players} players for {seconds:.0f} s: {len(latencies)} walks, "
+          f"{len(received) / seconds / players:.1f} messages and {sum(received) / seconds / players / 1024:.1f} KiB "
+          f"per player and second")
+    print("until acknowledged: " + ", ".join(f"{name} {value:.1f} ms" for name, value in acknowledged.items()))
+    print(f"server ticks ({stats['ticks']}, {stats['scenes']} scenes): "
+          + ", ".join(f"{name} {value:.1f} ms" for name, value in stats["tick_ms"].items()))
+
+
+def main(args: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--players", type=int, default=PLAYERS)
+    parser.add_argument("--seconds", type=float, default=SECONDS)
+    parser.add_argument("--connect", help="host:port of a running server")
+    options = parser.parse_args(args)
+    server = None
+    if options.connect:
+        host, port = options.connect.rsplit(":", 1)
+    else:
+        server = subprocess.Popen([sys.executable, "-m", "klistam.server", "--port", "0"], stdout=subprocess.PIPE,
+                                  text=True)
+        assert server.stdout
+        host, port = server.stdout.readline().split()[-1].rsplit(":", 1)
+    try:
+        asyncio.run(load_test(host, int(port), options.players, options.seconds))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
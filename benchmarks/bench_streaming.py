@@ -0,0 +1,76 @@
+"""
+Walks the player across several scene borders and reports how long the game loop waits for scene generation, with
+scenes generated synchronously in World.get_scene and with the SceneLoader prefetching them in the background.
+
+Run with ``python -m benchmarks.bench_streaming``.
+"""
+import contextlib
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from attrs import define
+
+from klistam.world import WIDTH
+from klistam.world.create_world import Scene, World
+from klistam.world.loader import SceneLoader
+from klistam.world.mob import DIRECTIONS
+
+STEPS = 3 * WIDTH
+# Leaves the loader the idle time of a frame at 40 FPS.
+FRAME_SLEEP = 0.02
+
+
+@define
+class TimedWorld(World):
+    """Records the time that get_scene spends on scenes that are not in the world yet."""
+    wait_time: float = 0.
+
+    def get_scene(self, coord: tuple[int, int]) -> Scene:
+        if coord in self._scenes:
+            return self._scenes[coord]
+        start = time.perf_counter()
+        scene = super().get_scene(coord)
+        self.wait_time += time.perf_counter() - start
+        return scene
+
+
+def walk_right(world: TimedWorld) -> tuple[list[float], list[float]]:
+    """Return the durations of all ticks and the time waited for scenes at each border crossing."""
+    player = world.player
+    assert player and player.position
+    durations, crossings = [], []
+    for _step in range(STEPS):
+        scene = player.position.scene
+        world.wait_time = 0.
+        world.walk(player, DIRECTIONS["right"])
+        while player.movement:
+            start = time.perf_counter()
+            world.tick()
+            durations.append(time.perf_counter() - start)
+            player.advance_movement()
+            time.sleep(FRAME_SLEEP)
+        if player.position.scene != scene:
+            crossings.append(world.wait_time)
+    return durations, crossings
+
+
+def main() -> None:
+    for name, make_loader in (("synchronous", None),
+                              ("thread loader", SceneLoader),
+                              ("process loader", lambda gen: SceneLoader(gen, ProcessPoolExecutor(max_workers=2)))):
+        world = TimedWorld.generate(500)
+        if make_loader:
+            world.loader = make_loader(world.generator)
+        with contextlib.redirect_stdout(io.StringIO()):
+            world.tick()
+            durations, crossings = walk_right(world)
+        world.close()
+        millis = np.array(durations) * 1000
+        print(f"{name}: tick median {np.median(millis):.2f} ms, max {millis.max():.2f} ms, waited for scenes at "
+              f"crossings {', '.join(f'{c * 1000:.2f}' for c in crossings)} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares the per-cell field distribution of the terrain generator with the original Counter based computation, and
+the generation of the scenes around the player cell by cell with the generation by regions.
+
+Run with ``python -m benchmarks.bench_terrain``.
+"""
+import timeit
+from bisect import bisect_right
+from collections import Counter
+from itertools import product
+
+import numpy as np
+
+from klistam.world import HEIGHT, WIDTH
+from klistam.world.create_world import IMPACT_FACTOR, WorldGenerator, loaded_scene_coords
+
+
+def reference_distribution(generator: WorldGenerator, neighbours: tuple[int, ...]) -> list[float]:
+    """The distribution as computed before the impact matrix, with get_impact walking the field tree every time."""
+    weights = Counter({key: 0. for key in generator.fields})
+    for neighbour in neighbours:
+        weights.update(Counter(generator.get_impact(generator.fields[neighbour], IMPACT_FACTOR)))
+    norm = sum(weights.values())
+    return [weights[f] / norm for f in generator.fields]
+
+
+def reference_terrain(generator: WorldGenerator, start: tuple[int, int]) -> list[list[int]]:
+    """A scene generated one cell at a time, as before the generation by anti-diagonals."""
+    rng = generator.get_rng(start)
+    cdfs: dict[tuple[int, ...], list[float]] = {}
+    indices = [[-1] * WIDTH for _ in range(HEIGHT)]
+    indices[0][0] = int(rng.integers(len(generator.fields)))
+    uniform = iter(rng.random(HEIGHT * WIDTH - 1).tolist())
+    for i in range(HEIGHT):
+        for j in range(WIDTH):
+            if i == j == 0:
+                continue
+            neighbours = tuple(n for n in (indices[i - 1][j - 1], indices[i - 1][j], indices[i][j - 1]) if n >= 0)
+            if (cdf := cdfs.get(neighbours)) is None:
+                cdf = cdfs[neighbours] = generator.get_distribution(np.array(neighbours)).cumsum().tolist()
+            indices[i][j] = bisect_right(cdf, next(uniform) * cdf[-1])
+    return indices
+
+
+def main() -> None:
+    generator = WorldGenerator.generate(500)
+    num_fields = len(generator.fields)
+    cases = [neighbours for n in (1, 2, 3) for neighbours in product(range(num_fields), repeat=n)]
+    for neighbours in cases:
+        assert np.allclose(reference_distribution(generator, neighbours),
+                           generator.get_distribution(np.array(neighbours))), neighbours
+    print(f"{len(cases)} neighbourhoods produce the same distributions")
+
+    reference = timeit.timeit(lambda: [reference_distribution(generator, n) for n in cases], number=1)
+    matrix = timeit.timeit(lambda: [generator.get_distribution(np.array(n)) for n in cases], number=1)
+    print(f"per cell: reference {reference / len(cases) * 1e6:.1f} µs, matrix {matrix / len(cases) * 1e6:.1f} µs")
+
+    ring = list(loaded_scene_coords((0, 0)))
+    number = 5
+    cells = timeit.timeit(lambda: [reference_terrain(generator, coord) for coord in ring], number=number) / number
+
+    def by_regions() -> None:
+        generator._regions.clear()
+        for coord in ring:
+            generator.get_scene(coord)
+
+    regions = timeit.timeit(by_regions, number=number) / number
+    print(f"{len(ring)} scenes around the player: cell by cell {cells * 1e3:.1f} ms, by regions {regions * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmarks of the world simulation, compared against saved baselines.
+
+Run with ``python -m benchmarks.suite``. Exits with status 1 if a metric got worse than the baseline by more than
+the tolerance. ``--save`` stores the results as the new baseline. Baselines depend on the machine, so save them on
+the machine that checks for regressions.
+"""
+import argparse
+import json
+import sys
+import timeit
+from collections.abc import Sequence
+from pathlib import Path
+
+from klistam import headless
+from klistam.world.create_world import WorldGenerator
+
+BASELINE = Path(__file__).parent / "baseline.json"
+SEED = 500
+TICKS = 10_000
+TOLERANCE = 0.25
+
+
+def measure() -> dict[str, float]:
+    """Metrics whose names end in _per_s are better when higher, all others when lower."""
+    metrics = {}
+    generator = WorldGenerator.generate(SEED)
+    coords = [(x, y) for x in range(-5, 5) for y in range(-5, 5)]
+    seconds = timeit.timeit(lambda: [generator.get_scene(coord) for coord in coords], number=1)
+    metrics["scene_generation_ms"] = seconds / len(coords) * 1000
+
+    result = headless.run(SEED, TICKS)
+    metrics["ticks_per_s"] = result.ticks_per_second
+    metrics["peak_rss_mib"] = result.peak_rss / 2 ** 20
+    for name, total in result.phases.items():
+        metrics[f"{name}_us"] = total / result.phase_counts[name] * 1e6
+    return metrics
+
+
+def regressions(metrics: dict[str, float], baseline: dict[str, float], tolerance: float) -> list[str]:
+    found = []
+    for name, value in metrics.items():
+        if (old := baseline.get(name)) is None:
+            continue
+        change = (old - value) / old if name.endswith("_per_s") else (value - old) / old
+        if change > tolerance:
+            found.append(f"{name}: {old:.2f} -> {value:.2f} ({change:+.0%})")
+    return found
+
+
+def main(args: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks of the world simulation.")
+    parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    options = parser.parse_args(args)
+
+    metrics = measure()
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    for name, value in sorted(metrics.items()):
+        old = baseline.get(name)
+        print(f"{name:24} {value:10.2f}" + (f"   baseline {old:10.2f}" if old is not None else ""))
+    if options.save:
+        BASELINE.write_text(json.dumps(metrics, indent=2, sort_keys=True) + "\n")
+        print(f"Saved baseline to {BASELINE}")
+    elif found := regressions(metrics, baseline, options.tolerance):
+        print("Regressions:", *found, sep="\n  ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Loads all images of the game in one pass at startup, so that drawing never has to touch the disk.
+"""
+import time
+from pathlib import Path
+
+import pygame
+from attrs import define, field
+from typing_extensions import Self
+
+assets_folder = Path(__file__).parents[1] / "assets"
+# Terrain that covers a whole tile. Other terrain is drawn on top of dirt at its own size.
+GROUND_TERRAIN = ("grass", "dirt")
+ATLAS_WIDTH = 1024
+UNKNOWN_COLOR = (255, 0, 255)
+
+
+@define
+class AssetManager:
+    """All images, converted for the display and packed into one atlas surface per folder (scope). The single
+    images are subsurfaces of the atlases."""
+    tile_size: int
+    atlases: dict[str, pygame.Surface] = field(factory=dict, repr=False)
+    _images: dict[tuple[str, str], pygame.Surface] = field(factory=dict, repr=False)
+    load_time: float = 0.
+
+    @classmethod
+    def load(cls, tile_size: int, folder: Path = assets_folder / "images") -> Self:
+        """Load every image below folder. Must be called after the display mode is set."""
+        start = time.perf_counter()
+        self = cls(tile_size)
+        for scope_folder in sorted(path for path in folder.iterdir() if path.is_dir()):
+            images = {}
+            for image_file in sorted(scope_folder.glob("*.png")):
+                image = pygame.image.load(image_file)
+                if scope_folder.name == "terrain" and image_file.stem in GROUND_TERRAIN:
+                    image = pygame.transform.scale(image, (tile_size, tile_size))
+                images[image_file.stem] = image
+            if images:
+                self._pack(scope_folder.name, images)
+        self.load_time = time.perf_counter() - start
+        return self
+
+    def _pack(self, scope: str, images: dict[str, pygame.Surface]) -> None:
+        """Place the images in rows of an atlas, highest first, and keep subsurfaces of the atlas."""
+        placements = {}
+        x = y = row_height = 0
+        for name, image in sorted(images.items(), key=lambda item: -item[1].get_height()):
+            if x + image.get_width() > ATLAS_WIDTH:
+                x, y, row_height = 0, y + row_height, 0
+            placements[name] = pygame.Rect((x, y), image.get_size())
+            x += image.get_width()
+            row_height = max(row_height, image.get_height())
+        width = max(rect.right for rect in placements.values())
+        atlas = pygame.Surface((width, y + row_height), pygame.SRCALPHA)
+        for name, rect in placements.items():
+            atlas.blit(images[name], rect)
+        atlas = atlas.convert_alpha()
+        self.atlases[scope] = atlas
+        for name, rect in placements.items():
+            self._images[scope, name] = atlas.subsurface(rect)
+
+    def get_terrain(self, name: str) -> pygame.Surface | None:
+        """The image of a terrain, or None if there is none."""
+        return self._images.get(("terrain", name))
+
+    def get_sprite(self, name: str, scope: str) -> pygame.Surface:
+        """The image of a sprite. Missing sprites are replaced by a placeholder, which is created once."""
+        if (image := self._images.get((scope, name))) is None:
+            image = self._images.get(("object", "unknown"))
+            if image is None:
+                image = pygame.Surface((self.tile_size, self.tile_size)).convert()
+                image.fill(UNKNOWN_COLOR)
+                self._images["object", "unknown"] = image
+            self._images[scope, name] = image
+        return image
+
+    @property
+    def memory(self) -> int:
+        """The number of bytes of the atlas pixels."""
+        return sum(atlas.get_width() * atlas.get_height() * atlas.get_bytesize() for atlas in self.atlases.values())
+
+    def summary(self) -> str:
+        return (f"{len(self._images)} images in {len(self.atlases)} atlases, {self.memory / 1024:.0f} KiB, "
+                f"loaded in {self.load_time * 1000:.1f} ms")
@@ -1,35 +1,141 @@
+import time
 import traceback
-from functools import cache
-import numpy as np
+from collections import OrderedDict, deque
+from collections.abc import Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import AbstractContextManager
 from pathlib import Path
+import numpy as np
 from typing import Final
 from typing_extensions import Self
 
 import pygame
 from attr import define, field
 
-from klistam.world.create_world import Scene, World
+from klistam.assets import GROUND_TERRAIN, AssetManager
+from klistam.world.create_world import SCENE_CAPACITY, Scene, World
+from klistam.world.loader import SceneLoader
+from klistam.world.savegame import SaveFormatError
+from klistam.world.storage import TerrainCache
 from klistam.world import WIDTH, HEIGHT
 from klistam import _
-from klistam.world.mob import Mob, Movement
+from klistam.klista import CLASSES
+from klistam.overview import Palette
+from klistam.profiling import NO_PHASE, FrameProfiler
+from klistam.world.mob import DIRECTIONS, Mob
 
 KG: Final = 72
-MOVEMENT_SPEED: Final = 0.05
+# Frames drawn per second at most, 0 for no limit.
+FPS: Final = 40
+# Simulation ticks per second, independent of the frames.
+TICK_RATE: Final = 40
+# If the simulation falls further behind than this, it slows down instead of catching up.
+MAX_TICKS_PER_FRAME: Final = 5
+# Frames that may be skipped in a row while the simulation catches up.
+MAX_SKIPPED_FRAMES: Final = 3
+FRAME_HISTORY: Final = 30 * FPS
+TERRAIN_CACHE_SIZE: Final = 9
+# Mobs this many fields outside the view are drawn as well, as moving mobs are shown up to a field away from their
+# position and sprites may be larger than a field.
+CULL_MARGIN: Final = 2
+PROFILE_FONT_SIZE: Final = 20
+PROFILE_PADDING: Final = 4
+PROFILE_COLOR: Final = (230, 230, 230)
+PROFILE_BACKGROUND: Final = (20, 20, 20)
+# The minimap shows the scene of the player and this many scenes around it, at this many pixels per field.
+MINIMAP_RADIUS: Final = 2
+MINIMAP_PIXELS: Final = 2
+MINIMAP_PLAYER_COLOR: Final = (255, 255, 255)
+# The colour of the scenes that are not loaded yet.
+MINIMAP_UNKNOWN_COLOR: Final = (0, 0, 0)
+SAVE_PATH: Final = Path.home() / ".klistam" / "world.sav"
+CLASS_SNAPSHOT_PATH: Final = Path.home() / ".klistam" / "classes.snapshot"
+PROFILE_FOLDER: Final = Path.home() / ".klistam" / "profiles"
 
 MOVEMENTS: Final = (
-    (np.array((1, 0)), pygame.K_RIGHT),
-    (np.array((-1, 0)), pygame.K_LEFT),
-    (np.array((0, -1)), pygame.K_UP),
-    (np.array((0, 1)), pygame.K_DOWN)
+    (DIRECTIONS["right"], pygame.K_RIGHT),
+    (DIRECTIONS["left"], pygame.K_LEFT),
+    (DIRECTIONS["up"], pygame.K_UP),
+    (DIRECTIONS["down"], pygame.K_DOWN)
 )
 
 
+@define
+class FrameTimer:
+    """Measures how long the work of each frame takes, without the time spent waiting for the next frame."""
+    durations: deque[float] = field(factory=lambda: deque(maxlen=FRAME_HISTORY))
+    _start: float = 0.
+
+    def start(self) -> None:
+        self._start = time.perf_counter()
+
+    def stop(self) -> None:
+        self.durations.append(time.perf_counter() - self._start)
+
+    def hitches(self, budget: float = 1 / FPS) -> int:
+        """The number of frames that took longer than the budget."""
+        return sum(duration > budget for duration in self.durations)
+
+    def summary(self) -> str:
+        if not self.durations:
+            return "no frames"
+        millis = np.array(self.durations) * 1000
+        return (f"{len(millis)} frames: median {np.median(millis):.1f} ms, 99th percentile "
+                f"{np.percentile(millis, 99):.1f} ms, max {millis.max():.1f} ms, {self.hitches()} over budget")
+
+
+@define
+class FixedTimestep:
+    """Turns the time that passed between frames into a whole number of simulation ticks. The remainder is kept for
+    the next frame and tells how far drawing is between the last tick and the next one."""
+    rate: float = TICK_RATE
+    max_ticks: int = MAX_TICKS_PER_FRAME
+    accumulator: float = 0.
+    _last: float | None = field(default=None, repr=False)
+
+    @property
+    def interval(self) -> float:
+        return 1 / self.rate
+
+    def advance(self, now: float) -> int:
+        """Add the time since the last call and return the number of ticks to run now."""
+        if self._last is not None:
+            self.accumulator += now - self._last
+        self._last = now
+        ticks = min(int(self.accumulator / self.interval), self.max_ticks)
+        self.accumulator = min(self.accumulator - ticks * self.interval, self.max_ticks * self.interval)
+        return ticks
+
+    @property
+    def alpha(self) -> float:
+        """The part of the time from the last tick to the next one that has passed, between 0 and 1."""
+        return min(self.accumulator / self.interval, 1.)
+
+    @property
+    def behind(self) -> bool:
+        """Whether ticks are due that could not be run in this frame."""
+        return self.accumulator >= self.interval
+
+
 @define
 class Game:
     """The main class of the game that handles user input on the top level."""
     screen: pygame.Surface
     world: World
     scene_view: 'SceneView'
+    camera: 'Camera' = field(factory=lambda: Camera())
+    frame_timer: FrameTimer = field(factory=FrameTimer)
+    # If set, the phases of each frame are recorded and shown by the HUD.
+    profiler: FrameProfiler | None = None
+    timestep: FixedTimestep = field(factory=FixedTimestep)
+    fps: int = FPS
+    save_path: Path = SAVE_PATH
+    # Saves are written in the background, one at a time.
+    _save_executor: ThreadPoolExecutor = field(factory=lambda: ThreadPoolExecutor(max_workers=1), repr=False)
+    _saving: Future[Path] | None = field(default=None, repr=False)
+    # A save was asked for while another one was being written, and follows once it is done.
+    _save_pending: bool = field(default=False, repr=False)
+    _minimap_palette: Palette | None = field(default=None, repr=False)
 
     def handle_key(self, event) -> None:
         key = event.unicode
@@ -37,6 +143,50 @@ class Game:
             key = pygame.key.name(event.key)
         if key == "q":
             pygame.event.post(pygame.event.Event(pygame.QUIT))
+        elif key == "f5":
+            self.scene_view.dirty_rendering = not self.scene_view.dirty_rendering
+            self.scene_view.invalidate()
+        elif key == "f6":
+            self.save_game()
+        elif key == "f2":
+            self.toggle_minimap()
+        elif key == "f3":
+            self.set_profiler(None if self.profiler else FrameProfiler(history=FRAME_HISTORY))
+        elif key == "f4" and self.profiler:
+            self.export_profile()
+
+    def phase(self, name: str) -> AbstractContextManager[None]:
+        """Measure the time of a phase of the frame, if profiling."""
+        return self.profiler.phase(name) if self.profiler else NO_PHASE
+
+    def set_profiler(self, profiler: FrameProfiler | None) -> None:
+        """Start profiling the frames and show the result in the HUD, or stop it with None."""
+        self.profiler = profiler
+        self.world.timer = profiler
+        self.scene_view.hud = HUD(profiler, self.scene_view.hud.minimap)
+        self.scene_view.invalidate()
+
+    def toggle_minimap(self) -> None:
+        """Show or hide the map of the scenes around the player."""
+        hud = self.scene_view.hud
+        if hud.minimap:
+            hud.minimap = None
+        else:
+            if self._minimap_palette is None:
+                # From the loaded images, as no frame reads from the disk.
+                self._minimap_palette = Palette.from_images(self.world.generator.fields,
+                                                            self.scene_view.assets.get_terrain, MINIMAP_PIXELS)
+            hud.minimap = Minimap(self.world, self._minimap_palette)
+        self.scene_view.invalidate()
+
+    def export_profile(self) -> None:
+        """Write the recorded frames as JSON and as a Chrome trace."""
+        assert self.profiler
+        PROFILE_FOLDER.mkdir(parents=True, exist_ok=True)
+        stem = PROFILE_FOLDER / time.strftime("%Y%m%d-%H%M%S")
+        self.profiler.export(stem.with_suffix(".json"))
+        self.profiler.export(stem.with_suffix(".trace.json"), "chrome")
+        print(_("Profile written to {path}").format(path=stem.with_suffix(".json")))
 
     def handle_mouse(self, event) -> None:
         pass
@@ -50,114 +200,352 @@ class Game:
             else:
                 for direction, key in MOVEMENTS:
                     if pygame.key.get_pressed()[key]:
-                        target = player.position.coordinates + direction
-                        if obj := self.world.get_object_at(target):
+                        if obj := self.world.walk(player, direction):
                             print(_("The player walked against {obj}").format(obj=obj))
-                            player.movement = Movement(np.array((0, 0)))
-                        else:
-                            player.movement = Movement(direction)
-                            self.world.summon(player, target)
                         break
-            if player.movement:
-                player.movement.progress -= MOVEMENT_SPEED
-                if player.movement.progress <= 0.:
-                    player.movement = None
+            player.advance_movement()
 
-    def save_game(self) -> None:
-        pass
+    def save_game(self, wait: bool = False) -> None:
+        """Save the world in the background. Only taking the snapshot of the world happens in this frame. While the
+        last save is still being written, the save starts in a later frame, see finish_save, unless wait is set,
+        which waits for the last save instead."""
+        if self._saving is not None:
+            if not wait and not self._saving.done():
+                self._save_pending = True
+                return
+            self._put_save_in_place()
+        self._save_pending = False
+        self._saving = self._save_executor.submit(self.world.snapshot().write_temporary, self.save_path)
+
+    def finish_save(self) -> None:
+        """Once the save in the background is written, put it in place and start the save that was asked for
+        meanwhile."""
+        if self._saving is not None and self._saving.done():
+            self._put_save_in_place()
+            if self._save_pending:
+                self.save_game()
+
+    def _put_save_in_place(self) -> None:
+        # In the thread of the world, which may have the last save open, see World.replace_save.
+        assert self._saving is not None
+        saving, self._saving = self._saving, None
+        error = saving.exception()
+        if error is None:
+            try:
+                self.world.replace_save(saving.result(), self.save_path)
+            except OSError as replace_error:
+                error = replace_error
+        if error is not None:
+            print(_("The game could not be saved: {error}").format(error=error))
+        else:
+            print(_("Game saved"))
+
+    def wait_for_save(self) -> None:
+        if self._saving is not None:
+            self._put_save_in_place()
+        self._save_executor.shutdown()
 
     @classmethod
-    def create(cls) -> Self:
+    def create(cls, dirty_rendering: bool = False, save_path: Path = SAVE_PATH,
+               terrain_cache: Path | None = None) -> Self:
         pygame.init()
-        world = World.generate()
-        # Loads the neighboring scenes
+        # Loaded now, so that the first encounter does not make the game stutter.
+        CLASSES.snapshot_path = CLASS_SNAPSHOT_PATH
+        CLASSES.preload()
+        world = load_or_generate_world(save_path)
+        if terrain_cache is not None:
+            world.terrain_cache = TerrainCache(terrain_cache, world.generator.cache_key())
+        world.loader = SceneLoader(world.generator)
+        world.capacity = SCENE_CAPACITY
+        # Only the scene of the player is generated now, the others follow in the background.
         world.tick()
         screen = pygame.display.set_mode((KG * WIDTH, KG * HEIGHT))
-        return cls(screen, world=world, scene_view=SceneView())
+        assets = AssetManager.load(KG)
+        print(assets.summary())
+        return cls(screen, world=world, scene_view=SceneView(assets, dirty_rendering=dirty_rendering),
+                   save_path=save_path)
 
     def run(self) -> None:
         print(_("Game started"))
         clock = pygame.time.Clock()
+        skipped_frames = 0
         try:
             cont = True
             while cont:
                 # noinspection PyBroadException
                 try:
-                    for event in pygame.event.get():
-                        if event.type == pygame.QUIT:
-                            cont = False
-                            break
-                        elif event.type == pygame.KEYDOWN:
-                            self.handle_key(event)
-                        elif event.type == pygame.MOUSEBUTTONDOWN:
-                            self.handle_mouse(event)
-                    self.handle_pressed()
-                    self.world.tick()
+                    self.frame_timer.start()
+                    if self.profiler:
+                        self.profiler.start_frame()
+                    with self.phase("events"):
+                        for event in pygame.event.get():
+                            if event.type == pygame.QUIT:
+                                cont = False
+                                break
+                            elif event.type == pygame.KEYDOWN:
+                                self.handle_key(event)
+                            elif event.type == pygame.MOUSEBUTTONDOWN:
+                                self.handle_mouse(event)
+                            elif event.type == pygame.WINDOWEXPOSED:
+                                self.scene_view.invalidate()
+                        self.finish_save()
+                    for _tick in range(self.timestep.advance(time.perf_counter())):
+                        with self.phase("input"):
+                            self.handle_pressed()
+                        with self.phase("tick"):
+                            self.world.tick()
                     # self.draw_kachel()
                     # self.draw_inventar()
                     # self.status_panel.tick(self.screen)
-                    self.scene_view.draw(self.screen, self.world.get_player_scene())
-                    pygame.display.flip()
-                    clock.tick(40)
+                    if self.timestep.behind and skipped_frames < MAX_SKIPPED_FRAMES:
+                        # Give the time of drawing to the simulation instead.
+                        skipped_frames += 1
+                        self.frame_timer.stop()
+                        continue
+                    skipped_frames = 0
+                    with self.phase("draw"):
+                        if self.world.player and self.world.player.position:
+                            self.camera.follow(self.world.player, self.timestep.alpha)
+                        dirty = self.scene_view.draw_view(self.screen, self.world, self.camera,
+                                                          alpha=self.timestep.alpha)
+                    with self.phase("flip"):
+                        if dirty is None:
+                            pygame.display.flip()
+                        else:
+                            pygame.display.update(dirty)
+                    self.frame_timer.stop()
+                    clock.tick(self.fps)
                 except Exception:
                     traceback.print_exc()
-            self.save_game()
+            self.save_game(wait=True)
         finally:
+            print(self.frame_timer.summary())
+            self.wait_for_save()
+            self.world.close()
             pygame.quit()
 
 
+def load_or_generate_world(save_path: Path) -> World:
+    """Resume the saved world, or start a new one if there is no readable save."""
+    if save_path.exists():
+        try:
+            return World.load(save_path)
+        except SaveFormatError as error:
+            print(_("The save could not be loaded: {error}").format(error=error))
+    return World.generate()
+
+
 @define
 class HUD:
     """The Heads-Up-Display HUD is an overlay that is shown above the game elements and serves as a UI to the player."""
+    # If set, the time of the phases of the last second is shown.
+    profiler: FrameProfiler | None = None
+    minimap: 'Minimap | None' = None
+    _font: pygame.font.Font | None = field(default=None, repr=False)
+    # The panel only grows, so that it always covers the one of the last frame.
+    _panel: pygame.Rect | None = field(default=None, repr=False)
 
-    def draw(self):
-        pass
+    def draw(self, screen: pygame.Surface) -> list[pygame.Rect]:
+        """Draw the HUD and return the regions of the screen it drew on."""
+        rects = []
+        if self.profiler is not None:
+            rects.append(self.draw_profile(screen, self.profiler))
+        if self.minimap is not None:
+            rects.append(self.minimap.draw(screen))
+        return rects
 
+    def draw_profile(self, screen: pygame.Surface, profiler: FrameProfiler) -> pygame.Rect:
+        """Draw a panel with the mean and maximum time of each phase."""
+        if self._font is None:
+            self._font = pygame.font.Font(None, PROFILE_FONT_SIZE)
+        lines = [self._font.render(f"{name}: {mean * 1000:.2f} ms, max {peak * 1000:.2f} ms", True, PROFILE_COLOR)
+                 for name, (mean, peak) in profiler.recent(FPS).items()]
+        line_height = self._font.get_linesize()
+        panel = pygame.Rect(0, 0, max((line.get_width() for line in lines), default=0) + 2 * PROFILE_PADDING,
+                            len(lines) * line_height + 2 * PROFILE_PADDING)
+        if self._panel is not None:
+            panel.union_ip(self._panel)
+        self._panel = panel
+        # Opaque, so that the panel can be drawn again over the last one without restoring what was below.
+        screen.fill(PROFILE_BACKGROUND, panel)
+        for row, line in enumerate(lines):
+            screen.blit(line, (PROFILE_PADDING, PROFILE_PADDING + row * line_height))
+        return panel
 
-assets_folder = Path(__file__).parents[1] / "assets"
 
+@define
+class Camera:
+    """The part of the world that is shown, in pixels of the world. The field (x, y) covers the pixels from
+    (x * KG, y * KG) to ((x + 1) * KG, (y + 1) * KG)."""
+    width: int = KG * WIDTH
+    height: int = KG * HEIGHT
+    # The world pixel at the top left of the view.
+    left: int = 0
+    top: int = 0
 
-@cache
-def get_terrain(name: str) -> pygame.Surface | None:
-    try:
-        ans = pygame.image.load(assets_folder / "images" / "terrain" / f"{name}.png").convert_alpha()
-        if name in ("grass", "dirt"):
-            return pygame.transform.scale(ans, (KG, KG))
-        else:
-            base = get_terrain("dirt")
-            return ans
-    except FileNotFoundError:
-        return None
+    def follow(self, mob: Mob, alpha: float = 1.) -> None:
+        """Centre the view on the mob where it is shown, at a part alpha of the way from the last tick to the next
+        one."""
+        assert mob.position
+        offset_x, offset_y = mob.movement.offset_at(alpha) if mob.movement else (0., 0.)
+        self.left = round((mob.position.x + offset_x + .5) * KG) - self.width // 2
+        self.top = round((mob.position.y + offset_y + .5) * KG) - self.height // 2
 
+    def get_scenes(self) -> list[tuple[int, int]]:
+        """The scenes in view. As large as a scene, the view overlaps at most four."""
+        scene_width, scene_height = WIDTH * KG, HEIGHT * KG
+        return [(x, y) for y in range(self.top // scene_height, (self.top + self.height - 1) // scene_height + 1)
+                for x in range(self.left // scene_width, (self.left + self.width - 1) // scene_width + 1)]
 
-@cache
-def get_sprite_surface(name: str, scope: str) -> pygame.Surface | None:
-    try:
-        return pygame.image.load(assets_folder / "images" / scope / f"{name}.png").convert_alpha()
-    except FileNotFoundError:
-        return None
+    def get_fields(self, margin: int = 0) -> tuple[int, int, int, int]:
+        """The fields in view as (left, top, width, height), grown by margin fields on each side."""
+        left, top = self.left // KG - margin, self.top // KG - margin
+        return (left, top, (self.left + self.width - 1) // KG + margin + 1 - left,
+                (self.top + self.height - 1) // KG + margin + 1 - top)
+
+
+@define
+class Minimap:
+    """A map of the scenes around the player in the top right corner of the screen, see overview."""
+    world: World
+    palette: Palette
+    radius: int = MINIMAP_RADIUS
+    _surface: pygame.Surface | None = field(default=None, repr=False)
+    # The scene of the player when the surface was made, and whether all scenes were loaded then.
+    _middle: tuple[int, int] | None = field(default=None, repr=False)
+    _complete: bool = field(default=False, repr=False)
+
+    def get_surface(self, middle: tuple[int, int]) -> pygame.Surface:
+        """The map around the scene middle. Made again when the player enters another scene, or while scenes of it
+        are still loading."""
+        if self._surface is not None and middle == self._middle and self._complete:
+            return self._surface
+        side = 2 * self.radius + 1
+        terrain = np.zeros((side * HEIGHT, side * WIDTH), dtype=self.world.generator.fields.dtype)
+        known = np.zeros((side, side), dtype=np.bool_)
+        for row in range(side):
+            for column in range(side):
+                scene = self.world.peek_scene((middle[0] + column - self.radius, middle[1] + row - self.radius))
+                if scene is not None:
+                    terrain[row * HEIGHT:(row + 1) * HEIGHT, column * WIDTH:(column + 1) * WIDTH] = scene.terrain
+                    known[row, column] = True
+        image = self.palette.render(terrain)
+        scene_pixels = HEIGHT * self.palette.pixels, WIDTH * self.palette.pixels
+        image[~np.kron(known, np.ones(scene_pixels, dtype=np.bool_))] = MINIMAP_UNKNOWN_COLOR
+        self._surface = pygame.surfarray.make_surface(image.swapaxes(0, 1))
+        self._middle, self._complete = middle, bool(known.all())
+        return self._surface
+
+    def draw(self, screen: pygame.Surface) -> pygame.Rect:
+        """Draw the map with the player on it and return where."""
+        player = self.world.player
+        if not (player and player.position):
+            return pygame.Rect(0, 0, 0, 0)
+        surface = self.get_surface(player.position.scene)
+        rect = surface.get_rect(topright=screen.get_rect().topright)
+        screen.blit(surface, rect)
+        pixels = self.palette.pixels
+        x = (player.position.x - (player.position.scene[0] - self.radius) * WIDTH) * pixels
+        y = (player.position.y - (player.position.scene[1] - self.radius) * HEIGHT) * pixels
+        screen.fill(MINIMAP_PLAYER_COLOR, (rect.x + x, rect.y + y, pixels, pixels))
+        return rect
 
 
 @define
 class SceneView:
     """Shows the scene to the user."""
+    assets: AssetManager
     hud: 'HUD' = field(factory=HUD)
+    # If set, draw only redraws the parts of the screen that changed since the last frame.
+    dirty_rendering: bool = False
+    # Pre-rendered terrain by scene coordinate, in order of last use.
+    _terrain_surfaces: OrderedDict[tuple[int, int], pygame.Surface] = field(factory=OrderedDict, repr=False)
+    # The world pixel at the top left of the screen and the mob rectangles on the screen after the last frame.
+    _shown_origin: tuple[int, int] | None = field(default=None, repr=False)
+    _mob_rects: dict[Mob, pygame.Rect] = field(factory=dict, repr=False)
+
+    def draw(self, screen: pygame.Surface, scene: Scene, mobs: Iterable[Mob] | None = None,
+             alpha: float = 1.) -> list[pygame.Rect] | None:
+        """Draw the scene with its mobs, or the given mobs instead, with moving mobs at a part alpha of the way from
+        the last tick to the next one. Returns the rectangles of the screen that changed, or None if everything
+        changed."""
+        terrain = self.get_terrain_surface(screen, scene)
+        sprites = {mob: self.get_mob_sprite(mob, alpha) for mob in (scene.mobs if mobs is None else mobs)
+                   if mob.sprite and mob.position}
+        return self._draw_layers(screen, (scene.start_coord[0] * WIDTH * KG, scene.start_coord[1] * HEIGHT * KG),
+                                 [(terrain, (0, 0))], sprites)
 
-    def draw(self, screen: pygame.Surface, scene: Scene) -> None:
-        for y in range(HEIGHT):
-            for x in range(WIDTH):
-                self.draw_kachel(terrain=scene.get_terrain_file(x, y), screen=screen, x=x, y=y)
-        for mob in scene.mobs:
-            if mob.sprite and mob.position:
-                self.draw_mob(mob, screen)
-        self.hud.draw()
+    def draw_view(self, screen: pygame.Surface, world: World, camera: 'Camera',
+                  alpha: float = 1.) -> list[pygame.Rect] | None:
+        """Draw what the camera sees: the terrain of the up to four scenes it overlaps, and the mobs around it, found
+        by their coordinates. See draw for alpha and the result."""
+        origin = camera.left, camera.top
+        terrain = [(self.get_terrain_surface(screen, world.get_scene(coord)),
+                    (coord[0] * WIDTH * KG - camera.left, coord[1] * HEIGHT * KG - camera.top))
+                   for coord in camera.get_scenes()]
+        # Lower mobs are drawn over higher ones.
+        mobs = sorted((mob for mob in world.get_mobs_in_rect(*camera.get_fields(CULL_MARGIN)) if mob.sprite),
+                      key=lambda mob: mob.position.y if mob.position else 0)
+        sprites = {mob: self.get_mob_sprite(mob, alpha, origin) for mob in mobs}
+        return self._draw_layers(screen, origin, terrain, sprites)
+
+    def _draw_layers(self, screen: pygame.Surface, origin: tuple[int, int],
+                     terrain: list[tuple[pygame.Surface, tuple[int, int]]],
+                     sprites: dict[Mob, tuple[pygame.Surface, pygame.Rect]]) -> list[pygame.Rect] | None:
+        """Draw terrain surfaces at their places and the sprites over them. If the screen shows the same part of the
+        world as in the last frame, only the changed mobs are drawn again."""
+        mob_rects = {mob: rect for mob, (_surface, rect) in sprites.items()}
+        dirty: list[pygame.Rect] | None
+        if self.dirty_rendering and origin == self._shown_origin:
+            # Moved, spawned and removed mobs, at their new and at their old place.
+            dirty = [rect for mob, rect in mob_rects.items() if self._mob_rects.get(mob) != rect]
+            dirty.extend(rect for mob, rect in self._mob_rects.items() if mob_rects.get(mob) != rect)
+            for rect in dirty:
+                # Render the whole rectangle again, as sprites with alpha cannot be blitted over themselves.
+                screen.set_clip(rect)
+                for surface, position in terrain:
+                    screen.blit(surface, position)
+                for surface, sprite_rect in sprites.values():
+                    if sprite_rect.colliderect(rect):
+                        screen.blit(surface, sprite_rect)
+            screen.set_clip(None)
+        else:
+            for surface, position in terrain:
+                screen.blit(surface, position)
+            for surface, sprite_rect in sprites.values():
+                screen.blit(surface, sprite_rect)
+            dirty = None
+        self._shown_origin = origin
+        self._mob_rects = mob_rects
+        hud_rects = self.hud.draw(screen)
+        if dirty is not None:
+            dirty.extend(hud_rects)
+        return dirty
+
+    def invalidate(self) -> None:
+        """Make the next frame a full redraw, e.g. because the window content was lost."""
+        self._shown_origin = None
+
+    def get_terrain_surface(self, screen: pygame.Surface, scene: Scene) -> pygame.Surface:
+        """The terrain of the scene, rendered once in the format of the screen. Terrain never changes, so only
+        mobs have to be drawn on top of it each frame."""
+        if (surface := self._terrain_surfaces.get(scene.start_coord)) is not None:
+            self._terrain_surfaces.move_to_end(scene.start_coord)
+            return surface
+        surface = pygame.Surface((KG * WIDTH, KG * HEIGHT), 0, screen)
+        for (y, x), terrain in np.ndenumerate(scene.fields.names[scene.terrain[:HEIGHT, :WIDTH]]):
+            self.draw_kachel(terrain=terrain, screen=surface, x=x, y=y)
+        self._terrain_surfaces[scene.start_coord] = surface
+        if len(self._terrain_surfaces) > TERRAIN_CACHE_SIZE:
+            self._terrain_surfaces.popitem(last=False)
+        return surface
 
     def draw_kachel(self, terrain: str, screen: pygame.Surface, x: int, y: int) -> None:
         """Draw a single part of the map."""
-        image = get_terrain(terrain)
+        image = self.assets.get_terrain(terrain)
         if image:
-            if image not in ("grass", "dirt"):
-                dirt = get_terrain("dirt")
+            if terrain not in GROUND_TERRAIN:
+                dirt = self.assets.get_terrain("dirt")
                 assert dirt
                 screen.blit(dirt, (x * KG, y * KG, KG, KG))
             screen.blit(image, (x * KG, (1 + y) * KG - image.get_height(), KG, KG))
@@ -169,18 +557,26 @@ class SceneView:
 
     def draw_mob(self, mob: Mob, screen: pygame.Surface) -> None:
         """Draw a mob."""
+        screen.blit(*self.get_mob_sprite(mob))
+
+    def get_mob_sprite(self, mob: Mob, alpha: float = 1.,
+                       origin: tuple[int, int] | None = None) -> tuple[pygame.Surface, pygame.Rect]:
+        """The image of a mob and where it is shown on the screen, see Movement.offset_at for alpha. origin is the
+        world pixel at the top left of the screen, by default that of the scene of the mob."""
         assert mob.sprite
         assert mob.position
-        surface = get_sprite_surface(mob.sprite.name, mob.sprite.scope) or get_sprite_surface("unknown", "object")
-        assert surface
-        x, y = mob.position.scene_coordinates
-        x *= KG
-        y *= KG
+        surface = self.assets.get_sprite(mob.sprite.name, mob.sprite.scope)
+        if origin is None:
+            x, y = mob.position.scene_coordinates
+            x *= KG
+            y *= KG
+        else:
+            x, y = mob.position.x * KG - origin[0], mob.position.y * KG - origin[1]
         if mob.movement:
-            offset = np.rint(mob.movement.offset * KG)
-            x += offset[0]
-            y += offset[1]
-        screen.blit(surface, (x + (KG - surface.get_width()) // 2, y - surface.get_height() + KG))
+            offset_x, offset_y = mob.movement.offset_at(alpha)
+            x += round(offset_x * KG)
+            y += round(offset_y * KG)
+        return surface, surface.get_rect(topleft=(x + (KG - surface.get_width()) // 2, y - surface.get_height() + KG))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,114 @@
+"""
+Runs the world without pygame, as fast as possible, with the player following a scripted path.
+
+Run with ``python -m klistam.headless --seed 500 --ticks 10000``.
+"""
+import argparse
+import contextlib
+import os
+import resource
+import sys
+import time
+from collections.abc import Iterable, Sequence
+from itertools import cycle
+from pathlib import Path
+from typing import Literal
+
+from attrs import define, field
+
+from klistam.klista import CLASSES
+from klistam.profiling import PhaseTimer
+from klistam.world.create_world import SPAWN_RATE, World
+from klistam.world.mob import DIRECTIONS
+from klistam.world.mob_store import MobStore
+from klistam.world.storage import TerrainCache
+
+Direction = Literal["right", "left", "up", "down"]
+# A rectangle that crosses a few scene borders and returns to the start.
+DEFAULT_PATH: Sequence[Direction] = ("right",) * 40 + ("down",) * 30 + ("left",) * 40 + ("up",) * 30
+
+
+@define
+class SimulationResult:
+    ticks: int
+    seconds: float
+    scenes: int
+    # Mobs in the scenes in memory and in the mob store at the end.
+    mobs: int
+    # Peak resident set size of the process in bytes.
+    peak_rss: int
+    phases: dict[str, float] = field(factory=dict)
+    phase_counts: dict[str, int] = field(factory=dict)
+
+    @property
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.seconds
+
+    def summary(self) -> str:
+        lines = [f"{self.ticks} ticks in {self.seconds:.2f} s ({self.ticks_per_second:.0f} ticks/s), "
+                 f"{self.scenes} scenes, {self.mobs} mobs, peak RSS {self.peak_rss / 2 ** 20:.1f} MiB"]
+        for name, total in sorted(self.phases.items(), key=lambda item: -item[1]):
+            count = self.phase_counts[name]
+            lines.append(f"  {name:10} {total * 1000:9.1f} ms total, {total / count * 1e6:8.1f} µs per call ({count})")
+        return "\n".join(lines)
+
+
+def peak_rss() -> int:
+    """The peak resident set size of this process in bytes."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def simulate(world: World, ticks: int, path: Iterable[Direction] = DEFAULT_PATH) -> SimulationResult:
+    """Tick the world, letting the player walk along the path again and again. The phases of the ticks are
+    measured, unless the world already has a timer."""
+    player = world.player
+    assert player and player.position
+    if world.timer is None:
+        world.timer = PhaseTimer()
+    directions = cycle([DIRECTIONS[name] for name in path])
+    start = time.perf_counter()
+    for _tick in range(ticks):
+        if not player.movement:
+            world.walk(player, next(directions))
+        player.advance_movement()
+        world.tick()
+    seconds = time.perf_counter() - start
+    mobs = sum(len(list(scene.mobs)) for scene in world._scenes.values()) + len(world.mob_store or ())
+    return SimulationResult(ticks, seconds, len(world._scenes), mobs, peak_rss(), dict(world.timer.totals),
+                            dict(world.timer.counts))
+
+
+def run(seed: int, ticks: int, path: Iterable[Direction] = DEFAULT_PATH, quiet: bool = True,
+        mob_store: bool = False, spawn_rate: float = SPAWN_RATE, terrain_cache: Path | None = None) -> SimulationResult:
+    """Generate a world and simulate it. If quiet, the messages of the world are not printed."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull if quiet else sys.stdout):
+        CLASSES.preload()
+        world = World.generate(seed)
+        world.spawn_rate = spawn_rate
+        if mob_store:
+            world.mob_store = MobStore()
+        if terrain_cache is not None:
+            world.terrain_cache = TerrainCache(terrain_cache, world.generator.cache_key())
+        try:
+            return simulate(world, ticks, path)
+        finally:
+            world.close()
+
+
+def main(args: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seed", type=int, default=500)
+    parser.add_argument("--ticks", type=int, default=10_000)
+    parser.add_argument("--verbose", action="store_true", help="print the messages of the world")
+    parser.add_argument("--mob-store", action="store_true", help="keep encounters in a MobStore")
+    parser.add_argument("--spawn-rate", type=float, default=SPAWN_RATE,
+                        help="the mean number of encounters that spawn per scene and tick")
+    parser.add_argument("--terrain-cache", type=Path, help="a folder to keep generated terrain in between runs")
+    options = parser.parse_args(args)
+    print(run(options.seed, options.ticks, quiet=not options.verbose, mob_store=options.mob_store,
+              spawn_rate=options.spawn_rate, terrain_cache=options.terrain_cache).summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
 """Defines the Klistam class."""
+import json
+import os
+import threading
+from collections.abc import Mapping
 from pathlib import Path
 
-from attrs import define, field
+from attrs import asdict, define, field, frozen
 from typing_extensions import Self
-from yaml import CSafeLoader
-import yaml
-from typing import TextIO, ClassVar, Mapping
+from typing import TextIO
 
 assets_folder = Path(__file__).parents[1] / "assets"
+# Increase when the layout of the registry snapshot changes.
+SNAPSHOT_VERSION = 2
 
 
 @define
@@ -18,24 +22,127 @@ class KlistamClass:
 
     energy_cost: float = 0.003
 
-    _all_classes: ClassVar[dict[str, 'KlistamClass']] = {}
-
     @classmethod
     def from_yaml(cls, stream: str | TextIO) -> Self:
-        dct = yaml.load(stream, CSafeLoader)
+        import yaml  # Only needed when the classes are loaded, so not imported with the module.
+
+        dct = yaml.load(stream, yaml.CSafeLoader)
         dct["sprite_name"] = dct.pop("id")
         return cls(**dct)
 
     @staticmethod
     def load_classes() -> Mapping[str, 'KlistamClass']:
-        """Load all available classes as a list."""
-        if not KlistamClass._all_classes:
-            for class_file in (assets_folder / "classes").iterdir():
-                if class_file.suffix == ".yml":
-                    with class_file.open() as file:
-                        klass = KlistamClass.from_yaml(file)
-                        KlistamClass._all_classes[klass.sprite_name] = klass
-        return KlistamClass._all_classes
+        """All available classes by name, see CLASSES."""
+        return CLASSES.classes()
+
+
+@frozen
+class _Snapshot:
+    # Indexed by id.
+    classes: tuple[KlistamClass, ...]
+    ids: Mapping[str, int]
+    by_name: Mapping[str, KlistamClass]
+    # The modification times of the class files in ns, by file name.
+    mtimes: Mapping[str, int]
+
+
+@define
+class ClassRegistry:
+    """The klistam classes of a folder of YAML files, by name and by id.
+
+    The ids are small integers that stay the same while the program runs, even when the classes are reloaded, so they
+    can be kept in arrays. The registry may be used from several threads."""
+    folder: Path
+    # If set, the parsed classes are kept in this file, and the YAML files are parsed again only if one changed.
+    snapshot_path: Path | None = None
+    _snapshot: _Snapshot | None = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(factory=threading.Lock, init=False, repr=False)
+
+    def _mtimes(self) -> dict[str, int]:
+        return {file.name: file.stat().st_mtime_ns for file in self.folder.iterdir() if file.suffix == ".yml"}
+
+    def _get(self) -> _Snapshot:
+        if (snapshot := self._snapshot) is None:
+            with self._lock:
+                if (snapshot := self._snapshot) is None:
+                    snapshot = self._snapshot = self._build(self._mtimes())
+        return snapshot
+
+    def _build(self, mtimes: dict[str, int]) -> _Snapshot:
+        classes = self._read_snapshot(mtimes)
+        if classes is None:
+            classes = []
+            for name in sorted(mtimes):
+                with (self.folder / name).open() as file:
+                    classes.append(KlistamClass.from_yaml(file))
+            self._write_snapshot(mtimes, classes)
+        # Classes keep their id, also when they are removed, so that the ids in arrays still resolve.
+        ids = dict(self._snapshot.ids) if self._snapshot else {}
+        by_id = list(self._snapshot.classes) if self._snapshot else []
+        for klass in classes:
+            if klass.sprite_name in ids:
+                by_id[ids[klass.sprite_name]] = klass
+            else:
+                ids[klass.sprite_name] = len(by_id)
+                by_id.append(klass)
+        return _Snapshot(tuple(by_id), ids, {klass.sprite_name: klass for klass in classes}, mtimes)
+
+    def _read_snapshot(self, mtimes: dict[str, int]) -> list[KlistamClass] | None:
+        if self.snapshot_path is None or not self.snapshot_path.exists():
+            return None
+        try:
+            with self.snapshot_path.open("rb") as file:
+                version, snapshot_mtimes, class_dicts = json.load(file)
+            if version != SNAPSHOT_VERSION or snapshot_mtimes != mtimes:
+                return None
+            return [KlistamClass(**class_dict) for class_dict in class_dicts]
+        except (OSError, TypeError, ValueError):
+            return None
+
+    def _write_snapshot(self, mtimes: dict[str, int], classes: list[KlistamClass]) -> None:
+        if self.snapshot_path is None:
+            return
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        # Written under another name first, so that other processes starting at the same time never read a partial file.
+        temporary = self.snapshot_path.with_name(f"{self.snapshot_path.name}.{os.getpid()}.tmp")
+        with temporary.open("w") as file:
+            json.dump([SNAPSHOT_VERSION, mtimes, [asdict(klass) for klass in classes]], file)
+        os.replace(temporary, self.snapshot_path)
+
+    def preload(self) -> None:
+        """Load the classes now, so that the first lookup does not have to."""
+        self._get()
+
+    def refresh(self) -> bool:
+        """Reload the classes if a class file was added, removed or changed. Returns whether they were reloaded."""
+        with self._lock:
+            mtimes = self._mtimes()
+            if self._snapshot is not None and self._snapshot.mtimes == mtimes:
+                return False
+            self._snapshot = self._build(mtimes)
+            return True
+
+    def classes(self) -> Mapping[str, KlistamClass]:
+        return self._get().by_name
+
+    def __getitem__(self, name: str) -> KlistamClass:
+        return self._get().by_name[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._get().by_name
+
+    def __len__(self) -> int:
+        return len(self._get().by_name)
+
+    def id_of(self, klass: KlistamClass | str) -> int:
+        """The id of a class or class name."""
+        return self._get().ids[klass if isinstance(klass, str) else klass.sprite_name]
+
+    def by_id(self, class_id: int) -> KlistamClass:
+        return self._get().classes[class_id]
+
+
+CLASSES = ClassRegistry(assets_folder / "classes")
 
 
 @define
@@ -0,0 +1,196 @@
+"""
+Renders overview maps of large parts of a world, for reviewing what a seed generates.
+
+The terrain of a rectangle of scenes is generated region by region in a process pool and turned into pixels with
+one lookup into a table of small tiles, one per field. The map is written as one PNG, or as a pyramid of PNG tiles in
+which each level halves the resolution of the one below.
+
+Run with ``python -m klistam.overview --seed 500 --corner -50 -50 --size 100 100 --output overview.png``.
+"""
+import argparse
+import os
+import time
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pygame
+from attrs import define, field
+from numpy.typing import NDArray
+from typing_extensions import Self
+
+from klistam.assets import GROUND_TERRAIN, assets_folder
+from klistam.world import HEIGHT, WIDTH
+from klistam.world.create_world import REGION_SCENES, FieldTable, WorldGenerator
+
+# The size in pixels at which terrain images are combined before they are scaled down, as KG of the game.
+TILE_SIZE = 72
+# The colour of fields without an image, as drawn by the game.
+MISSING_COLOR = (70, 70, 70)
+# The size in pixels of the images of a pyramid.
+PYRAMID_TILE = 256
+
+# The generator of a worker process, see _start_worker.
+_generator: WorldGenerator | None = None
+
+
+@define
+class Palette:
+    """The look of each field at a small number of pixels per field."""
+    # Shape (len(fields), pixels, pixels, 3). With one pixel per field, the mean colour of the field.
+    tiles: NDArray[np.uint8] = field(repr=False)
+
+    @property
+    def pixels(self) -> int:
+        return self.tiles.shape[1]
+
+    @classmethod
+    def load(cls, fields: FieldTable, pixels: int = 1, folder: Path = assets_folder / "images" / "terrain") -> Self:
+        """The palette of the terrain images in folder, see from_images."""
+        return cls.from_images(fields, lambda name: _load_image(folder, name), pixels)
+
+    @classmethod
+    def from_images(cls, fields: FieldTable, images: Callable[[str], pygame.Surface | None], pixels: int = 1) -> Self:
+        """Scale the terrain images, as returned by name by images, down to pixels per field. Images of the ground
+        cover the TILE_SIZE pixels of a field. As in the game, other images are shown on top of dirt."""
+        dirt = images("dirt")
+        tiles = np.empty((len(fields), pixels, pixels, 3), dtype=np.uint8)
+        for field_id, name in enumerate(fields.names.tolist()):
+            tile = pygame.Surface((TILE_SIZE, TILE_SIZE))
+            if (image := images(name)) is None:
+                tile.fill(MISSING_COLOR)
+            else:
+                if name not in GROUND_TERRAIN and dirt is not None:
+                    tile.blit(dirt, (0, 0))
+                tile.blit(image, ((TILE_SIZE - image.get_width()) // 2, TILE_SIZE - image.get_height()))
+            if pixels == 1:
+                tiles[field_id] = pygame.surfarray.pixels3d(tile).mean(axis=(0, 1)).round()
+            else:
+                tiles[field_id] = pygame.surfarray.array3d(pygame.transform.smoothscale(tile, (pixels, pixels))) \
+                    .swapaxes(0, 1)
+        return cls(tiles)
+
+    def render(self, terrain: NDArray[np.integer]) -> NDArray[np.uint8]:
+        """The RGB image of shape (rows * pixels, columns * pixels, 3) of the field ids of terrain."""
+        rows, columns = terrain.shape
+        pixels = self.pixels
+        return self.tiles[terrain].swapaxes(1, 2).reshape(rows * pixels, columns * pixels, 3)
+
+
+def _load_image(folder: Path, name: str) -> pygame.Surface | None:
+    if not (path := folder / f"{name}.png").exists():
+        return None
+    image = pygame.image.load(path)
+    return pygame.transform.scale(image, (TILE_SIZE, TILE_SIZE)) if name in GROUND_TERRAIN else image
+
+
+def _start_worker(seed: int) -> None:
+    global _generator
+    _generator = WorldGenerator.generate(seed)
+
+
+def _region_terrain(region: tuple[int, int]) -> NDArray[np.unsignedinteger]:
+    assert _generator is not None
+    return _generator.generate_region(region)
+
+
+def regions(corner: tuple[int, int], size: tuple[int, int]) -> Iterator[tuple[int, int]]:
+    """The regions of the generator that the scenes of a rectangle lie in."""
+    first_x, first_y = corner[0] // REGION_SCENES, corner[1] // REGION_SCENES
+    last_x, last_y = (corner[0] + size[0] - 1) // REGION_SCENES, (corner[1] + size[1] - 1) // REGION_SCENES
+    for region_y in range(first_y, last_y + 1):
+        for region_x in range(first_x, last_x + 1):
+            yield region_x, region_y
+
+
+def generate_terrain(seed: int, corner: tuple[int, int], size: tuple[int, int],
+                     processes: int | None = None) -> NDArray[np.unsignedinteger]:
+    """The field ids of size scenes starting at the scene corner, of shape (size[1] * HEIGHT, size[0] * WIDTH). The
+    regions are generated in processes processes, by default one per CPU. With one, no pool is started."""
+    generator = WorldGenerator.generate(seed)
+    terrain = np.empty((size[1] * HEIGHT, size[0] * WIDTH), dtype=generator.fields.dtype)
+    todo = list(regions(corner, size))
+    if processes == 1 or len(todo) == 1:
+        results: Iterator[NDArray[np.unsignedinteger]] = map(generator.generate_region, todo)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(processes, initializer=_start_worker, initargs=(seed,))
+        results = pool.map(_region_terrain, todo, chunksize=max(1, len(todo) // (4 * (processes or os.cpu_count() or 1))))
+    try:
+        for (region_x, region_y), region in zip(todo, results):
+            # The part of the region inside the rectangle, in fields relative to the corner.
+            left = max(region_x * REGION_SCENES, corner[0]) - corner[0]
+            right = min((region_x + 1) * REGION_SCENES, corner[0] + size[0]) - corner[0]
+            top = max(region_y * REGION_SCENES, corner[1]) - corner[1]
+            bottom = min((region_y + 1) * REGION_SCENES, corner[1] + size[1]) - corner[1]
+            offset_x = (corner[0] - region_x * REGION_SCENES) * WIDTH
+            offset_y = (corner[1] - region_y * REGION_SCENES) * HEIGHT
+            terrain[top * HEIGHT:bottom * HEIGHT, left * WIDTH:right * WIDTH] = \
+                region[top * HEIGHT + offset_y:bottom * HEIGHT + offset_y, left * WIDTH + offset_x:right * WIDTH + offset_x]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return terrain
+
+
+def write_png(path: Path | str, image: NDArray[np.uint8]) -> None:
+    """Write an RGB image of shape (rows, columns, 3)."""
+    image = np.ascontiguousarray(image)
+    pygame.image.save(pygame.image.frombuffer(image.tobytes(), (image.shape[1], image.shape[0]), "RGB"), str(path))
+
+
+def downsample(image: NDArray[np.uint8]) -> NDArray[np.uint8]:
+    """The image at half the resolution, each pixel the mean of four. An odd last row or column is repeated."""
+    rows, columns = image.shape[:2]
+    image = np.pad(image, ((0, rows % 2), (0, columns % 2), (0, 0)), mode="edge")
+    halved = image.reshape(image.shape[0] // 2, 2, image.shape[1] // 2, 2, 3).mean(axis=(1, 3))
+    return halved.round().astype(np.uint8)
+
+
+def write_pyramid(folder: Path | str, image: NDArray[np.uint8], tile: int = PYRAMID_TILE) -> int:
+    """Write the image as tiles of at most tile pixels, at folder / level / row / column.png. Level 0 is a single
+    tile, and each level doubles the resolution up to that of the image. Returns the number of levels."""
+    levels = [image]
+    while max(levels[-1].shape[:2]) > tile:
+        levels.append(downsample(levels[-1]))
+    for level, level_image in enumerate(reversed(levels)):
+        for row in range(0, level_image.shape[0], tile):
+            row_folder = Path(folder) / str(level) / str(row // tile)
+            row_folder.mkdir(parents=True, exist_ok=True)
+            for column in range(0, level_image.shape[1], tile):
+                write_png(row_folder / f"{column // tile}.png", level_image[row:row + tile, column:column + tile])
+    return len(levels)
+
+
+def main(args: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seed", type=int, default=500)
+    parser.add_argument("--corner", type=int, nargs=2, default=(-50, -50), metavar=("X", "Y"),
+                        help="the scene in the top left corner")
+    parser.add_argument("--size", type=int, nargs=2, default=(100, 100), metavar=("COLUMNS", "ROWS"),
+                        help="the number of scenes")
+    parser.add_argument("--pixels", type=int, default=1,
+                        help="pixels per field. 1 shows the mean colour of each field, more the scaled down images")
+    parser.add_argument("--processes", type=int, help="the number of processes that generate terrain")
+    parser.add_argument("--output", type=Path, default=Path("overview.png"))
+    parser.add_argument("--pyramid", action="store_true", help="write a folder of tiles at output instead")
+    options = parser.parse_args(args)
+    start = time.perf_counter()
+    terrain = generate_terrain(options.seed, tuple(options.corner), tuple(options.size), options.processes)
+    generated = time.perf_counter()
+    image = Palette.load(WorldGenerator.generate(options.seed).fields, options.pixels).render(terrain)
+    rendered = time.perf_counter()
+    if options.pyramid:
+        levels = write_pyramid(options.output, image)
+        written = f"{levels} levels of tiles to {options.output}"
+    else:
+        write_png(options.output, image)
+        written = str(options.output)
+    print(f"{options.size[0]}x{options.size[1]} scenes, {image.shape[1]}x{image.shape[0]} pixels: generated in "
+          f"{generated - start:.2f} s, rendered in {rendered - generated:.2f} s, written in "
+          f"{time.perf_counter() - rendered:.2f} s to {written}")
+
+
+if __name__ == "__main__":
+    main()
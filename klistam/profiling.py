@@ -0,0 +1,105 @@
+"""
+Measures where the time of the game goes.
+"""
+import json
+import time
+from collections import defaultdict, deque
+from collections.abc import Iterator
+from contextlib import AbstractContextManager, contextmanager, nullcontext
+from pathlib import Path
+from typing import Any, Literal
+
+from attrs import define, field
+
+# Returned instead of a measuring context when no timer is set, so that unmeasured phases cost one call.
+NO_PHASE: AbstractContextManager[None] = nullcontext()
+
+
+@define
+class PhaseTimer:
+    """Sums up the time spent in named phases. Phases may be nested, an outer phase includes its inner ones."""
+    totals: defaultdict[str, float] = field(factory=lambda: defaultdict(float))
+    counts: defaultdict[str, int] = field(factory=lambda: defaultdict(int))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] += time.perf_counter() - start
+            self.counts[name] += 1
+
+    def reset(self) -> None:
+        self.totals.clear()
+        self.counts.clear()
+
+
+@define
+class FrameProfiler(PhaseTimer):
+    """A PhaseTimer that also keeps when each phase ran, for the last frames."""
+    # The number of frames that are kept, or None to keep all.
+    history: int | None = None
+    # Per frame the name, start and end of each phase, in the order the phases ended.
+    frames: deque[list[tuple[str, float, float]]] = field()
+    _current: list[tuple[str, float, float]] | None = field(default=None, repr=False)
+
+    @frames.default
+    def _frames_default(self) -> deque[list[tuple[str, float, float]]]:
+        return deque(maxlen=self.history)
+
+    def start_frame(self) -> None:
+        self._current = []
+        self.frames.append(self._current)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.totals[name] += end - start
+            self.counts[name] += 1
+            if self._current is not None:
+                self._current.append((name, start, end))
+
+    def reset(self) -> None:
+        super().reset()
+        self.frames.clear()
+        self._current = None
+
+    def recent(self, frames: int) -> dict[str, tuple[float, float]]:
+        """The mean and the maximum time per frame of each phase over the last frames, in seconds."""
+        last = list(self.frames)[-frames:]
+        per_frame: defaultdict[str, list[float]] = defaultdict(lambda: [0.] * len(last))
+        for index, events in enumerate(last):
+            for name, start, end in events:
+                per_frame[name][index] += end - start
+        return {name: (sum(durations) / len(durations), max(durations)) for name, durations in per_frame.items()}
+
+    def to_json(self) -> dict[str, Any]:
+        """The totals and the phases of each frame, with times in milliseconds since the first kept frame."""
+        origin = self._origin()
+        return {
+            "totals": {name: {"ms": total * 1000, "count": self.counts[name]} for name, total in self.totals.items()},
+            "frames": [[{"name": name, "start": (start - origin) * 1000, "duration": (end - start) * 1000}
+                        for name, start, end in events] for events in self.frames],
+        }
+
+    def to_chrome_trace(self) -> dict[str, Any]:
+        """The phases in the Trace Event Format, to be opened in chrome://tracing or Perfetto."""
+        origin = self._origin()
+        return {
+            "traceEvents": [{"name": name, "ph": "X", "ts": (start - origin) * 1e6, "dur": (end - start) * 1e6,
+                             "pid": 0, "tid": 0, "args": {"frame": index}}
+                            for index, events in enumerate(self.frames) for name, start, end in events],
+            "displayTimeUnit": "ms",
+        }
+
+    def export(self, path: Path | str, format: Literal["json", "chrome"] = "json") -> None:
+        data = self.to_chrome_trace() if format == "chrome" else self.to_json()
+        Path(path).write_text(json.dumps(data))
+
+    def _origin(self) -> float:
+        return min((start for events in self.frames for _name, start, _end in events), default=0.)
@@ -0,0 +1,296 @@
+"""
+Hosts one world for many players, who connect over a local TCP or Unix socket.
+
+Clients and the server exchange JSON objects, one per line. Clients send
+
+* ``{"type": "walk", "direction": "left", "id": 7}`` to walk one field, see DIRECTIONS. The id is optional and is
+  acknowledged in the next tick message.
+* ``{"type": "stats"}`` to get the timings of the last ticks.
+
+The server sends ``{"type": "welcome", ...}`` on connection, and after each tick in which something changed for a
+client ``{"type": "tick", "time": ..., "player": [x, y], "ack": [...], "scenes": [...], "forget": [...]}``. Each of
+the scenes is ``{"coord": [x, y], "added": [[x, y, sprite], ...], "removed": [[x, y], ...]}``, with ``"terrain"`` the
+first time the scene is visible. Scenes that are not visible any more are listed in forget.
+
+Run with ``python -m klistam.server --port 7500``.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator, Sequence
+from itertools import count
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from attrs import define, field
+
+from klistam.klista import CLASSES
+from klistam.world.create_world import SceneInterest, World
+from klistam.world.mob import DIRECTIONS, Mob, Prop, Sprite
+from klistam.world.mob_store import MobStore
+
+# Ticks per second, as in the game, which is not imported for it as it needs pygame.
+TICK_RATE = 40
+# Clients see the scene of their player and the scenes this many scenes around it.
+VIEW_RADIUS = 1
+# The number of ticks of which the timings are kept for stats.
+STATS_TICKS = 1000
+# Clients that do not read their messages are disconnected once this many bytes wait for them.
+MAX_BUFFER = 2 ** 20
+SPAWN_POSITION = (9, 6)
+
+# The mobs of a scene, by their position.
+SceneState = dict[tuple[int, int], str]
+
+
+def dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+def percentiles(values: Sequence[float]) -> dict[str, float]:
+    """The median, the 99th percentile and the maximum of some timings in ms."""
+    if not values:
+        return {}
+    p50, p99, maximum = np.percentile(np.array(values) * 1e3, (50, 99, 100)).tolist()
+    return {"p50": p50, "p99": p99, "max": maximum}
+
+
+@define(eq=False)
+class Client:
+    """A connected player."""
+    key: int
+    mob: Mob
+    writer: asyncio.StreamWriter = field(repr=False)
+    # The direction to walk in once the player stands still.
+    direction: tuple[int, int] | None = None
+    # The ids of the walks that were not acknowledged yet.
+    acks: list[int] = field(factory=list)
+    # The version of each visible scene that the client knows, see SceneFeed.
+    known: dict[tuple[int, int], int] = field(factory=dict, repr=False)
+    sent_position: tuple[int, int] | None = None
+
+    def send(self, message: dict[str, Any]) -> None:
+        self.writer.write(dumps(message).encode() + b"\n")
+
+
+@define
+class SceneFeed:
+    """The mobs of a visible scene, and how they changed in the last tick, encoded once for all clients."""
+    coord: tuple[int, int]
+    terrain: list[list[int]] = field(repr=False)
+    state: SceneState = field(repr=False)
+    # Increases with each change of state.
+    version: int = 0
+    # The scene message from the previous version to this one.
+    delta: str = field(default="", repr=False)
+    _full: str | None = field(default=None, repr=False)
+
+    @property
+    def full(self) -> str:
+        """The scene message for a client that does not know the scene."""
+        if self._full is None:
+            self._full = dumps({"coord": self.coord, "terrain": self.terrain,
+                                "added": [[x, y, sprite] for (x, y), sprite in self.state.items()], "removed": []})
+        return self._full
+
+    def update(self, state: SceneState) -> "SceneFeed":
+        """The feed with the new state, or this one if nothing changed."""
+        if state == self.state:
+            return self
+        delta = dumps({"coord": self.coord,
+                       "added": [[x, y, sprite] for (x, y), sprite in state.items() if self.state.get((x, y)) != sprite],
+                       "removed": [[x, y] for x, y in self.state if (x, y) not in state]})
+        return SceneFeed(self.coord, self.terrain, state, self.version + 1, delta)
+
+
+@define
+class WorldServer:
+    """Ticks a world with the players of the connected clients, and tells every client what changed around it."""
+    world: World
+    rate: float = TICK_RATE
+    view_radius: int = VIEW_RADIUS
+    clients: dict[int, Client] = field(factory=dict, repr=False)
+    # The seconds that the last ticks took.
+    tick_times: deque[float] = field(factory=lambda: deque(maxlen=STATS_TICKS), repr=False)
+    # The feeds of the scenes that clients saw in the last tick.
+    _feeds: dict[tuple[int, int], SceneFeed] = field(factory=dict, repr=False)
+    _keys: Iterator[int] = field(factory=count, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        if self.world.interest is None:
+            self.world.interest = SceneInterest()
+
+    @property
+    def interest(self) -> SceneInterest:
+        assert self.world.interest is not None
+        return self.world.interest
+
+    def connect(self, writer: asyncio.StreamWriter) -> Client:
+        """Add a player for a new connection."""
+        mob = Mob(sprite=Sprite("gnome_f_behind", scope="player"), typ=Prop.Player)
+        self.world.summon(mob, self.world.find_free_position(SPAWN_POSITION, walkable=True))
+        assert mob.position
+        client = Client(next(self._keys), mob, writer)
+        self.clients[client.key] = client
+        self.interest.place(client.key, mob.position.scene)
+        client.send({"type": "welcome", "time": self.world.time, "player": mob.position.coordinates,
+                     "rate": self.rate})
+        return client
+
+    def disconnect(self, client: Client) -> None:
+        if self.clients.pop(client.key, None) is not None:
+            self.world.remove_mob(client.mob)
+            self.interest.remove(client.key)
+
+    def receive(self, client: Client, message: Any) -> None:
+        """Handle a message of a client. Malformed messages are ignored."""
+        if not isinstance(message, dict):
+            return
+        if message.get("type") == "walk" and isinstance(message.get("direction"), str) \
+                and message["direction"] in DIRECTIONS:
+            client.direction = DIRECTIONS[message["direction"]]
+            if "id" in message:
+                client.acks.append(message["id"])
+        elif message.get("type") == "stats":
+            client.send({"type": "stats", "ticks": len(self.tick_times), "clients": len(self.clients),
+                         "scenes": len(self.interest.counts), "tick_ms": percentiles(self.tick_times)})
+
+    def step(self) -> None:
+        """Move the players, tick the world and send the changes to the clients."""
+        start = time.perf_counter()
+        for client in self.clients.values():
+            mob = client.mob
+            assert mob.position
+            if client.direction and not mob.movement:
+                self.world.walk(mob, client.direction)
+                client.direction = None
+            mob.advance_movement()
+            self.interest.place(client.key, mob.position.scene)
+        self.world.tick()
+        self.send_changes()
+        self.tick_times.append(time.perf_counter() - start)
+
+    def visible_scenes(self, middle: tuple[int, int]) -> frozenset[tuple[int, int]]:
+        """The scenes that a client sees while its player is in the scene middle."""
+        middle_x, middle_y = middle
+        return frozenset((x, y) for y in range(middle_y - self.view_radius, middle_y + self.view_radius + 1)
+                         for x in range(middle_x - self.view_radius, middle_x + self.view_radius + 1))
+
+    def update_feeds(self, coords: Iterable[tuple[int, int]]) -> None:
+        """Gather the mobs of the scenes that clients see, once per tick however many clients see a scene."""
+        feeds = {}
+        for coord in coords:
+            scene = self.world.get_scene(coord)
+            state = {mob.position.coordinates: mob.sprite.name
+                     for mob in self.world.get_visible_mobs(scene) if mob.position and mob.sprite}
+            if (feed := self._feeds.get(coord)) is None:
+                feed = SceneFeed(coord, scene.terrain.tolist(), state)
+            feeds[coord] = feed.update(state)
+        self._feeds = feeds
+
+    def send_changes(self) -> None:
+        """Send each client the changes in the scenes it sees. A client that knows the previous version of a scene
+        gets the delta of the feed, one that does not know the scene gets all of it."""
+        by_middle: dict[tuple[int, int], frozenset[tuple[int, int]]] = {}
+        for client in self.clients.values():
+            assert client.mob.position
+            if client.mob.position.scene not in by_middle:
+                by_middle[client.mob.position.scene] = self.visible_scenes(client.mob.position.scene)
+        visible = {client.key: by_middle[client.mob.position.scene] for client in self.clients.values()
+                   if client.mob.position}
+        self.update_feeds(frozenset().union(*by_middle.values()))
+        for client in list(self.clients.values()):
+            scenes = []
+            for coord in visible[client.key]:
+                feed = self._feeds[coord]
+                version = client.known.get(coord)
+                if version == feed.version:
+                    continue
+                scenes.append(feed.delta if version == feed.version - 1 else feed.full)
+                client.known[coord] = feed.version
+            forget = [coord for coord in client.known if coord not in visible[client.key]]
+            for coord in forget:
+                del client.known[coord]
+            position = client.mob.position.coordinates if client.mob.position else None
+            if scenes or forget or client.acks or position != client.sent_position:
+                # The scenes are encoded already.
+                client.writer.write(f'{{"type":"tick","time":{self.world.time},"player":{dumps(position)},'
+                                    f'"ack":{dumps(client.acks) if client.acks else "[]"},'
+                                    f'"scenes":[{",".join(scenes)}],"forget":{dumps(forget) if forget else "[]"}}}\n'
+                                    .encode())
+                client.acks = []
+                client.sent_position = position
+            if client.writer.transport.get_write_buffer_size() > MAX_BUFFER:
+                print(f"Client {client.key} does not keep up, disconnecting")
+                client.writer.close()
+                self.disconnect(client)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client = self.connect(writer)
+        try:
+            while line := await reader.readline():
+                self.receive(client, json.loads(line))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self.disconnect(client)
+            writer.close()
+
+    async def run(self, ticks: int | None = None) -> None:
+        """Tick at rate until cancelled, or for a number of ticks. Ticks that are late are not made up for."""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        for _tick in range(ticks) if ticks is not None else count():
+            self.step()
+            next_tick = max(next_tick + 1 / self.rate, loop.time())
+            await asyncio.sleep(next_tick - loop.time())
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 0, path: Path | None = None,
+                    ready: "asyncio.Future[str] | None" = None) -> None:
+        """Accept clients on a Unix socket at path, or else on a TCP port, and tick until cancelled. The address is
+        printed and set on ready."""
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path)
+            address = str(path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            address = "{}:{}".format(*server.sockets[0].getsockname()[:2])
+        print(f"Listening on {address}", flush=True)
+        if ready is not None:
+            ready.set_result(address)
+        async with server:
+            await self.run()
+
+
+def create_world(seed: int, quiet: bool = True) -> World:
+    """A world without a player of its own, for a server. If quiet, loading the classes prints nothing."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull if quiet else sys.stdout):
+        CLASSES.preload()
+    world = World.generate(seed, player=False)
+    world.mob_store = MobStore()
+    world.interest = SceneInterest()
+    return world
+
+
+def main(args: Sequence[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seed", type=int, default=500)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7500, help="0 to take any free port")
+    parser.add_argument("--unix", type=Path, help="listen on a Unix socket at this path instead")
+    parser.add_argument("--rate", type=float, default=TICK_RATE, help="ticks per second")
+    options = parser.parse_args(args)
+    server = WorldServer(create_world(options.seed), options.rate)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(server.serve(options.host, options.port, options.unix))
+    server.world.close()
+
+
+if __name__ == "__main__":
+    main()
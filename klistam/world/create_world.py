@@ -1,28 +1,54 @@
 """
 script with terrain information
 """
-import random
-from collections import Counter
-from collections.abc import Iterable
+import hashlib
+import heapq
+import os
+import threading
+from collections import Counter, OrderedDict
+from collections.abc import Hashable, Iterable, Iterator
+from contextlib import AbstractContextManager
 from datetime import datetime
+from functools import cache
 from itertools import count
 from pathlib import Path
 from typing import Optional, Any
 
 import numpy as np
-import scipy  # type: ignore
-import yaml
 from attrs import define, field
 from numpy.typing import NDArray
 from typing_extensions import Self
 
-from klistam.klista import Klistam, KlistamClass
+from klistam.klista import CLASSES, Klistam
+from klistam.profiling import NO_PHASE, PhaseTimer
 from klistam.world import WIDTH, HEIGHT
-from klistam.world.mob import Mob, Position, Prop, Sprite, KlistamEncounter
+from klistam.world.loader import SceneLoader
+from klistam.world.savegame import SaveFile, SaveFormatError, SaveSnapshot
+from klistam.world.storage import SceneStore, TerrainCache, encode_scene
+from klistam.world.mob_store import ENCOUNTER, MobStore
+from klistam.world.mob import POSITION_DTYPE, Mob, Movement, Position, Prop, Sprite, KlistamEncounter
 
 LOAD_RADIUS = 3
 ENCOUNTER_TIME = 120 * 30
 SPAWN_RATE = 1 / 0x1000
+# By distance of a scene to the scene of the player, the number of ticks between updates of the scene. Scenes further
+# away are only updated when they come closer, catching up on the time they missed.
+TICK_INTERVALS = (1, 8)
+IMPACT_FACTOR = 4 / 5
+# A default for World.capacity, that keeps some scenes behind the player in memory.
+SCENE_CAPACITY = 4 * (2 * LOAD_RADIUS + 1) ** 2
+FIELDS_FILE = Path(__file__).parent.resolve() / "resources" / "fields.yml"
+# Must be increased whenever a change to the generator changes the terrain it generates.
+GENERATOR_VERSION = 2
+# Scenes are generated in aligned blocks of this many scenes in each direction. The terrain is continuous inside a
+# block. Between blocks it is not, as that would make the terrain depend on the order in which scenes are generated.
+REGION_SCENES = 4
+# Enough for all regions that the loaded scenes and those one scene ahead can span, see World.prefetch_scenes.
+REGION_CACHE_SIZE = ((2 * LOAD_RADIUS + 1) // REGION_SCENES + 2) ** 2
+# The stream of WorldGenerator.get_rng used for regions.
+REGION_STREAM = 1
+# Source of Scene.revision, shared by all scenes so that a revision identifies a scene as well as its state.
+_revisions = count()
 
 
 @define(eq=False)
@@ -40,10 +66,11 @@ class Field:
     def generate_fields(cls, parent: "Field | None", obj_info: str | dict[str, Any]) -> list["Field"]:
         fields = list()
         if isinstance(obj_info, str):
-            fields.append(cls(parent=parent, name=obj_info))
+            # A category given by its name only is like its parent.
+            fields.append(cls(parent=parent, name=obj_info, walkable=parent.walkable if parent else False))
         else:
             assert "name" in obj_info
-            walkable = obj_info["walkable"] if "walkable" in obj_info else (parent.walkable if parent else None)
+            walkable = obj_info["walkable"] if "walkable" in obj_info else (parent.walkable if parent else False)
             instance = cls(parent=parent, name=obj_info["name"],
                            walkable=walkable)
             fields.append(instance)
@@ -56,33 +83,231 @@ class Field:
         return fields
 
 
+@define(eq=False)
+class FieldTable:
+    """All fields of a world. Scenes store the index of a field in this table instead of the field itself."""
+    fields: list[Field] = field(factory=list)
+    # Per field id, so that a terrain array can be mapped with a single lookup.
+    names: NDArray[np.str_] = field(init=False, repr=False)
+    walkable: NDArray[np.bool_] = field(init=False, repr=False)
+    # Identifies the definitions the fields were loaded from.
+    digest: str = ""
+
+    def __attrs_post_init__(self) -> None:
+        self.names = np.array([f.name for f in self.fields], dtype=np.str_)
+        self.walkable = np.array([bool(f.walkable) for f in self.fields], dtype=np.bool_)
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def __getitem__(self, field_id: int) -> Field:
+        return self.fields[field_id]
+
+    def __iter__(self) -> Iterator[Field]:
+        return iter(self.fields)
+
+    @property
+    def dtype(self) -> np.dtype:
+        """The smallest unsigned integer type that can hold all field ids."""
+        return np.min_scalar_type(max(len(self.fields) - 1, 0))
+
+
 @define
 class Scene:
     """A fixed part of the world that is visible at once and fills the screen."""
-    terrain: np.ndarray
+    # Shape (rows, columns). Ids of the fields in the field table.
+    terrain: NDArray[np.unsignedinteger]
     start_coord: tuple[int, int]
+    fields: FieldTable = field(repr=False)
     _mobs: list[Mob] = field(factory=list)  # sortedcontainers.SortedKeyList ? -> Mob must be freezed.
     update_time: float = float("-inf")
+    # The mobs by their coordinates inside the scene, and the same as a mask of shape (HEIGHT, WIDTH).
+    _occupants: dict[tuple[int, int], Mob] = field(factory=dict, init=False, repr=False)
+    occupied: NDArray[np.bool_] = field(init=False, repr=False)
+    # Changes whenever occupied changes. Change occupied through set_occupied only.
+    revision: int = field(factory=lambda: next(_revisions), init=False, repr=False)
+    # The revision and the mask of get_passable.
+    _passable: tuple[int, NDArray[np.bool_]] | None = field(default=None, init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self.occupied = np.zeros((HEIGHT, WIDTH), dtype=np.bool_)
+        for mob in self._mobs:
+            self._occupy(mob)
+
+    def get_field(self, x: int, y: int) -> Field:
+        return self.fields[self.terrain[y, x]]
 
     def get_terrain_file(self, x: int, y: int) -> str:
-        the_field: Field = self.terrain[y][x]
-        assert the_field
-        return the_field.name
+        return self.fields.names[self.terrain[y, x]]
+
+    @property
+    def walkable(self) -> NDArray[np.bool_]:
+        """A mask of the shape of terrain that is true for walkable fields."""
+        return self.fields.walkable[self.terrain]
+
+    def is_walkable(self, x: int, y: int) -> bool:
+        return bool(self.fields.walkable[self.terrain[y, x]])
+
+    def get_passable(self) -> NDArray[np.bool_]:
+        """A mask of the fields that can be walked on now: walkable and not occupied. Do not modify it."""
+        if self._passable is None or self._passable[0] != self.revision:
+            self._passable = self.revision, self.walkable & ~self.occupied
+        return self._passable[1]
+
+    def set_occupied(self, x: int | NDArray[np.integer], y: int | NDArray[np.integer], value: bool) -> None:
+        """Mark fields inside the scene as occupied or free."""
+        self.occupied[y, x] = value
+        self.revision = next(_revisions)
 
     @property
     def mobs(self) -> Iterable[Mob]:
         """Iterate over all mobs in the scene."""
         return self._mobs
 
+    def get_mob_at(self, x: int, y: int) -> Mob | None:
+        """The mob at coordinates inside the scene."""
+        return self._occupants.get((x, y))
+
     def add_mob(self, mob: Mob):
         assert mob not in self._mobs
         self._mobs.append(mob)
+        self._occupy(mob)
 
     def remove_mob(self, mob: Mob):
         self._mobs.remove(mob)
+        self._vacate(mob)
 
     def remove_mob_idx(self, idx: int):
-        del self._mobs[idx]
+        self._vacate(self._mobs.pop(idx))
+
+    def _occupy(self, mob: Mob) -> None:
+        assert mob.position
+        x, y = mob.position.scene_coordinates
+        self._occupants[x, y] = mob
+        self.set_occupied(x, y, True)
+
+    def _vacate(self, mob: Mob) -> None:
+        assert mob.position
+        x, y = mob.position.scene_coordinates
+        if self._occupants.get((x, y)) is mob:
+            del self._occupants[x, y]
+            self.set_occupied(x, y, False)
+
+
+def loaded_scene_coords(middle: tuple[int, int]) -> Iterator[tuple[int, int]]:
+    """The coordinates of the scenes that are loaded while the player is in the scene middle."""
+    middle_x, middle_y = middle
+    for x in range(middle_x - LOAD_RADIUS - 1, middle_x + LOAD_RADIUS):
+        for y in range(middle_y - LOAD_RADIUS - 1, middle_y + LOAD_RADIUS):
+            yield x, y
+
+
+@define
+class SceneInterest:
+    """The scenes around several players, each as in loaded_scene_coords. A scene counts the players close to it, so
+    that it is loaded when the first of them comes close, released when the last one leaves, and ticked once no matter
+    how many players are close."""
+    # The scene of each player, by a key chosen by the caller.
+    _players: dict[Hashable, tuple[int, int]] = field(factory=dict, repr=False)
+    # The number of players close to each scene.
+    counts: Counter[tuple[int, int]] = field(factory=Counter, repr=False)
+    # The scenes that became interesting or were released since take_changes.
+    _added: set[tuple[int, int]] = field(factory=set, repr=False)
+    _released: set[tuple[int, int]] = field(factory=set, repr=False)
+    # By distance to the closest player, the scenes. Computed when needed.
+    _tiers: list[list[tuple[int, int]]] | None = field(default=None, repr=False)
+
+    def __contains__(self, coord: tuple[int, int]) -> bool:
+        return coord in self.counts
+
+    def scene_of(self, player: Hashable) -> tuple[int, int] | None:
+        return self._players.get(player)
+
+    def place(self, player: Hashable, scene: tuple[int, int]) -> None:
+        """Add a player in a scene, or move it to another scene."""
+        old = self._players.get(player)
+        if old == scene:
+            return
+        if old is not None:
+            self._release_around(old)
+        self._players[player] = scene
+        for coord in loaded_scene_coords(scene):
+            self.counts[coord] += 1
+            if self.counts[coord] == 1:
+                self._added.add(coord)
+                self._released.discard(coord)
+        self._tiers = None
+
+    def remove(self, player: Hashable) -> None:
+        if (scene := self._players.pop(player, None)) is not None:
+            self._release_around(scene)
+            self._tiers = None
+
+    def _release_around(self, scene: tuple[int, int]) -> None:
+        for coord in loaded_scene_coords(scene):
+            self.counts[coord] -= 1
+            if not self.counts[coord]:
+                del self.counts[coord]
+                self._released.add(coord)
+                self._added.discard(coord)
+
+    def take_changes(self) -> tuple[set[tuple[int, int]], set[tuple[int, int]]]:
+        """The scenes that became interesting and those that were released since the last call."""
+        changes = self._added, self._released
+        self._added, self._released = set(), set()
+        return changes
+
+    def tiers(self) -> list[list[tuple[int, int]]]:
+        """The scenes by their distance to the closest player, counting diagonal steps as one."""
+        if self._tiers is None:
+            distances: dict[tuple[int, int], int] = {}
+            for middle_x, middle_y in set(self._players.values()):
+                for x, y in loaded_scene_coords((middle_x, middle_y)):
+                    distance = max(abs(x - middle_x), abs(y - middle_y))
+                    if distance < distances.get((x, y), distance + 1):
+                        distances[x, y] = distance
+            self._tiers = [[] for _ in range(max(distances.values(), default=-1) + 1)]
+            for coord, distance in distances.items():
+                self._tiers[distance].append(coord)
+        return self._tiers
+
+
+@cache
+def spiral_offsets(length: int) -> NDArray[np.int_]:
+    """The first length offsets of a counter-clockwise spiral around (0, 0), starting upwards. Shape (length, 2)."""
+    offsets = np.empty((length, 2), dtype=np.int_)
+    offsets[0] = check_pos = np.zeros(2, dtype=np.int_)
+    check_dir = np.array((0, -1))
+    circulation_matrix = np.array(((0, -1), (1, 0)))  # counter-clockwise
+    i = 1
+    for segment in count(2):
+        for _pos in range(segment // 2):
+            if i == length:
+                return offsets
+            check_pos += check_dir
+            offsets[i] = check_pos
+            i += 1
+        check_dir = check_dir @ circulation_matrix
+    raise ValueError("Unreachable code.")
+
+
+@cache
+def ring_offsets(distance: int) -> tuple[tuple[int, int], ...]:
+    """The offsets of the scenes at a distance from a scene, counting diagonal steps as one."""
+    return tuple((x, y) for y in range(-distance, distance + 1) for x in range(-distance, distance + 1)
+                 if max(abs(x), abs(y)) == distance)
+
+
+@cache
+def wavefronts(height: int, width: int) -> tuple[tuple[NDArray[np.intp], ...], ...]:
+    """Per anti-diagonal of a block of shape (height, width), the indices of its cells and of their neighbours above
+    left, above and to the left in the flattened grid of shape (height + 1, width + 1) around the block."""
+    fronts = []
+    for diagonal in range(2, height + width + 1):
+        rows = np.arange(max(1, diagonal - width), min(height, diagonal - 1) + 1)
+        cells = rows * (width + 1) + diagonal - rows
+        fronts.append((cells, cells - width - 2, cells - width - 1, cells - 1))
+    return tuple(fronts)
 
 
 def to_2tuple(coord_array: NDArray[np.int32]) -> tuple[int, int]:
@@ -93,14 +318,125 @@ def to_2tuple(coord_array: NDArray[np.int32]) -> tuple[int, int]:
 @define
 class World:
     generator: "WorldGenerator"
-    _scenes: dict[tuple[int, int], Scene] = field(factory=dict, repr=False)
+    # In order of last access.
+    _scenes: OrderedDict[tuple[int, int], Scene] = field(factory=OrderedDict, repr=False)
     player: Mob | None = None
     time: int = 0
+    # If set, scenes ahead of the player are generated in the background.
+    loader: SceneLoader | None = None
+    # If set, at most this many scenes are kept in memory. The others are moved to the store.
+    capacity: int | None = None
+    store: SceneStore | None = None
+    rng: np.random.Generator = field(factory=np.random.default_rng, repr=False)
+    # If set, the time of the phases of tick is measured.
+    timer: PhaseTimer | None = None
+    # If set, spawned encounters are kept in this store instead of the mob lists of the scenes.
+    mob_store: MobStore | None = None
+    spawn_rate: float = SPAWN_RATE
+    # See TICK_INTERVALS. If None, all loaded scenes are updated every tick.
+    tick_intervals: tuple[int, ...] | None = TICK_INTERVALS
+    # If set, scenes that are not in memory or in the store are read from this save before they are generated.
+    save_file: SaveFile | None = None
+    # If set, the terrain of new scenes is taken from this cache if it was generated before.
+    terrain_cache: TerrainCache | None = None
+    # A min-heap of (end, order, mob) for the encounters in memory.
+    _expiry: list[tuple[float, int, Mob]] = field(factory=list, init=False, repr=False)
+    _expiry_order: Iterator[int] = field(factory=count, init=False, repr=False)
+    # If set, the scenes around the players in it are loaded and ticked, instead of those around player.
+    interest: SceneInterest | None = None
+    # The scene of the player when all scenes around it were last loaded.
+    _loaded_middle: tuple[int, int] | None = field(default=None, init=False, repr=False)
 
     def get_scene(self, coord: tuple[int, int]) -> Scene:
-        if coord not in self._scenes:
-            self._scenes[coord] = self.generator.get_terrain(coord)
-        return self._scenes[coord]
+        if (scene := self._scenes.get(coord)) is not None:
+            self._scenes.move_to_end(coord)
+            return scene
+        if self.store and coord in self.store:
+            scene = self.store.take(coord, self.generator.fields)
+            for mob in scene.mobs:
+                self._track_expiry(mob)
+        elif self.save_file is not None and coord in self.save_file:
+            scene = self.save_file.read_scene(coord, self.generator.fields)
+            for mob in scene.mobs:
+                self._track_expiry(mob)
+        elif self.terrain_cache is not None and coord in self.terrain_cache:
+            scene = self.terrain_cache.load(coord, self.generator.fields)
+        else:
+            with self.phase("generate"):
+                scene = self.loader.take(coord) if self.loader else self.generator.get_scene(coord)
+            if self.terrain_cache is not None:
+                self.terrain_cache.save(scene)
+        self._add_scene(scene)
+        return scene
+
+    def peek_scene(self, coord: tuple[int, int]) -> Scene | None:
+        """The scene if it is in memory, without loading it or counting it as used."""
+        return self._scenes.get(coord)
+
+    def _add_scene(self, scene: Scene) -> None:
+        self._scenes[scene.start_coord] = scene
+        if self.mob_store is not None:
+            # Mobs of the store stay in it while their scene is not in memory.
+            slots = self.mob_store.in_rect(scene.start_coord[0] * WIDTH, scene.start_coord[1] * HEIGHT, WIDTH, HEIGHT)
+            scene.set_occupied(self.mob_store.x[slots] % WIDTH, self.mob_store.y[slots] % HEIGHT, True)
+
+    def store_mobs(self, x: NDArray[np.int64], y: NDArray[np.int64], kind: int, sprite_id: int, class_id: int = -1,
+                   start: float | NDArray[np.float64] = 0.,
+                   end: float | NDArray[np.float64] = np.inf) -> NDArray[np.intp]:
+        """Add mobs at distinct positions to the mob store and mark their fields as occupied in the scenes in memory.
+        Mobs on fields that are occupied already are dropped. Returns the slots of the added mobs."""
+        assert self.mob_store is not None
+        scene_x, local_x = np.divmod(x, WIDTH)
+        scene_y, local_y = np.divmod(y, HEIGHT)
+        scenes = [self._scenes.get(coord) for coord in zip(scene_x.tolist(), scene_y.tolist())]
+        keep = ~self.mob_store.holds(x, y) & ~np.array(
+            [scene is not None and bool(scene.occupied[field_y, field_x])
+             for scene, field_x, field_y in zip(scenes, local_x.tolist(), local_y.tolist())], dtype=np.bool_)
+        slots = self.mob_store.add(x[keep], y[keep], kind, sprite_id, class_id,
+                                   np.broadcast_to(start, x.shape)[keep], np.broadcast_to(end, x.shape)[keep])
+        for scene, field_x, field_y, kept in zip(scenes, local_x.tolist(), local_y.tolist(), keep.tolist()):
+            if kept and scene is not None:
+                scene.set_occupied(field_x, field_y, True)
+        return slots
+
+    def phase(self, name: str) -> AbstractContextManager[None]:
+        """Measure the time of a phase, if there is a timer."""
+        return self.timer.phase(name) if self.timer else NO_PHASE
+
+    def is_known_scene(self, coord: tuple[int, int]) -> bool:
+        """Whether the scene has been created, either in memory, in the store or in the save file."""
+        return (coord in self._scenes or bool(self.store and coord in self.store)
+                or (self.save_file is not None and coord in self.save_file))
+
+    def evict_scenes(self) -> None:
+        """Move scenes to the store until there are no more than capacity left in memory. Scenes far away from the
+        player go first, and of those at the same distance the least recently used. Scenes close to any player of
+        interest are never moved."""
+        if self.capacity is None or len(self._scenes) <= self.capacity:
+            return
+        middle_x, middle_y = (self.player.position.scene if self.player and self.player.position else (0, 0))
+        loaded = set(loaded_scene_coords((middle_x, middle_y)))
+        candidates = sorted((coord for coord in self._scenes
+                             if coord not in loaded and (self.interest is None or coord not in self.interest)),
+                            key=lambda coord: max(abs(coord[0] - middle_x), abs(coord[1] - middle_y)), reverse=True)
+        for coord in candidates[:len(self._scenes) - self.capacity]:
+            self.release_scene(coord)
+
+    def release_scene(self, coord: tuple[int, int]) -> None:
+        """Move a scene from memory to the store."""
+        if (scene := self._scenes.pop(coord, None)) is not None:
+            if self.store is None:
+                self.store = SceneStore()
+            self.store.save(scene)
+
+    def close(self) -> None:
+        """Stop generating scenes in the background, remove a temporary store and close the save file."""
+        if self.loader:
+            self.loader.shutdown()
+        if self.store:
+            self.store.close()
+        if self.save_file is not None:
+            self.save_file.close()
 
     def get_player_scene(self) -> Scene:
         """Return the Scene that the player is in. If there is no player, the scene at the origin is returned."""
@@ -108,97 +444,367 @@ class World:
             return self.get_scene(self.player.position.scene)
         return self.get_scene((0, 0))
 
-    def get_object_at(self, coord: NDArray[np.int32]) -> None | Mob:
-        for mob in self.get_scene(Position(coord).scene).mobs:
-            if mob.position and np.array_equal(mob.position.coordinates, coord):
-                return mob
+    def get_object_at(self, coord: Position | tuple[int, int]) -> None | Mob:
+        position = coord if isinstance(coord, Position) else Position.from_tuple(coord)
+        if mob := self.get_scene(position.scene).get_mob_at(*position.scene_coordinates):
+            return mob
+        if self.mob_store is not None and (slot := self.mob_store.slot_at(position)) is not None:
+            return self.mob_store.view(slot)
         return None
 
+    def get_visible_mobs(self, scene: Scene) -> Iterable[Mob]:
+        """The mobs in the scene, including those in the mob store."""
+        yield from scene.mobs
+        yield from self._stored_mobs(scene.start_coord)
+
+    def get_mobs_in_rect(self, left: int, top: int, width: int, height: int) -> Iterator[Mob]:
+        """The mobs on a rectangle of fields in world coordinates. They are looked up by their coordinates, through the
+        occupancy of the scenes and the mob store, instead of going through the mobs of each scene. Scenes that are
+        not in memory are skipped."""
+        for scene_y in range(top // HEIGHT, (top + height - 1) // HEIGHT + 1):
+            for scene_x in range(left // WIDTH, (left + width - 1) // WIDTH + 1):
+                if (scene := self._scenes.get((scene_x, scene_y))) is None:
+                    continue
+                first_x, first_y = max(left - scene_x * WIDTH, 0), max(top - scene_y * HEIGHT, 0)
+                ys, xs = np.nonzero(scene.occupied[first_y:top + height - scene_y * HEIGHT,
+                                                   first_x:left + width - scene_x * WIDTH])
+                for x, y in zip((xs + first_x).tolist(), (ys + first_y).tolist()):
+                    # Fields of the mob store are occupied as well.
+                    if (mob := scene.get_mob_at(x, y)) is not None:
+                        yield mob
+        if self.mob_store is not None:
+            for slot in self.mob_store.in_rect(left, top, width, height).tolist():
+                yield self.mob_store.view(slot)
+
+    def _stored_mobs(self, coord: tuple[int, int]) -> Iterator[Mob]:
+        if self.mob_store is not None:
+            for slot in self.mob_store.in_rect(coord[0] * WIDTH, coord[1] * HEIGHT, WIDTH, HEIGHT).tolist():
+                yield self.mob_store.view(slot)
+
     @classmethod
-    def generate(cls, seed: int | None = None) -> Self:
-        self = cls(WorldGenerator.generate(seed))
-        # Place player
-        self.player = Mob(sprite=Sprite("gnome_f_behind", scope="player"), typ=Prop.Player)
-        self.summon(self.player, (WIDTH // 2, HEIGHT // 2))
+    def generate(cls, seed: int | None = None, player: bool = True) -> Self:
+        """A new world. Without player, for example for a server, the world has no player of its own."""
+        generator = WorldGenerator.generate(seed)
+        self = cls(generator, rng=np.random.default_rng(generator.seed & 0xFFFF_FFFF_FFFF_FFFF))
+        if player:
+            self.place_player((WIDTH // 2, HEIGHT // 2))
+        return self
+
+    @classmethod
+    def load(cls, path: Path | str) -> Self:
+        """Resume a saved world. Its scenes are read from the file when they are first needed. Saves of another
+        version of the generator or of the fields cannot be resumed, as their terrain would not fit."""
+        save_file = SaveFile.open(path)
+        generator = WorldGenerator.generate(save_file.seed)
+        if save_file.generator != generator.cache_key():
+            save_file.close()
+            raise SaveFormatError(f"{path} was generated by {save_file.generator}, expected {generator.cache_key()}")
+        self = cls(generator, time=save_file.time, save_file=save_file,
+                   rng=np.random.default_rng((generator.seed & 0xFFFF_FFFF_FFFF_FFFF, save_file.time)))
+        if save_file.player is not None:
+            self.place_player(save_file.player)
         return self
 
-    def summon(self, mob: Mob, position: tuple[int, int] | NDArray[np.int32]) -> None:
+    def place_player(self, position: Position | tuple[int, int]) -> None:
+        self.player = Mob(sprite=Sprite("gnome_f_behind", scope="player"), typ=Prop.Player)
+        # The player does not start on a tree or a stone.
+        self.summon(self.player, self.find_free_position(position, walkable=True))
+
+    def snapshot(self) -> SaveSnapshot:
+        """Take what is needed to save the world. Only the scenes in memory are encoded, the others are read from
+        disk when the snapshot is written, so that this can happen in the background while the game goes on."""
+        player = self.player.position.coordinates if self.player and self.player.position else None
+        snapshot = SaveSnapshot(self.generator.seed, self.time, player, self.generator.cache_key(),
+                                fields=self.generator.fields)
+        if self.store is not None:
+            snapshot.store = self.store
+            snapshot.stored = self.store.hold()
+            if self.mob_store is not None:
+                snapshot.stored_mobs = self.mob_store.copy()
+        if self.save_file is not None:
+            # The scenes in the store are newer than those of the save file.
+            snapshot.save_file = self.save_file
+            snapshot.saved = [coord for coord in self.save_file
+                              if coord not in self._scenes and not (self.store is not None and coord in self.store)]
+        for coord, scene in self._scenes.items():
+            snapshot.scenes[coord] = encode_scene(scene, [mob for mob in self.get_visible_mobs(scene)
+                                                          if mob is not self.player]), False
+        return snapshot
+
+    def replace_save(self, temporary: Path, path: Path | str) -> None:
+        """Move a save from SaveSnapshot.write_temporary to path. If the world was resumed from path, its save file is
+        closed meanwhile, as open files cannot be replaced on all systems, and opened again, as the new save has all
+        the scenes of the old one."""
+        reopen = self.save_file is not None and self.save_file.path.resolve() == Path(path).resolve()
+        if reopen and self.save_file is not None:
+            self.save_file.close()
+        try:
+            os.replace(temporary, path)
+        finally:
+            if reopen:
+                self.save_file = SaveFile.open(path)
+
+    def summon(self, mob: Mob, position: Position | tuple[int, int]) -> None:
         """Summon a mob at a position. If the mob was on the map before, it is correctly removed."""
+        is_new = mob.position is None
         self.remove_mob(mob)
         mob.position = self.find_free_position(position)
         scene = self.get_scene(mob.position.scene)
         scene.add_mob(mob)
+        if is_new:
+            self._track_expiry(mob)
 
     def remove_mob(self, mob: Mob) -> None:
-        if mob.position:
+        if self.mob_store is not None and (slot := self.mob_store.slot_of(mob)) is not None:
+            self._remove_stored_mobs(np.array([slot]))
+        elif mob.position:
             old_scene = self.get_scene(mob.position.scene)
             old_scene.remove_mob(mob)
             mob.position = None
 
-    def find_free_position(self, position: tuple[int, int] | NDArray[np.int32]) -> Position:
-        """Find a free position to place an object around a position."""
-        check_pos = np.array(position)
-        if not self.get_object_at(check_pos):
-            return Position(check_pos)
-        check_dir = np.array((0, -1))
-        circulation_matrix = np.array(((0, -1), (1, 0)))  # counter-clockwise
-        for segment in count(2):
-            for _pos in range(segment // 2):
-                check_pos += check_dir
-                if not self.get_object_at(check_pos):
-                    return Position(check_pos)
-            check_dir = check_dir @ circulation_matrix
+    def walk(self, mob: Mob, direction: tuple[int, int]) -> Mob | None:
+        """Let a mob start walking to the next field in a direction. If there is an object in the way, the mob stays
+        and the object is returned."""
+        assert mob.position
+        target = mob.position + direction
+        if obj := self.get_object_at(target):
+            mob.movement = Movement((0, 0))
+            return obj
+        mob.movement = Movement(direction)
+        self.summon(mob, target)
+        return None
+
+    def find_free_position(self, position: Position | tuple[int, int], walkable: bool = False) -> Position:
+        """Find a free position to place an object around a position, searching in a spiral. If walkable is set, only
+        positions with walkable terrain are free."""
+        with self.phase("lookup"):
+            return self._find_free_position(position, walkable)
+
+    def _find_free_position(self, coord: Position | tuple[int, int], walkable: bool) -> Position:
+        position = coord if isinstance(coord, Position) else Position.from_tuple(coord)
+        if not self.get_object_at(position) and (
+                not walkable or self.get_scene(position.scene).is_walkable(*position.scene_coordinates)):
+            return position
+        scene_size = np.array((WIDTH, HEIGHT))
+        checked = 1
+        for side in count(3, 2):
+            # The spiral up to a square of the side length, without the part that has been checked before.
+            candidates = np.array(position.coordinates) + spiral_offsets(side * side)[checked:]
+            checked = side * side
+            scenes = candidates // scene_size
+            local = candidates % scene_size
+            free = np.empty(len(candidates), dtype=np.bool_)
+            for scene_coord in np.unique(scenes, axis=0):
+                in_scene = (scenes == scene_coord).all(axis=1)
+                scene = self.get_scene(to_2tuple(scene_coord))
+                mask = scene.get_passable() if walkable else ~scene.occupied
+                free[in_scene] = mask[local[in_scene, 1], local[in_scene, 0]]
+            if free.any():
+                return Position.from_tuple(candidates[free.argmax()])
         raise ValueError("Unreachable code.")
 
     def tick(self):
         self.time += 1
-        for scene in self.get_loaded_scenes():
-            self.tick_scene(scene)
+        with self.phase("load"):
+            if self.loader:
+                self.collect_scenes()
+                self.prefetch_scenes()
+            scenes = self.get_due_scenes()
+        self.tick_scenes(scenes)
+        with self.phase("evict"):
+            self.evict_scenes()
+
+    def get_due_scenes(self) -> list[Scene]:
+        """Load the scenes around the player and return those that have to be updated in this tick, see
+        tick_intervals. The loaded scenes are only gone through again once the player enters another scene."""
+        if self.interest is not None:
+            return self.get_interesting_scenes()
+        if not (self.player and self.player.position):
+            return []
+        middle = self.player.position.scene
+        if self.tick_intervals is None:
+            return list(self.get_ready_scenes() if self.loader else self.get_loaded_scenes())
+        if middle != self._loaded_middle:
+            loaded = list(self.get_ready_scenes() if self.loader else self.get_loaded_scenes())
+            # With a loader, some scenes may still be on their way.
+            if len(loaded) == (2 * LOAD_RADIUS + 1) ** 2:
+                self._loaded_middle = middle
+        due = []
+        for distance, interval in enumerate(self.tick_intervals):
+            for offset_x, offset_y in ring_offsets(distance):
+                scene = self._scenes.get((middle[0] + offset_x, middle[1] + offset_y))
+                if scene is not None and self.time - scene.update_time >= interval:
+                    due.append(scene)
+        return due
+
+    def get_interesting_scenes(self) -> list[Scene]:
+        """Load the scenes that a player came close to, release those that all players left, and return the scenes
+        that have to be updated in this tick, see tick_intervals."""
+        assert self.interest is not None
+        added, released = self.interest.take_changes()
+        for coord in released:
+            self.release_scene(coord)
+        for coord in added:
+            if self.loader and not self.is_known_scene(coord) and not (
+                    self.terrain_cache is not None and coord in self.terrain_cache):
+                self.loader.prefetch(coord)
+            else:
+                self.get_scene(coord)
+        due = []
+        tiers = self.interest.tiers()
+        for interval, coords in zip(self.tick_intervals or (1,) * len(tiers), tiers):
+            for coord in coords:
+                scene = self._scenes.get(coord)
+                if scene is not None and self.time - scene.update_time >= interval:
+                    due.append(scene)
+        return due
 
     def get_loaded_scenes(self) -> Iterable[Scene]:
         if self.player and self.player.position:
-            middle_x, middle_y = self.player.position.scene
-            for x in range(middle_x - LOAD_RADIUS - 1, middle_x + LOAD_RADIUS):
-                for y in range(middle_y - LOAD_RADIUS - 1, middle_y + LOAD_RADIUS):
-                    yield self.get_scene((x, y))
+            for coord in loaded_scene_coords(self.player.position.scene):
+                yield self.get_scene(coord)
+
+    def get_ready_scenes(self) -> Iterable[Scene]:
+        """The loaded scenes that are there without generating them. The others are requested from the loader, and
+        take part once they are collected. The scene of the player is always there."""
+        assert self.loader
+        if not (self.player and self.player.position):
+            return
+        middle = self.player.position.scene
+        yield self.get_scene(middle)
+        for coord in loaded_scene_coords(middle):
+            if coord == middle:
+                continue
+            if self.is_known_scene(coord) or (self.terrain_cache is not None and coord in self.terrain_cache):
+                yield self.get_scene(coord)
+            else:
+                self.loader.prefetch(coord)
+
+    def collect_scenes(self) -> None:
+        """Add the scenes that the loader finished in the background."""
+        assert self.loader
+        for scene in self.loader.collect():
+            if scene.start_coord not in self._scenes:
+                if self.terrain_cache is not None:
+                    self.terrain_cache.save(scene)
+                # All players may have left the scene while it was generated.
+                if self.interest is None or scene.start_coord in self.interest:
+                    self._add_scene(scene)
+
+    def prefetch_scenes(self) -> None:
+        """Let the loader generate the scenes that will be loaded once the player enters the next scene in the
+        direction they are walking."""
+        assert self.loader
+        if not (self.player and self.player.position and self.player.movement):
+            return
+        middle_x, middle_y = self.player.position.scene
+        step_x, step_y = self.player.movement.direction
+        for coord in loaded_scene_coords((middle_x + step_x, middle_y + step_y)):
+            if not self.is_known_scene(coord) and not (self.terrain_cache is not None and coord in self.terrain_cache):
+                self.loader.prefetch(coord)
 
     def tick_scene(self, scene: Scene):
-        # Spawning
-        time_since_update = min(self.time - scene.update_time, ENCOUNTER_TIME)
-        amount = scipy.stats.poisson.rvs(time_since_update * SPAWN_RATE)
-        for spawn_x, spawn_y in zip(scipy.stats.randint.rvs(0, WIDTH, size=amount),
-                                    scipy.stats.randint.rvs(0, HEIGHT, size=amount)):
-            position = np.array((WIDTH, HEIGHT)) * scene.start_coord + (spawn_x, spawn_y)
-            if not self.get_object_at(position):
+        self.tick_scenes([scene])
+
+    def tick_scenes(self, scenes: list[Scene]) -> None:
+        """Bring the scenes up to the current time."""
+        with self.phase("spawn"):
+            self.spawn_encounters(scenes)
+        with self.phase("expire"):
+            self.expire_encounters()
+        for scene in scenes:
+            scene.update_time = self.time
+
+    def spawn_encounters(self, scenes: list[Scene]) -> None:
+        """Spawn the encounters that appeared in the scenes since their last update, with one draw for all scenes."""
+        time_since_update = np.minimum(self.time - np.array([scene.update_time for scene in scenes]),
+                                       ENCOUNTER_TIME).astype(np.int64)
+        amounts = self.rng.poisson(time_since_update * self.spawn_rate)
+        scene_indices = np.repeat(np.arange(len(scenes)), amounts)
+        if not len(scene_indices):
+            return
+        origins = np.array([scene.start_coord for scene in scenes]) * (WIDTH, HEIGHT)
+        spawns = np.empty(len(scene_indices), dtype=POSITION_DTYPE)
+        spawns["x"] = origins[scene_indices, 0] + self.rng.integers(0, WIDTH, size=len(scene_indices))
+        spawns["y"] = origins[scene_indices, 1] + self.rng.integers(0, HEIGHT, size=len(scene_indices))
+        starts = self.time - self.rng.integers(0, time_since_update[scene_indices])
+        if self.mob_store is not None:
+            self._spawn_into_store(scenes, scene_indices, spawns, starts)
+            return
+        for scene_idx, position, start in zip(scene_indices.tolist(), Position.from_array(spawns), starts.tolist()):
+            if not scenes[scene_idx].get_mob_at(*position.scene_coordinates):
                 print(f"Spawn Encounter at {position}")
-                start = self.time - scipy.stats.randint.rvs(0, time_since_update)
                 self.summon(Mob(
-                    typ=KlistamEncounter(Klistam(KlistamClass.load_classes()["wood_idol"]),
+                    typ=KlistamEncounter(Klistam(CLASSES["wood_idol"]),
                                          start, start + ENCOUNTER_TIME),
                     sprite=Sprite("encounter"),
                 ), position)
 
-        to_remove = []
-        for i, mob in enumerate(scene.mobs):
-            if isinstance(mob.typ, KlistamEncounter):
-                if mob.typ.end and mob.typ.end < self.time:
-                    to_remove.append(i)
-                    print(f"Remove encounter at {mob.position}")
-        for i in reversed(to_remove):
-            scene.remove_mob_idx(i)
-        scene.update_time = self.time
+    def _spawn_into_store(self, scenes: list[Scene], scene_indices: NDArray[np.intp], spawns: NDArray[np.void],
+                          starts: NDArray[np.int64]) -> None:
+        assert self.mob_store is not None
+        local_x, local_y = spawns["x"] % WIDTH, spawns["y"] % HEIGHT
+        # Of several spawns at the same field, only the first one appears.
+        _unique, first = np.unique((scene_indices * HEIGHT + local_y) * WIDTH + local_x, return_index=True)
+        start = starts[first].astype(np.float64)
+        self.store_mobs(spawns["x"][first], spawns["y"][first], ENCOUNTER,
+                        self.mob_store.sprite_id_of(Sprite("encounter")), CLASSES.id_of("wood_idol"),
+                        start, start + ENCOUNTER_TIME)
+
+    def _remove_stored_mobs(self, slots: NDArray[np.intp]) -> None:
+        assert self.mob_store is not None
+        for x, y in zip(self.mob_store.x[slots].tolist(), self.mob_store.y[slots].tolist()):
+            scene_x, local_x = divmod(x, WIDTH)
+            scene_y, local_y = divmod(y, HEIGHT)
+            if scene := self._scenes.get((scene_x, scene_y)):
+                scene.set_occupied(local_x, local_y, False)
+        self.mob_store.remove(slots.tolist())
+
+    def expire_encounters(self) -> None:
+        """Remove the encounters in memory whose time is over."""
+        if self.mob_store is not None:
+            self._remove_stored_mobs(self.mob_store.expired(self.time))
+        while self._expiry and self._expiry[0][0] < self.time:
+            _end, _order, mob = heapq.heappop(self._expiry)
+            # The mob may have been removed in the meantime, or belong to a scene that was moved to the store.
+            if mob.position and (scene := self._scenes.get(mob.position.scene)) \
+                    and scene.get_mob_at(*mob.position.scene_coordinates) is mob:
+                print(f"Remove encounter at {mob.position}")
+                self.remove_mob(mob)
+
+    def _track_expiry(self, mob: Mob) -> None:
+        if isinstance(mob.typ, KlistamEncounter) and mob.typ.end is not None:
+            heapq.heappush(self._expiry, (mob.typ.end, next(self._expiry_order), mob))
 
 
 @define
 class WorldGenerator:
-    """The entire world of the game."""
+    """The entire world of the game. The generator may be used from several threads."""
     seed: int = 0
-    fields: list[Field] = field(factory=list, repr=False)
+    fields: FieldTable = field(factory=FieldTable, repr=False)
+    # Shape (len(fields), len(fields)). Row i is the normalised impact of fields[i] on its neighbours.
+    impact: NDArray[np.float64] = field(factory=lambda: np.empty((0, 0)), repr=False)
+    _cdf_table: NDArray[np.float64] | None = field(default=None, init=False, repr=False)
+    # The terrain of the last used regions, the most recent last, see get_region.
+    _regions: OrderedDict[tuple[int, int], NDArray[np.unsignedinteger]] = field(factory=OrderedDict, init=False,
+                                                                                repr=False)
+    _lock: threading.Lock = field(factory=threading.Lock, init=False, repr=False)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # For other processes, without the lock and the cached regions.
+        return {"seed": self.seed, "fields": self.fields, "impact": self.impact, "_cdf_table": self._cdf_table}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.seed, self.fields, self.impact = state["seed"], state["fields"], state["impact"]
+        self._cdf_table = state["_cdf_table"]
+        self._regions = OrderedDict()
+        self._lock = threading.Lock()
 
     @classmethod
     def generate(cls, seed: Optional[int] = None) -> Self:
-        instance = cls(seed or hash(datetime.now()))
-        instance.fields = load_field_info()
+        instance = cls(seed if seed is not None else hash(datetime.now()))
+        instance.fields = FieldTable(load_field_info(), digest=fields_digest())
+        instance.impact = instance.get_impact_matrix()
         return instance
 
     def get_impact(self, field_type: Field, factor: float) -> dict[Field, float]:
@@ -225,33 +831,133 @@ class WorldGenerator:
         norm = sum(weight.values())
         return {key: val / norm for key, val in weight.items()}
 
-    def get_terrain(self, start: tuple[int, int] = (0, 0), height: int = 32, width: int = 32) -> Scene:
-        factor = 4 / 5
-        random.seed(self.seed)
-        terrain = np.empty(shape=(height, width), dtype=Field)
-        terrain[0][0] = random.choice(self.fields)
+    def get_impact_matrix(self, factor: float = IMPACT_FACTOR) -> NDArray[np.float64]:
+        """Tabulate get_impact for every field, so that it does not need to be recomputed per cell."""
+        impact = np.empty((len(self.fields), len(self.fields)))
+        for i, the_field in enumerate(self.fields):
+            field_impact = self.get_impact(the_field, factor)
+            impact[i] = [field_impact[f] for f in self.fields]
+        return impact
+
+    def get_distribution(self, neighbours: NDArray[np.intp]) -> NDArray[np.float64]:
+        """The probability of each field for a cell, given the indices of its neighbouring fields."""
+        weights = self.impact[neighbours].sum(axis=0)
+        return weights / weights.sum()
+
+    def cache_key(self) -> str:
+        """A key for the terrain that this generator generates, see TerrainCache."""
+        return f"{self.seed & 0xFFFF_FFFF_FFFF_FFFF:016x}-{self.fields.digest}-v{GENERATOR_VERSION}"
+
+    def get_rng(self, coord: tuple[int, int], stream: int = 0) -> np.random.Generator:
+        """A random generator that only depends on the seed and the coordinate. Different streams give independent
+        generators for the same coordinate."""
+        x, y = coord
+        spawn_key = (x & 0xFFFF_FFFF, y & 0xFFFF_FFFF) + ((stream,) if stream else ())
+        return np.random.default_rng(np.random.SeedSequence(self.seed & 0xFFFF_FFFF_FFFF_FFFF, spawn_key=spawn_key))
+
+    def sample_block(self, rng: np.random.Generator, height: int, width: int) -> NDArray[np.intp]:
+        """Sample a block of field ids of shape (height, width). Each cell is drawn from get_distribution of its
+        neighbours above left, above and to the left. These are all on earlier anti-diagonals, so each anti-diagonal
+        is drawn at once. The cells at the border have no neighbours outside the block."""
+        # No neighbour is stored as the last index of the cdf table, and fills the row and column before the block.
+        none = len(self.fields)
+        grid = np.full((height + 1, width + 1), none, dtype=np.intp)
+        cdfs = self.get_cdf_table().reshape(-1, len(self.fields))
+        flat = grid.reshape(-1)
+        uniform = rng.random(height * width)
+        drawn = 0
+        for cells, above_left, above, before in wavefronts(height, width):
+            cdf = cdfs[(flat[above_left] * (none + 1) + flat[above]) * (none + 1) + flat[before]]
+            # Invert the cdf of each cell with one uniform draw.
+            draws = uniform[drawn:drawn + len(cells), np.newaxis]
+            drawn += len(cells)
+            flat[cells] = (cdf <= draws).sum(axis=1)
+        return grid[1:, 1:]
+
+    def get_cdf_table(self) -> NDArray[np.float64]:
+        """The cumulative form of get_distribution for every three neighbours, of shape (n + 1, n + 1, n + 1, n)
+        for n fields. The neighbour id -1, the last index, stands for no neighbour."""
+        if self._cdf_table is None:
+            # The zero row for no neighbour has no impact.
+            impact = np.vstack((self.impact, np.zeros(len(self.fields))))
+            weights = impact[:, None, None] + impact[None, :, None] + impact[None, None, :]
+            # Without any neighbour, all fields are equally likely.
+            weights[-1, -1, -1] = 1.
+            cdf = weights.cumsum(axis=-1)
+            cdf /= cdf[..., -1:]
+            # Rounding must not make the last field unreachable.
+            cdf[..., -1] = np.inf
+            self._cdf_table = cdf
+        return self._cdf_table
+
+    def get_terrain(self, start: tuple[int, int] = (0, 0), height: int = HEIGHT, width: int = WIDTH) -> Scene:
+        """A scene generated on its own, not continuing the terrain of its neighbours. See get_scene."""
+        return Scene(self.sample_block(self.get_rng(start), height, width).astype(self.fields.dtype), start,
+                     self.fields)
+
+    @staticmethod
+    def region_of(coord: tuple[int, int]) -> tuple[int, int]:
+        """The region that the scene at coord lies in."""
+        return coord[0] // REGION_SCENES, coord[1] // REGION_SCENES
+
+    def generate_region(self, region: tuple[int, int]) -> NDArray[np.unsignedinteger]:
+        """The terrain of a block of REGION_SCENES x REGION_SCENES scenes, generated at once so that it is continuous
+        across the borders of the scenes inside. Not cached, see get_region."""
+        return self.sample_block(self.get_rng(region, REGION_STREAM), REGION_SCENES * HEIGHT,
+                                 REGION_SCENES * WIDTH).astype(self.fields.dtype)
+
+    def has_region(self, region: tuple[int, int]) -> bool:
+        with self._lock:
+            return region in self._regions
+
+    def add_region(self, region: tuple[int, int], terrain: NDArray[np.unsignedinteger]) -> None:
+        """Keep the terrain of a region that was generated elsewhere, e.g. by a SceneLoader."""
+        with self._lock:
+            self._regions[region] = terrain
+            self._regions.move_to_end(region)
+            while len(self._regions) > REGION_CACHE_SIZE:
+                self._regions.popitem(last=False)
+
+    def get_region(self, region: tuple[int, int]) -> NDArray[np.unsignedinteger]:
+        """The terrain of a region, see generate_region. The last regions are kept, as their scenes are usually needed
+        together."""
+        with self._lock:
+            if (terrain := self._regions.get(region)) is not None:
+                self._regions.move_to_end(region)
+        if terrain is None:
+            # Generated outside of the lock, so that other threads may use the cached regions meanwhile.
+            terrain = self.generate_region(region)
+            self.add_region(region, terrain)
+        return terrain
+
+    def get_cached_scene(self, coord: tuple[int, int]) -> Scene | None:
+        """The scene at coord if its region is cached, without generating it."""
+        region = self.region_of(coord)
+        with self._lock:
+            if (terrain := self._regions.get(region)) is None:
+                return None
+            self._regions.move_to_end(region)
+        return self.cut_scene(coord, terrain)
 
-        def get_weight(x, y):
-            weights = Counter({key: 0 for key in self.fields})
-            for cords in [(x - 1, y - 1), (x - 1, y), (x, y - 1)]:
-                if terrain[cords[0]][cords[1]]:
-                    weights.update(Counter(self.get_impact(terrain[cords[0]][cords[1]], factor)))
-
-            norm = sum(weights.values())
+    def get_scene(self, coord: tuple[int, int]) -> Scene:
+        """The scene at coord, cut out of its region. Only depends on the seed and the coordinate."""
+        return self.cut_scene(coord, self.get_region(self.region_of(coord)))
 
-            return [weights[f] / norm for f in self.fields]
+    def cut_scene(self, coord: tuple[int, int], region: NDArray[np.unsignedinteger]) -> Scene:
+        """The scene at coord, cut out of the terrain of its region."""
+        x, y = coord[0] % REGION_SCENES, coord[1] % REGION_SCENES
+        return Scene(region[y * HEIGHT:(y + 1) * HEIGHT, x * WIDTH:(x + 1) * WIDTH].copy(), coord, self.fields)
 
-        for i in range(height):
-            for j in range(width):
-                if i == j == 0:
-                    continue
-                terrain[i][j] = np.random.choice(self.fields, p=get_weight(i, j))  # type: ignore
 
-        return Scene(terrain, start)
+def fields_digest() -> str:
+    """A hash of the field definitions."""
+    return hashlib.sha256(FIELDS_FILE.read_bytes()).hexdigest()[:16]
 
 
 def load_field_info() -> list[Field]:
-    with open(f"{Path(__file__).parent.resolve()}/resources/fields.yml", 'r') as file:
+    import yaml  # Only needed once, so not imported with the module.
+
+    with open(FIELDS_FILE, 'r') as file:
         doc = yaml.safe_load(file)
         fields = list()
         for field_info in doc:
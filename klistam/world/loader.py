@@ -0,0 +1,83 @@
+"""
+Generates scenes in the background, before the player comes close enough to need them.
+"""
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+import numpy as np
+from attrs import define, field
+from numpy.typing import NDArray
+
+if TYPE_CHECKING:
+    from klistam.world.create_world import Scene, WorldGenerator
+
+
+def _default_executor() -> Executor:
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="scene-loader")
+
+
+@define
+class SceneLoader:
+    """Runs the generation of scenes on an executor and hands the finished scenes back to the world.
+
+    Scenes are generated a whole region at a time, see WorldGenerator.get_region. The executor only gets the region
+    and returns its terrain, and the scenes are cut out of it on the thread of the world, which is also the only one
+    that fills the region cache of the generator. Region generation only depends on the seed and the region, so any
+    executor works, including a ProcessPoolExecutor, which then gets one copy of the generator per region."""
+    generator: "WorldGenerator"
+    executor: Executor = field(factory=_default_executor)
+    _pending: "dict[tuple[int, int], Future[NDArray[np.unsignedinteger]]]" = field(factory=dict, init=False,
+                                                                                   repr=False)
+    # The scenes that were asked for, by pending region.
+    _wanted: dict[tuple[int, int], set[tuple[int, int]]] = field(factory=dict, init=False, repr=False)
+    # Scenes that are cut out already and wait to be collected.
+    _ready: "dict[tuple[int, int], Scene]" = field(factory=dict, init=False, repr=False)
+
+    def prefetch(self, coord: tuple[int, int]) -> None:
+        """Start generating the region of the scene at coord, unless it is being generated. The scene is handed out
+        by collect once its region is done. If the region is cached, the scene is cut out of it at once, so that it
+        does not depend on the region staying in the cache."""
+        region = self.generator.region_of(coord)
+        if coord in self._ready:
+            return
+        if region in self._pending:
+            self._wanted[region].add(coord)
+        elif (scene := self.generator.get_cached_scene(coord)) is not None:
+            self._ready[coord] = scene
+        else:
+            self._wanted[region] = {coord}
+            self._pending[region] = self.executor.submit(self.generator.generate_region, region)
+
+    def is_pending(self, coord: tuple[int, int]) -> bool:
+        return coord in self._ready or coord in self._wanted.get(self.generator.region_of(coord), ())
+
+    def collect(self) -> "list[Scene]":
+        """Remove and return all scenes that were asked for and whose region is done."""
+        for region in [region for region, future in self._pending.items() if future.done()]:
+            self._receive(region)
+        scenes = list(self._ready.values())
+        self._ready.clear()
+        return scenes
+
+    def take(self, coord: tuple[int, int]) -> "Scene":
+        """Return the scene at coord, waiting for its region if it is pending and generating it directly otherwise."""
+        region = self.generator.region_of(coord)
+        if region in self._pending:
+            self._wanted[region].add(coord)
+            self._receive(region)
+        if (scene := self._ready.pop(coord, None)) is not None:
+            return scene
+        return self.generator.get_scene(coord)
+
+    def _receive(self, region: tuple[int, int]) -> None:
+        """Cut the wanted scenes out of a finished region."""
+        terrain = self._pending.pop(region).result()
+        self.generator.add_region(region, terrain)
+        for coord in self._wanted.pop(region):
+            self._ready[coord] = self.generator.cut_scene(coord, terrain)
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self._pending.clear()
+        self._wanted.clear()
+        self._ready.clear()
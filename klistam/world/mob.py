@@ -2,9 +2,10 @@
 
 """
 import enum
+from collections.abc import Sequence
 from typing import Literal
 
-from attr import define
+from attr import define, field
 import numpy as np
 from numpy.typing import NDArray
 from typing_extensions import Self
@@ -12,6 +13,9 @@ from typing_extensions import Self
 from klistam import world as world_module
 from klistam import klista
 
+# The part of a field that a mob walks per tick.
+MOVEMENT_SPEED = 0.05
+
 
 @define(frozen=True)
 class Sprite:
@@ -20,53 +24,78 @@ class Sprite:
     scope: str = "object"
 
 
-@define(repr=False)
+# The layout of positions in numpy arrays, see Position.to_array.
+POSITION_DTYPE = np.dtype([("x", np.int64), ("y", np.int64)])
+
+
+@define(frozen=True, repr=False)
 class Position:
-    # Shape (2,) Array of coordinates.
-    coordinates: NDArray[np.int32]
+    """The coordinates of a field in the world. Immutable and hashable, so it can be used as a key."""
+    x: int
+    y: int
+    # Computed once on creation.
+    scene: tuple[int, int] = field(init=False, eq=False)
+    scene_coordinates: tuple[int, int] = field(init=False, eq=False)
+
+    def __attrs_post_init__(self) -> None:
+        scene_x, local_x = divmod(self.x, world_module.WIDTH)
+        scene_y, local_y = divmod(self.y, world_module.HEIGHT)
+        # The scene that this position belongs to and the coordinates inside the scene.
+        object.__setattr__(self, "scene", (scene_x, scene_y))
+        object.__setattr__(self, "scene_coordinates", (local_x, local_y))
 
     @classmethod
-    def from_tuple(cls, coord: tuple[int, int]) -> Self:
-        return cls(np.array(coord))
+    def from_tuple(cls, coord: "tuple[int, int] | NDArray[np.integer]") -> Self:
+        return cls(int(coord[0]), int(coord[1]))
 
     @property
-    def scene_coordinates(self) -> tuple[int, int]:
-        """The coordinates inside the scene."""
-        return tuple(self.coordinates % np.array((world_module.WIDTH, world_module.HEIGHT)))  # type: ignore
+    def coordinates(self) -> tuple[int, int]:
+        return self.x, self.y
 
-    @property
-    def scene(self) -> tuple[int, int]:
-        """The scene that this position belongs to."""
-        return tuple(self.coordinates // np.array((world_module.WIDTH, world_module.HEIGHT)))  # type: ignore
+    def __add__(self, offset: tuple[int, int]) -> "Position":
+        return Position(self.x + offset[0], self.y + offset[1])
+
+    @staticmethod
+    def to_array(positions: Sequence["Position"]) -> NDArray[np.void]:
+        """Convert positions to a structured array with the fields x and y."""
+        return np.array([(position.x, position.y) for position in positions], dtype=POSITION_DTYPE)
+
+    @classmethod
+    def from_array(cls, array: NDArray[np.void]) -> list[Self]:
+        """Convert a structured array with the fields x and y to positions."""
+        return [cls(x, y) for x, y in zip(array["x"].tolist(), array["y"].tolist())]
 
     def __repr__(self) -> str:
-        return f"Position({self.coordinates[0]}, {self.coordinates[1]})"
+        return f"Position({self.x}, {self.y})"
+
+
+DIRECTIONS: dict[str, tuple[int, int]] = {"right": (1, 0), "left": (-1, 0), "up": (0, -1), "down": (0, 1)}
 
 
 @define
 class Movement:
     """A shown movement of the mob. The position of the mob is changed on the start of the movement, so a movement
     to the right will cause the mob to be shown to the left of its actual position."""
-    direction: NDArray[np.int32]
+    direction: tuple[int, int]
     progress: float = 1.
+    # The progress before the last tick, so that drawing can show the mob between two ticks.
+    previous: float = 1.
 
     @classmethod
     def from_name(cls, name: Literal["right", "left", "up", "down"]):
-        if name == "right":
-            ans = (1, 0)
-        elif name == "left":
-            ans = (-1, 0)
-        elif name == "up":
-            ans = (0, -1)
-        elif name == "down":
-            ans = (0, 1)
-        else:
+        if name not in DIRECTIONS:
             raise ValueError(f"Illegal direction name {name}")
-        return Movement(np.array(ans, np.int32))
+        return Movement(DIRECTIONS[name])
 
     @property
-    def offset(self) -> NDArray[np.float_]:
-        return -self.progress * self.direction
+    def offset(self) -> tuple[float, float]:
+        return -self.progress * self.direction[0], -self.progress * self.direction[1]
+
+    def offset_at(self, alpha: float) -> tuple[float, float]:
+        """The offset at a part alpha of the time from the last tick to the next one, interpolated between the
+        progress before the last tick (alpha 0) and after it (alpha 1)."""
+        progress = self.previous + (self.progress - self.previous) * alpha
+        return -progress * self.direction[0], -progress * self.direction[1]
 
 
 @define
@@ -100,3 +129,11 @@ class Mob:
     sprite: Sprite | None = None
     position: Position | None = None
     movement: Movement | None = None
+
+    def advance_movement(self, speed: float = MOVEMENT_SPEED) -> None:
+        """Show the mob a bit closer to its position, ending the movement when it arrives."""
+        if self.movement:
+            self.movement.previous = self.movement.progress
+            self.movement.progress -= speed
+            if self.movement.progress <= 0.:
+                self.movement = None
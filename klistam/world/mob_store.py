@@ -0,0 +1,174 @@
+"""
+Keeps large numbers of mobs as columns of numpy arrays instead of one Mob object each.
+"""
+from collections.abc import Iterable
+
+import numpy as np
+from attrs import define, field
+from numpy.typing import NDArray
+
+from klistam.klista import CLASSES, Klistam
+from klistam.world import HEIGHT, WIDTH
+from klistam.world.mob import POSITION_DTYPE, KlistamEncounter, Mob, Position, Prop, Sprite
+
+# The kind of encounters. Other mobs have the value of their Prop as kind.
+ENCOUNTER = 0
+INITIAL_CAPACITY = 1024
+# The columns of a store with the value of unused slots.
+COLUMNS = (("x", 0), ("y", 0), ("kind", 0), ("class_id", -1), ("start", 0), ("end", np.inf), ("sprite_id", 0),
+           ("alive", False))
+
+
+@define
+class MobStore:
+    """Mobs as columns of arrays, indexed by slot. The slots of removed mobs are reused.
+
+    Gameplay code gets Mob objects from view, which are created on demand and kept while the slot is in use. The
+    views do not move: changes to them are not written back to the columns."""
+    x: NDArray[np.int64] = field(init=False, repr=False)
+    y: NDArray[np.int64] = field(init=False, repr=False)
+    kind: NDArray[np.int32] = field(init=False, repr=False)
+    # Id in klista.CLASSES, -1 for mobs without a klistam.
+    class_id: NDArray[np.int32] = field(init=False, repr=False)
+    start: NDArray[np.float64] = field(init=False, repr=False)
+    # inf for mobs that do not expire.
+    end: NDArray[np.float64] = field(init=False, repr=False)
+    # Index into sprites.
+    sprite_id: NDArray[np.int32] = field(init=False, repr=False)
+    alive: NDArray[np.bool_] = field(init=False, repr=False)
+    sprites: list[Sprite] = field(factory=list)
+    # The number of slots that have ever been used.
+    _size: int = field(default=0, init=False)
+    _free: list[int] = field(factory=list, init=False, repr=False)
+    _by_position: dict[tuple[int, int], int] = field(factory=dict, init=False, repr=False)
+    _views: dict[int, Mob] = field(factory=dict, init=False, repr=False)
+    _view_slots: dict[Mob, int] = field(factory=dict, init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self.x = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self.y = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+        self.kind = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.class_id = np.full(INITIAL_CAPACITY, -1, dtype=np.int32)
+        self.start = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self.end = np.full(INITIAL_CAPACITY, np.inf, dtype=np.float64)
+        self.sprite_id = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self.alive = np.zeros(INITIAL_CAPACITY, dtype=np.bool_)
+
+    def __len__(self) -> int:
+        return len(self._by_position)
+
+    @property
+    def capacity(self) -> int:
+        return len(self.alive)
+
+    def _grow(self, needed: int) -> None:
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        for name, fill in COLUMNS:
+            column = getattr(self, name)
+            grown = np.full(capacity, fill, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def copy(self) -> "MobStore":
+        """A store with the same mobs, e.g. to read them on another thread while this one changes. The views are not
+        copied."""
+        copy = MobStore(list(self.sprites))
+        for name, _fill in COLUMNS:
+            setattr(copy, name, getattr(self, name).copy())
+        copy._size = self._size
+        copy._free = list(self._free)
+        copy._by_position = dict(self._by_position)
+        return copy
+
+    def slots_by_scene(self) -> dict[tuple[int, int], list[int]]:
+        """The slots of the mobs, grouped by the coordinates of their scene."""
+        slots = np.flatnonzero(self.alive[:self._size])
+        groups: dict[tuple[int, int], list[int]] = {}
+        for slot, coord in zip(slots.tolist(), zip((self.x[slots] // WIDTH).tolist(),
+                                                   (self.y[slots] // HEIGHT).tolist())):
+            groups.setdefault(coord, []).append(slot)
+        return groups
+
+    def sprite_id_of(self, sprite: Sprite) -> int:
+        if sprite not in self.sprites:
+            self.sprites.append(sprite)
+        return self.sprites.index(sprite)
+
+    def add(self, x: NDArray[np.int64], y: NDArray[np.int64], kind: int | NDArray[np.int32],
+            sprite_id: int | NDArray[np.int32], class_id: int | NDArray[np.int32] = -1,
+            start: float | NDArray[np.float64] = 0., end: float | NDArray[np.float64] = np.inf) -> NDArray[np.intp]:
+        """Add mobs and return their slots. The positions must be free."""
+        amount = len(x)
+        reused = [self._free.pop() for _ in range(min(amount, len(self._free)))]
+        new_size = self._size + amount - len(reused)
+        if new_size > self.capacity:
+            self._grow(new_size)
+        slots = np.concatenate((np.array(reused, dtype=np.intp), np.arange(self._size, new_size, dtype=np.intp)))
+        self._size = new_size
+        self.x[slots] = x
+        self.y[slots] = y
+        self.kind[slots] = kind
+        self.sprite_id[slots] = sprite_id
+        self.class_id[slots] = class_id
+        self.start[slots] = start
+        self.end[slots] = end
+        self.alive[slots] = True
+        for slot, position in zip(slots.tolist(), zip(self.x[slots].tolist(), self.y[slots].tolist())):
+            assert position not in self._by_position, f"{position} is occupied"
+            self._by_position[position] = slot
+        return slots
+
+    def remove(self, slots: Iterable[int]) -> None:
+        for slot in slots:
+            self.alive[slot] = False
+            del self._by_position[int(self.x[slot]), int(self.y[slot])]
+            if (mob := self._views.pop(slot, None)) is not None:
+                del self._view_slots[mob]
+                mob.position = None
+            self._free.append(slot)
+
+    def expired(self, time: float) -> NDArray[np.intp]:
+        """The slots of the mobs that ended before time."""
+        return np.flatnonzero(self.alive[:self._size] & (self.end[:self._size] < time))
+
+    def in_rect(self, left: int, top: int, width: int, height: int) -> NDArray[np.intp]:
+        """The slots of the mobs inside a rectangle of world coordinates."""
+        x, y = self.x[:self._size], self.y[:self._size]
+        return np.flatnonzero(self.alive[:self._size] & (x >= left) & (x < left + width)
+                              & (y >= top) & (y < top + height))
+
+    def positions(self, slots: NDArray[np.intp]) -> NDArray[np.void]:
+        """The positions of the slots as a structured array, see Position.to_array."""
+        positions = np.empty(len(slots), dtype=POSITION_DTYPE)
+        positions["x"] = self.x[slots]
+        positions["y"] = self.y[slots]
+        return positions
+
+    def holds(self, x: NDArray[np.int64], y: NDArray[np.int64]) -> NDArray[np.bool_]:
+        """Whether there is a mob at each of the positions."""
+        return np.array([position in self._by_position for position in zip(x.tolist(), y.tolist())], dtype=np.bool_)
+
+    def slot_at(self, position: Position) -> int | None:
+        return self._by_position.get((position.x, position.y))
+
+    def slot_of(self, mob: Mob) -> int | None:
+        """The slot of a view, or None if the mob is not a view of this store."""
+        return self._view_slots.get(mob)
+
+    def view(self, slot: int) -> Mob:
+        """A Mob for the mob in a slot."""
+        if (mob := self._views.get(slot)) is None:
+            kind = int(self.kind[slot])
+            typ: KlistamEncounter | Prop
+            if kind == ENCOUNTER:
+                end = float(self.end[slot])
+                typ = KlistamEncounter(Klistam(CLASSES.by_id(int(self.class_id[slot]))), float(self.start[slot]),
+                                       end if end != np.inf else None)
+            else:
+                typ = Prop(kind)
+            mob = Mob(typ, self.sprites[self.sprite_id[slot]], Position(int(self.x[slot]), int(self.y[slot])))
+            self._views[slot] = mob
+            self._view_slots[mob] = slot
+        return mob
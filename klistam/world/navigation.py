@@ -0,0 +1,245 @@
+"""
+Finds the way through the world: shortest paths between two positions and the distance of every field to a set of
+positions.
+
+A field can be walked on if its terrain is walkable and, unless mobs are ignored, no mob is on it, see
+Scene.get_passable. The masks of the scenes are stitched into windows of several scenes, so that paths cross the borders
+of scenes. Windows and distance fields are kept until one of their scenes changes, see Scene.revision.
+"""
+from collections import OrderedDict
+from collections.abc import Iterable
+from heapq import heappop, heappush
+from typing import overload
+
+import numpy as np
+from attrs import define, field
+from numpy.typing import NDArray
+
+from klistam.world import HEIGHT, WIDTH
+from klistam.world.create_world import LOAD_RADIUS, World
+from klistam.world.mob import DIRECTIONS, Position
+
+# The directions a mob can walk in, in the order of the neighbours in distance fields.
+STEPS = tuple(DIRECTIONS.values())
+UNREACHABLE = np.iinfo(np.int32).max
+# The number of scenes around the start and the goal that a path may go through.
+PATH_MARGIN = 1
+WINDOW_CACHE_SIZE = 8
+FIELD_CACHE_SIZE = 8
+
+
+def _to_tuple(position: Position | tuple[int, int]) -> tuple[int, int]:
+    return position.coordinates if isinstance(position, Position) else (int(position[0]), int(position[1]))
+
+
+@define
+class Window:
+    """Whether the fields of a rectangle of scenes can be walked on, surrounded by a border of fields that cannot."""
+    # The scene in the top left corner, and the number of scenes in x and y direction.
+    corner: tuple[int, int]
+    size: tuple[int, int]
+    # Shape (size[1] * HEIGHT + 2, size[0] * WIDTH + 2).
+    passable: NDArray[np.bool_] = field(repr=False)
+    # The revisions of the scenes, or None if the window does not depend on them.
+    revisions: tuple[int, ...] | None = field(default=None, repr=False)
+
+    @property
+    def columns(self) -> int:
+        return self.passable.shape[1]
+
+    @property
+    def offsets(self) -> NDArray[np.intp]:
+        """The difference of flat indices of a field and its neighbours, in the order of STEPS."""
+        return np.array([dx + dy * self.columns for dx, dy in STEPS])
+
+    @overload
+    def contains(self, x: int, y: int) -> bool: ...
+
+    @overload
+    def contains(self, x: NDArray[np.integer], y: NDArray[np.integer]) -> NDArray[np.bool_]: ...
+
+    def contains(self, x: int | NDArray[np.integer], y: int | NDArray[np.integer]) -> bool | NDArray[np.bool_]:
+        """Whether the world coordinates, single ones or arrays of them, are inside the window."""
+        local_x, local_y = x - self.corner[0] * WIDTH, y - self.corner[1] * HEIGHT
+        return (local_x >= 0) & (local_x < self.size[0] * WIDTH) & (local_y >= 0) & (local_y < self.size[1] * HEIGHT)
+
+    @overload
+    def index(self, x: int, y: int) -> int: ...
+
+    @overload
+    def index(self, x: NDArray[np.integer], y: NDArray[np.integer]) -> NDArray[np.intp]: ...
+
+    def index(self, x: int | NDArray[np.integer], y: int | NDArray[np.integer]) -> int | NDArray[np.intp]:
+        """The flat indices into passable of world coordinates inside the window, single ones or arrays of them."""
+        return (y - self.corner[1] * HEIGHT + 1) * self.columns + x - self.corner[0] * WIDTH + 1
+
+    def coordinates(self, index: int) -> tuple[int, int]:
+        """The world coordinates of a flat index."""
+        row, column = divmod(index, self.columns)
+        return column - 1 + self.corner[0] * WIDTH, row - 1 + self.corner[1] * HEIGHT
+
+
+@define
+class DistanceField:
+    """The number of steps from each field of a window to the nearest of a set of sources."""
+    window: Window
+    sources: tuple[tuple[int, int], ...]
+    # Flat, indexed like window.passable. UNREACHABLE where no source can be reached.
+    distances: NDArray[np.int32] = field(repr=False)
+
+    def distance(self, position: Position | tuple[int, int]) -> int | None:
+        """The distance of a position to the nearest source, or None if it is unreachable or outside the window."""
+        x, y = _to_tuple(position)
+        if not self.window.contains(x, y):
+            return None
+        distance = int(self.distances[self.window.index(x, y)])
+        return None if distance == UNREACHABLE else distance
+
+    def steps(self, x: NDArray[np.integer], y: NDArray[np.integer]) -> NDArray[np.int64]:
+        """For many positions at once, the direction of the next step to the nearest source, of shape (n, 2).
+        (0, 0) at a source, where no source can be reached and outside the window."""
+        x, y = np.asarray(x), np.asarray(y)
+        inside = self.window.contains(x, y)
+        index = self.window.index(x[inside], y[inside])
+        neighbours = self.distances[index[:, np.newaxis] + self.window.offsets]
+        best = neighbours.argmin(axis=1)
+        closer = neighbours[np.arange(len(index)), best] < self.distances[index]
+        steps = np.zeros((len(x), 2), dtype=np.int64)
+        steps[np.flatnonzero(inside)[closer]] = np.array(STEPS)[best[closer]]
+        return steps
+
+    def step(self, position: Position | tuple[int, int]) -> tuple[int, int] | None:
+        """The direction of the next step to the nearest source, or None if there is none."""
+        x, y = _to_tuple(position)
+        step_x, step_y = self.steps(np.array([x]), np.array([y]))[0].tolist()
+        return (step_x, step_y) if step_x or step_y else None
+
+
+def breadth_first(passable: NDArray[np.bool_], sources: NDArray[np.intp], offsets: NDArray[np.intp]) -> NDArray[np.int32]:
+    """The distances of all fields of a flat mask to the nearest source, one wavefront at a time. As every step costs
+    the same, this is what Dijkstra's algorithm computes. The sources count as passable, the fields next to the edges
+    of the mask must not be."""
+    distances = np.full(len(passable), UNREACHABLE, dtype=np.int32)
+    frontier = np.unique(sources)
+    distances[frontier] = 0
+    distance = 0
+    while len(frontier):
+        distance += 1
+        neighbours = (frontier[:, np.newaxis] + offsets).reshape(-1)
+        neighbours = neighbours[passable[neighbours] & (distances[neighbours] == UNREACHABLE)]
+        frontier = np.unique(neighbours)
+        distances[frontier] = distance
+    return distances
+
+
+def a_star(passable: NDArray[np.bool_], start: int, goal: int, columns: int) -> list[int] | None:
+    """The flat indices of a shortest path after start up to goal in a flat mask with rows of the given length, or None
+    if there is none. Start and goal count as passable, the fields next to the edges of the mask must not be."""
+    goal_row, goal_column = divmod(goal, columns)
+
+    def estimate(index: int) -> int:
+        row, column = divmod(index, columns)
+        return abs(row - goal_row) + abs(column - goal_column)
+
+    offsets = [dx + dy * columns for dx, dy in STEPS]
+    costs = {start: 0}
+    previous = {start: start}
+    # Of the fields with the same estimated length of the path, those closer to the goal come first.
+    queue = [(estimate(start), estimate(start), start)]
+    while queue:
+        length, remaining, index = heappop(queue)
+        if length - remaining > costs[index]:
+            # Reached on a shorter path since.
+            continue
+        if index == goal:
+            path = []
+            while index != start:
+                path.append(index)
+                index = previous[index]
+            return path[::-1]
+        cost = costs[index] + 1
+        for offset in offsets:
+            neighbour = index + offset
+            if (passable[neighbour] or neighbour == goal) and cost < costs.get(neighbour, UNREACHABLE):
+                costs[neighbour] = cost
+                previous[neighbour] = index
+                remaining = estimate(neighbour)
+                heappush(queue, (cost + remaining, remaining, neighbour))
+    return None
+
+
+@define
+class Navigation:
+    """Paths and distance fields in the scenes of a world. Scenes that are needed are loaded through the world.
+
+    Mobs that follow the same target, like the player, should share one distance field and walk along steps, instead
+    of searching a path each."""
+    world: World
+    _windows: OrderedDict[tuple, Window] = field(factory=OrderedDict, init=False, repr=False)
+    _fields: OrderedDict[tuple, DistanceField] = field(factory=OrderedDict, init=False, repr=False)
+
+    def get_window(self, corner: tuple[int, int], size: tuple[int, int], avoid_mobs: bool = True) -> Window:
+        """The passable fields of size scenes starting at the scene corner. Without avoid_mobs, only the terrain
+        counts, which does not change, so the window is kept for as long as it is in the cache."""
+        scenes = [self.world.get_scene((corner[0] + i, corner[1] + j)) for j in range(size[1]) for i in range(size[0])]
+        revisions = tuple(scene.revision for scene in scenes) if avoid_mobs else None
+        key = corner, size, avoid_mobs
+        if (window := self._windows.get(key)) is not None and window.revisions == revisions:
+            self._windows.move_to_end(key)
+            return window
+        passable = np.zeros((size[1] * HEIGHT + 2, size[0] * WIDTH + 2), dtype=np.bool_)
+        for scene in scenes:
+            top = (scene.start_coord[1] - corner[1]) * HEIGHT + 1
+            left = (scene.start_coord[0] - corner[0]) * WIDTH + 1
+            passable[top:top + HEIGHT, left:left + WIDTH] = scene.get_passable() if avoid_mobs else scene.walkable
+        window = self._windows[key] = Window(corner, size, passable, revisions)
+        self._windows.move_to_end(key)
+        while len(self._windows) > WINDOW_CACHE_SIZE:
+            self._windows.popitem(last=False)
+        return window
+
+    def find_path(self, start: Position | tuple[int, int], goal: Position | tuple[int, int],
+                  avoid_mobs: bool = True) -> list[Position] | None:
+        """The positions of a shortest path from start to goal, without start, or None if there is none. The mobs
+        at start and goal do not block the path, the terrain at goal does. The path only goes through scenes at
+        most PATH_MARGIN scenes away from the scenes of start and goal."""
+        start, goal = _to_tuple(start), _to_tuple(goal)
+        goal_position = Position.from_tuple(goal)
+        if not self.world.get_scene(goal_position.scene).is_walkable(*goal_position.scene_coordinates):
+            return None
+        (start_x, start_y), (goal_x, goal_y) = Position.from_tuple(start).scene, goal_position.scene
+        corner = min(start_x, goal_x) - PATH_MARGIN, min(start_y, goal_y) - PATH_MARGIN
+        size = abs(start_x - goal_x) + 2 * PATH_MARGIN + 1, abs(start_y - goal_y) + 2 * PATH_MARGIN + 1
+        window = self.get_window(corner, size, avoid_mobs)
+        path = a_star(window.passable.reshape(-1), window.index(*start), window.index(*goal), window.columns)
+        return None if path is None else [Position.from_tuple(window.coordinates(index)) for index in path]
+
+    def distance_field(self, sources: Iterable[Position | tuple[int, int]], radius: int = LOAD_RADIUS,
+                       avoid_mobs: bool = False) -> DistanceField:
+        """The distances to the nearest source in the scenes at most radius scenes away from the scenes of the
+        sources. It is computed again only if the sources or, with avoid_mobs, a scene in it changed."""
+        coords = tuple(sorted(_to_tuple(source) for source in sources))
+        if not coords:
+            raise ValueError("A distance field needs at least one source.")
+        source_array = np.array(coords)
+        scenes = source_array // (WIDTH, HEIGHT)
+        corner = tuple((scenes.min(axis=0) - radius).tolist())
+        size = tuple((scenes.max(axis=0) - scenes.min(axis=0) + 2 * radius + 1).tolist())
+        window = self.get_window(corner, size, avoid_mobs)
+        key = coords, radius, avoid_mobs
+        if (distance_field := self._fields.get(key)) is not None and distance_field.window is window:
+            self._fields.move_to_end(key)
+            return distance_field
+        distances = breadth_first(window.passable.reshape(-1), window.index(source_array[:, 0], source_array[:, 1]),
+                                  window.offsets)
+        distance_field = self._fields[key] = DistanceField(window, coords, distances)
+        self._fields.move_to_end(key)
+        while len(self._fields) > FIELD_CACHE_SIZE:
+            self._fields.popitem(last=False)
+        return distance_field
+
+    def player_distances(self, avoid_mobs: bool = False) -> DistanceField | None:
+        """The distance field to the player over the loaded scenes, or None if there is no player."""
+        if not (self.world.player and self.world.player.position):
+            return None
+        return self.distance_field([self.world.player.position], LOAD_RADIUS, avoid_mobs)
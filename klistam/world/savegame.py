@@ -0,0 +1,191 @@
+"""
+Saves the world to a single file and loads it back, reading each scene only when it is needed.
+
+A save file starts with a HEADER, followed by the scenes as encoded by storage.encode_scene, each compressed on its
+own if the index says so, and ends with an index of one INDEX_DTYPE row per scene.
+"""
+import mmap
+import os
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO
+
+import numpy as np
+from attrs import define, field
+
+from klistam.world.storage import decode_scene, encode_scene
+
+if TYPE_CHECKING:
+    from klistam.world.create_world import FieldTable, Scene
+    from klistam.world.mob_store import MobStore
+    from klistam.world.storage import SceneStore
+
+MAGIC = b"KLSV"
+VERSION = 2
+# Flags of the header.
+HAS_PLAYER = 1
+COMPRESSION_LEVEL = 1
+
+HEADER = np.dtype([("magic", "S4"), ("version", "<u2"), ("flags", "<u2"), ("seed", "<i8"), ("time", "<i8"),
+                   ("player_x", "<i8"), ("player_y", "<i8"), ("scene_count", "<u4"), ("index_offset", "<u8"),
+                   # WorldGenerator.cache_key of the generator of the terrain, which must match to load the save.
+                   ("generator", "S64")])
+INDEX_DTYPE = np.dtype([("x", "<i8"), ("y", "<i8"), ("offset", "<u8"), ("length", "<u8"), ("compressed", "u1")])
+
+
+class SaveFormatError(ValueError):
+    """The file is not a save file of a version that can be read."""
+
+
+@define
+class SaveSnapshot:
+    """The state of a world at one moment, ready to be written without touching the world again.
+
+    The scenes that are on disk already are only read when the snapshot is written: those of the save file that the
+    world was loaded from, and those of the store of evicted scenes, which holds them until then."""
+    seed: int
+    time: int
+    player: tuple[int, int] | None
+    # See WorldGenerator.cache_key.
+    generator: str
+    # The encoded scene and whether it is compressed already, by coordinate.
+    scenes: dict[tuple[int, int], tuple[bytes, bool]] = field(factory=dict, repr=False)
+    save_file: "SaveFile | None" = field(default=None, repr=False)
+    saved: list[tuple[int, int]] = field(factory=list, repr=False)
+    store: "SceneStore | None" = field(default=None, repr=False)
+    stored: list[tuple[int, int]] = field(factory=list, repr=False)
+    # A copy of the mob store of the world, whose mobs are added to the stored scenes, and the fields to decode them.
+    stored_mobs: "MobStore | None" = field(default=None, repr=False)
+    fields: "FieldTable | None" = field(default=None, repr=False)
+
+    def read_scenes(self) -> dict[tuple[int, int], tuple[bytes, bool]]:
+        """All scenes, with those that are read from disk."""
+        scenes = {}
+        if self.save_file is not None:
+            for coord in self.saved:
+                scenes[coord] = self.save_file.read_raw(coord)
+        if self.store is not None:
+            by_scene = self.stored_mobs.slots_by_scene() if self.stored_mobs is not None else {}
+            for coord in self.stored:
+                blob = self.store.read_held(coord)
+                if slots := by_scene.get(coord):
+                    assert self.stored_mobs is not None and self.fields is not None
+                    scene = decode_scene(blob, coord, self.fields)
+                    blob = encode_scene(scene, [*scene.mobs, *map(self.stored_mobs.view, slots)])
+                scenes[coord] = blob, False
+        scenes.update(self.scenes)
+        return scenes
+
+    def write(self, path: Path | str, compress: bool = True) -> None:
+        """Write the save file. The file is replaced at once when it is complete, so a save that is interrupted
+        leaves the previous one intact. A file that is open cannot be replaced on all systems, see
+        World.replace_save."""
+        os.replace(self.write_temporary(path, compress), path)
+
+    def write_temporary(self, path: Path | str, compress: bool = True) -> Path:
+        """Write the save file next to path and return where, to be moved to path once it is complete."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            scenes = self.read_scenes()
+        finally:
+            if self.store is not None:
+                self.store.release()
+        index = np.zeros(len(scenes), dtype=INDEX_DTYPE)
+        blobs = []
+        offset = HEADER.itemsize
+        for row, (coord, (blob, compressed)) in enumerate(scenes.items()):
+            if compress and not compressed:
+                blob, compressed = zlib.compress(blob, COMPRESSION_LEVEL), True
+            index[row] = (coord[0], coord[1], offset, len(blob), compressed)
+            blobs.append(blob)
+            offset += len(blob)
+        header = np.array((MAGIC, VERSION, HAS_PLAYER if self.player else 0, self.seed, self.time,
+                           *(self.player or (0, 0)), len(index), offset, self.generator.encode()), dtype=HEADER)
+        temporary = path.with_name(path.name + ".tmp")
+        with temporary.open("wb") as file:
+            file.write(header.tobytes())
+            file.writelines(blobs)
+            file.write(index.tobytes())
+        return temporary
+
+
+@define
+class SaveFile:
+    """An open save file. Scenes are read from the memory-mapped file on request."""
+    path: Path
+    header: np.void = field(repr=False)
+    _file: BinaryIO = field(repr=False)
+    _map: mmap.mmap = field(repr=False)
+    # The offset, length and compression of the scenes by coordinate.
+    _index: dict[tuple[int, int], tuple[int, int, bool]] = field(repr=False)
+
+    @classmethod
+    def open(cls, path: Path | str) -> "SaveFile":
+        path = Path(path)
+        file = path.open("rb")
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            file.close()
+            raise SaveFormatError(f"{path} is empty")
+        if len(data) < HEADER.itemsize or data[:len(MAGIC)] != MAGIC:
+            data.close()
+            file.close()
+            raise SaveFormatError(f"{path} is not a save file")
+        header = np.frombuffer(data, dtype=HEADER, count=1).copy()[0]
+        if header["version"] != VERSION:
+            data.close()
+            file.close()
+            raise SaveFormatError(f"{path} has version {header['version']}, expected {VERSION}")
+        try:
+            index = np.frombuffer(data, dtype=INDEX_DTYPE, count=int(header["scene_count"]),
+                                  offset=int(header["index_offset"]))
+        except ValueError:
+            data.close()
+            file.close()
+            raise SaveFormatError(f"{path} is truncated")
+        return cls(path, header, file, data, {(x, y): (offset, length, bool(compressed))
+                                              for x, y, offset, length, compressed in index.tolist()})
+
+    @property
+    def seed(self) -> int:
+        return int(self.header["seed"])
+
+    @property
+    def time(self) -> int:
+        return int(self.header["time"])
+
+    @property
+    def generator(self) -> str:
+        """The cache key of the generator that generated the terrain of the save, see WorldGenerator.cache_key."""
+        return bytes(self.header["generator"]).decode()
+
+    @property
+    def player(self) -> tuple[int, int] | None:
+        if not self.header["flags"] & HAS_PLAYER:
+            return None
+        return int(self.header["player_x"]), int(self.header["player_y"])
+
+    def __contains__(self, coord: tuple[int, int]) -> bool:
+        return coord in self._index
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def read_raw(self, coord: tuple[int, int]) -> tuple[bytes, bool]:
+        """The encoded scene as it is in the file, and whether it is compressed."""
+        offset, length, compressed = self._index[coord]
+        return self._map[offset:offset + length], compressed
+
+    def read_scene(self, coord: tuple[int, int], fields: "FieldTable") -> "Scene":
+        blob, compressed = self.read_raw(coord)
+        return decode_scene(zlib.decompress(blob) if compressed else blob, coord, fields)
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
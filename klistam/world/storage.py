@@ -0,0 +1,232 @@
+"""
+Keeps scenes on disk while they are not needed in memory, caches generated terrain, and encodes scenes as bytes for
+the store and save files.
+
+A scene is encoded as a SCENE_HEADER, the terrain ids, one MOB_DTYPE row per mob and a JSON table of the sprites,
+classes and names that the rows refer to by index.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+from attrs import define, field
+
+from klistam.klista import CLASSES, Klistam
+from klistam.world.mob import KlistamEncounter, Mob, Position, Prop, Sprite
+from klistam.world.mob_store import ENCOUNTER
+
+if TYPE_CHECKING:
+    from klistam.world.create_world import FieldTable, Scene
+
+SCENE_HEADER = np.dtype([("update_time", "<f8"), ("rows", "<u2"), ("columns", "<u2"), ("itemsize", "<u1"),
+                         ("mob_count", "<u4"), ("table_length", "<u4")])
+# kind is ENCOUNTER or the value of a Prop. The ids are indices into the table of the scene, -1 for none.
+MOB_DTYPE = np.dtype([("x", "<i8"), ("y", "<i8"), ("kind", "<i4"), ("sprite_id", "<i4"), ("class_id", "<i4"),
+                      ("name_id", "<i4"), ("start", "<f8"), ("end", "<f8"), ("energy", "<f8")])
+
+
+def _index(values: list, value) -> int:
+    if value not in values:
+        values.append(value)
+    return values.index(value)
+
+
+def encode_scene(scene: "Scene", mobs: Iterable[Mob] | None = None) -> bytes:
+    """Encode the terrain of a scene with the mobs, by default its own."""
+    mob_list = list(scene.mobs if mobs is None else mobs)
+    rows = np.zeros(len(mob_list), dtype=MOB_DTYPE)
+    sprites: list[Sprite] = []
+    classes: list[str] = []
+    names: list[str] = []
+    rows["sprite_id"] = rows["class_id"] = rows["name_id"] = -1
+    rows["end"] = np.inf
+    for row, mob in zip(rows, mob_list):
+        assert mob.position
+        row["x"], row["y"] = mob.position.x, mob.position.y
+        if mob.sprite is not None:
+            row["sprite_id"] = _index(sprites, mob.sprite)
+        if isinstance(mob.typ, KlistamEncounter):
+            klistam = mob.typ.klistam
+            row["kind"] = ENCOUNTER
+            row["class_id"] = _index(classes, klistam.cls.sprite_name)
+            if klistam.name is not None:
+                row["name_id"] = _index(names, klistam.name)
+            row["energy"] = klistam.energy
+            row["start"] = mob.typ.start
+            if mob.typ.end is not None:
+                row["end"] = mob.typ.end
+        else:
+            row["kind"] = mob.typ.value
+    table = json.dumps({"sprites": [[sprite.name, sprite.scope] for sprite in sprites], "classes": classes,
+                        "names": names}).encode()
+    terrain = np.ascontiguousarray(scene.terrain, dtype=scene.terrain.dtype.newbyteorder("<"))
+    header = np.array((scene.update_time, terrain.shape[0], terrain.shape[1], terrain.itemsize, len(rows),
+                       len(table)), dtype=SCENE_HEADER)
+    return b"".join((header.tobytes(), terrain.tobytes(), rows.tobytes(), table))
+
+
+def decode_scene(data: bytes | memoryview, start_coord: tuple[int, int], fields: "FieldTable") -> "Scene":
+    """Create a scene from the result of encode_scene."""
+    from klistam.world.create_world import Scene
+
+    header = np.frombuffer(data, dtype=SCENE_HEADER, count=1)[0]
+    offset = SCENE_HEADER.itemsize
+    terrain_dtype = np.dtype(f"<u{header['itemsize']}")
+    rows_count, columns = int(header["rows"]), int(header["columns"])
+    # Copied, so that the scene does not keep the buffer alive and can be changed.
+    terrain = np.frombuffer(data, dtype=terrain_dtype, count=rows_count * columns, offset=offset) \
+        .reshape(rows_count, columns).astype(fields.dtype)
+    offset += terrain_dtype.itemsize * rows_count * columns
+    rows = np.frombuffer(data, dtype=MOB_DTYPE, count=int(header["mob_count"]), offset=offset)
+    offset += rows.nbytes
+    table = json.loads(bytes(data[offset:offset + int(header["table_length"])]))
+    sprites = [Sprite(name, scope) for name, scope in table["sprites"]]
+    mobs = []
+    for row in rows.tolist():
+        x, y, kind, sprite_id, class_id, name_id, start, end, energy = row
+        typ: KlistamEncounter | Prop
+        if kind == ENCOUNTER:
+            klistam = Klistam(CLASSES[table["classes"][class_id]], table["names"][name_id] if name_id >= 0 else None,
+                              energy)
+            typ = KlistamEncounter(klistam, start, end if end != np.inf else None)
+        else:
+            typ = Prop(kind)
+        mobs.append(Mob(typ, sprites[sprite_id] if sprite_id >= 0 else None, Position(x, y)))
+    return Scene(terrain, start_coord, fields, mobs, float(header["update_time"]))
+
+
+@define
+class SceneStore:
+    """A directory with one file per scene. Without a path, a temporary directory is used and deleted on close.
+
+    A save in the background can hold the scenes of the store, see hold, and read them as they were then while the
+    world goes on taking and saving scenes."""
+    path: Path | None = field(default=None, converter=lambda path: Path(path) if path is not None else None)
+    _temporary: bool = field(default=False, init=False)
+    _stored: set[tuple[int, int]] = field(factory=set, init=False, repr=False)
+    # The scenes held by a save, and the content of those whose file changed since.
+    _held: set[tuple[int, int]] = field(factory=set, init=False, repr=False)
+    _kept: dict[tuple[int, int], bytes] = field(factory=dict, init=False, repr=False)
+    _lock: threading.Lock = field(factory=threading.Lock, init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        if self.path is None:
+            self.path = Path(tempfile.mkdtemp(prefix="klistam-scenes-"))
+            self._temporary = True
+        self.path.mkdir(parents=True, exist_ok=True)
+        for file in self.path.glob("*.scene"):
+            x, y = file.stem.split("_")
+            self._stored.add((int(x), int(y)))
+
+    def _file(self, coord: tuple[int, int]) -> Path:
+        assert self.path
+        x, y = coord
+        return self.path / f"{x}_{y}.scene"
+
+    def __contains__(self, coord: tuple[int, int]) -> bool:
+        return coord in self._stored
+
+    def save(self, scene: "Scene") -> None:
+        """Write a scene with its mobs, so that it can be dropped from memory."""
+        blob = encode_scene(scene)
+        file = self._file(scene.start_coord)
+        with self._lock:
+            self._keep(scene.start_coord)
+            file.write_bytes(blob)
+        self._stored.add(scene.start_coord)
+
+    def read(self, coord: tuple[int, int]) -> bytes:
+        """The encoded scene, without removing it from the store."""
+        return self._file(coord).read_bytes()
+
+    def take(self, coord: tuple[int, int], fields: "FieldTable") -> "Scene":
+        """Read a scene and remove it from the store, as the scene in memory will be the current one."""
+        file = self._file(coord)
+        with self._lock:
+            blob = file.read_bytes()
+            if coord in self._held:
+                self._kept.setdefault(coord, blob)
+            file.unlink()
+        self._stored.remove(coord)
+        return decode_scene(blob, coord, fields)
+
+    def hold(self) -> list[tuple[int, int]]:
+        """Hold the scenes in the store for a save, which reads them with read_held and then calls release. Only
+        one save can hold the scenes at a time. Returns the coordinates of the scenes."""
+        with self._lock:
+            self._held = set(self._stored)
+            self._kept.clear()
+        return list(self._held)
+
+    def read_held(self, coord: tuple[int, int]) -> bytes:
+        """A held scene as it was when it was held. May be called from another thread."""
+        with self._lock:
+            if (blob := self._kept.get(coord)) is not None:
+                return blob
+            return self._file(coord).read_bytes()
+
+    def release(self) -> None:
+        with self._lock:
+            self._held.clear()
+            self._kept.clear()
+
+    def _keep(self, coord: tuple[int, int]) -> None:
+        # Called with the lock, before the file of a held scene changes.
+        if coord in self._held and coord not in self._kept and coord in self._stored:
+            self._kept[coord] = self._file(coord).read_bytes()
+
+    def __iter__(self) -> Iterator[tuple[int, int]]:
+        return iter(list(self._stored))
+
+    def close(self) -> None:
+        if self._temporary and self.path:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+@define
+class TerrainCache:
+    """Generated terrain on disk, so that it is not generated again for the same key. The key must change whenever
+    the generated terrain would, see WorldGenerator.cache_key."""
+    path: Path = field(converter=Path)
+    key: str
+    _cached: set[tuple[int, int]] = field(factory=set, init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        self.folder.mkdir(parents=True, exist_ok=True)
+        for file in self.folder.glob("*.npy"):
+            x, y = file.stem.split("_")
+            self._cached.add((int(x), int(y)))
+
+    @property
+    def folder(self) -> Path:
+        return self.path / self.key
+
+    def _file(self, coord: tuple[int, int]) -> Path:
+        x, y = coord
+        return self.folder / f"{x}_{y}.npy"
+
+    def __contains__(self, coord: tuple[int, int]) -> bool:
+        return coord in self._cached
+
+    def save(self, scene: "Scene") -> None:
+        """Keep the terrain of a freshly generated scene."""
+        if scene.start_coord in self._cached:
+            return
+        file = self._file(scene.start_coord)
+        # Written under another name first, so that other processes using the cache never read a partial file.
+        temporary = file.with_name(f"{file.stem}.{os.getpid()}.tmp")
+        with temporary.open("wb") as stream:
+            np.save(stream, scene.terrain, allow_pickle=False)
+        os.replace(temporary, file)
+        self._cached.add(scene.start_coord)
+
+    def load(self, coord: tuple[int, int], fields: "FieldTable") -> "Scene":
+        from klistam.world.create_world import Scene
+
+        return Scene(np.load(self._file(coord), allow_pickle=False), coord, fields)
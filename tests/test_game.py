@@ -1,9 +1,23 @@
-from klistam.klista import KlistamClass
+import contextlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from klistam.klista import CLASSES, SNAPSHOT_VERSION, ClassRegistry, Klistam, KlistamClass
 from klistam.world import HEIGHT, WIDTH
-from klistam.world.create_world import World, WorldGenerator, Scene
+from klistam.world.create_world import (ENCOUNTER_TIME, IMPACT_FACTOR, LOAD_RADIUS, REGION_CACHE_SIZE, REGION_SCENES,
+                                        TICK_INTERVALS, World, WorldGenerator, Scene, loaded_scene_coords)
+from klistam.world import create_world
+from klistam.world.loader import SceneLoader
+from klistam.world.savegame import SaveFormatError
+from klistam.world.mob_store import ENCOUNTER, MobStore
+from klistam.world.navigation import Navigation
+from klistam.world.storage import TerrainCache
 import numpy as np
+import pytest
 
-from klistam.world.mob import Mob, Prop
+from klistam.world.mob import KlistamEncounter, Mob, Movement, Position, Prop, Sprite
 
 
 def test_klistam_load() -> None:
@@ -25,11 +39,379 @@ def test_klistam_class() -> None:
 def test_find_free_position() -> None:
     # Create an empty world
     world = World(WorldGenerator.generate())
-    # noinspection PyTypeChecker
-    world._scenes[0, 0] = Scene(np.full((WIDTH, HEIGHT), world.generator.fields[0]), (0, 0))
+    world._scenes[0, 0] = Scene(np.zeros((HEIGHT, WIDTH), np.uint8), (0, 0), world.generator.fields)
     assert np.array_equal(world.find_free_position((5, 5)).coordinates, np.array((5, 5)))
     world.summon(Mob(Prop.Bush, None), (5, 5))
     assert world.get_object_at(np.array((5, 5)))
     assert np.array_equal(world.find_free_position((5, 5)).coordinates, np.array((5, 4)))
     world.summon(Mob(Prop.Bush, None), (5, 5))
     assert np.array_equal(world.find_free_position((5, 5)).coordinates, np.array((4, 4)))
+
+
+def test_impact_matrix() -> None:
+    generator = WorldGenerator.generate(500)
+    for i, the_field in enumerate(generator.fields):
+        impact = generator.get_impact(the_field, IMPACT_FACTOR)
+        assert np.allclose(generator.impact[i], [impact[f] for f in generator.fields])
+    distribution = generator.get_distribution(np.array((0, 4, 4)))
+    assert np.isclose(distribution.sum(), 1.)
+    assert np.allclose(distribution, (generator.impact[0] + 2 * generator.impact[4]) / 3)
+
+
+def test_scene_terrain() -> None:
+    generator = WorldGenerator.generate(500)
+    scene = generator.get_terrain((0, 0), HEIGHT, WIDTH)
+    assert scene.terrain.dtype == np.uint8
+    assert scene.get_terrain_file(3, 2) == scene.get_field(3, 2).name
+    assert scene.walkable.shape == (HEIGHT, WIDTH)
+    assert scene.is_walkable(3, 2) == bool(scene.get_field(3, 2).walkable)
+
+
+def test_scene_generation_is_deterministic() -> None:
+    world = World(WorldGenerator.generate(500))
+    terrain = world.get_scene((2, -1)).terrain
+    other = World(WorldGenerator.generate(500))
+    other.get_scene((0, 0))
+    other.get_scene((1, -1))
+    assert np.array_equal(other.get_scene((2, -1)).terrain, terrain)
+    assert not np.array_equal(world.get_scene((1, -1)).terrain, terrain)
+
+
+def test_regions_are_continuous() -> None:
+    generator = WorldGenerator.generate(500)
+    region = generator.get_region((-1, 0))
+    assert region.shape == (REGION_SCENES * HEIGHT, REGION_SCENES * WIDTH)
+    for x, y in [(-REGION_SCENES, 0), (-1, 2), (-2, REGION_SCENES - 1)]:
+        terrain = generator.get_scene((x, y)).terrain
+        column = (x + REGION_SCENES) * WIDTH
+        assert np.array_equal(terrain, region[y * HEIGHT:(y + 1) * HEIGHT, column:column + WIDTH])
+
+
+def test_region_cache_holds_loaded_scenes() -> None:
+    generator = WorldGenerator.generate(500)
+    for middle in ((2, 2), (3, 3), (2, 2)):
+        for coord in loaded_scene_coords(middle):
+            generator.get_scene(coord)
+    # The regions of the scenes around (2, 2) were used last and are all still there.
+    assert all(generator.has_region(generator.region_of(coord)) for coord in loaded_scene_coords((3, 3)))
+    loader = SceneLoader(generator)
+    loader.prefetch((2, 2))
+    assert loader.is_pending((2, 2)) and not loader._pending
+    assert [scene.start_coord for scene in loader.collect()] == [(2, 2)]
+    loader.shutdown()
+
+
+def test_regions_from_threads() -> None:
+    generator = WorldGenerator.generate(500)
+    coords = [(x * REGION_SCENES, y) for x in range(4 * REGION_CACHE_SIZE) for y in range(2)]
+    with ThreadPoolExecutor(4) as executor:
+        scenes = list(executor.map(generator.get_scene, coords))
+    fresh = WorldGenerator.generate(500)
+    assert all(np.array_equal(scene.terrain, fresh.get_scene(scene.start_coord).terrain) for scene in scenes)
+
+
+def test_sample_block_without_neighbours() -> None:
+    generator = WorldGenerator.generate(500)
+    rng = np.random.default_rng(3)
+    samples = 4000
+    # The first cell has no neighbours, so all fields are equally likely.
+    counts = np.bincount([generator.sample_block(rng, 1, 1)[0, 0] for _ in range(samples)],
+                         minlength=len(generator.fields))
+    assert np.abs(counts / samples - 1 / len(generator.fields)).max() < 0.04
+
+
+def test_scene_loader_prefetches_ahead() -> None:
+    world = World.generate(500)
+    world.loader = SceneLoader(world.generator)
+    assert world.player and world.player.position
+    world.player.movement = Movement.from_name("right")
+    world.prefetch_scenes()
+    assert world.loader.is_pending((LOAD_RADIUS, 0))
+    assert not world.loader.is_pending((-LOAD_RADIUS - 1, 0))
+    terrain = world.get_scene((LOAD_RADIUS, 0)).terrain
+    assert np.array_equal(terrain, world.generator.get_scene((LOAD_RADIUS, 0)).terrain)
+    world.close()
+
+
+def test_scene_loader_hands_out_regions() -> None:
+    generator = WorldGenerator.generate(500)
+    with ProcessPoolExecutor(1) as executor:
+        loader = SceneLoader(WorldGenerator.generate(500), executor)
+        coords = [(0, 0), (1, 0), (REGION_SCENES, 0)]
+        for coord in coords:
+            loader.prefetch(coord)
+        # One task per region, with a copy of the generator that leaves the region cache behind.
+        assert len(loader._pending) == 2
+        assert np.array_equal(loader.take((1, 0)).terrain, generator.get_scene((1, 0)).terrain)
+        assert loader.generator.has_region((0, 0)) and not loader.is_pending((1, 0))
+        executor.shutdown()
+        scenes = loader.collect()
+    assert sorted(scene.start_coord for scene in scenes) == [(0, 0), (REGION_SCENES, 0)]
+    assert all(np.array_equal(scene.terrain, generator.get_scene(scene.start_coord).terrain) for scene in scenes)
+
+
+def test_evicted_scenes_are_restored() -> None:
+    world = World.generate(500)
+    world.capacity = (2 * LOAD_RADIUS + 1) ** 2
+    world.tick()
+    far_scene = world.get_scene((-LOAD_RADIUS - 1, 0))
+    far_scene.add_mob(Mob(Prop.Bush, None, Position.from_tuple((-WIDTH * (LOAD_RADIUS + 1), 0))))
+    far_scene.update_time = 7
+    assert world.player
+    world.summon(world.player, (WIDTH * 3, 0))
+    world.tick()
+    assert len(world._scenes) == world.capacity
+    assert world.store and far_scene.start_coord in world.store
+    restored = world.get_scene(far_scene.start_coord)
+    assert restored.update_time == 7
+    assert [mob.typ for mob in restored.mobs] == [mob.typ for mob in far_scene.mobs]
+    assert Prop.Bush in [mob.typ for mob in restored.mobs]
+    assert np.array_equal(restored.terrain, far_scene.terrain)
+    world.close()
+
+
+def test_occupancy_index() -> None:
+    world = World(WorldGenerator.generate())
+    world._scenes[-1, 0] = Scene(np.zeros((HEIGHT, WIDTH), np.uint8), (-1, 0), world.generator.fields)
+    bush = Mob(Prop.Bush, None)
+    world.summon(bush, (-1, 3))
+    scene = world.get_scene((-1, 0))
+    assert scene.get_mob_at(WIDTH - 1, 3) is bush and scene.occupied[3, WIDTH - 1]
+    assert world.get_object_at((-1, 3)) is bush
+    world.remove_mob(bush)
+    assert world.get_object_at((-1, 3)) is None and not scene.occupied.any()
+
+
+def open_world(stones: float = 0.) -> World:
+    """A world with grass in the scenes around the origin, and at random some stones."""
+    world = World(WorldGenerator.generate(500))
+    names = list(world.generator.fields.names)
+    rng = np.random.default_rng(5)
+    for x in range(-2, 3):
+        for y in range(-2, 3):
+            terrain = np.where(rng.random((HEIGHT, WIDTH)) < stones, names.index("stone"), names.index("grass"))
+            world._scenes[x, y] = Scene(terrain.astype(np.uint8), (x, y), world.generator.fields)
+    return world
+
+
+def test_find_path() -> None:
+    world = open_world()
+    # A wall along the right edge of the scenes at x = 0, with a gap at the bottom of scene (0, 0).
+    for y in range(-HEIGHT, 2 * HEIGHT):
+        if y != HEIGHT - 1:
+            scene = world.get_scene(Position(WIDTH - 1, y).scene)
+            scene.terrain[y % HEIGHT, WIDTH - 1] = list(world.generator.fields.names).index("stone")
+    navigation = Navigation(world)
+    path = navigation.find_path((WIDTH - 3, 0), (WIDTH + 1, 0))
+    assert path and len(path) == 4 + 2 * (HEIGHT - 1) and path[-1] == Position(WIDTH + 1, 0)
+    assert Position(WIDTH - 1, HEIGHT - 1) in path
+    for before, after in zip([Position(WIDTH - 3, 0), *path], path):
+        assert abs(before.x - after.x) + abs(before.y - after.y) == 1
+        assert world.get_scene(after.scene).is_walkable(*after.scene_coordinates)
+    world.summon(Mob(Prop.Bush, None), (WIDTH - 1, HEIGHT - 1))
+    assert navigation.find_path((WIDTH - 3, 0), (WIDTH + 1, 0)) is None
+    assert navigation.find_path((WIDTH - 3, 0), (WIDTH + 1, 0), avoid_mobs=False) == path
+    assert navigation.find_path((WIDTH - 3, 0), (WIDTH - 1, 0)) is None
+
+
+def test_distance_field() -> None:
+    world = open_world(stones=0.3)
+    navigation = Navigation(world)
+    source = Position(2, 3)
+    world.get_scene(source.scene).terrain[source.y, source.x] = list(world.generator.fields.names).index("grass")
+    distances = navigation.distance_field([source], radius=1)
+    assert distances.distance(source) == 0 and distances.step(source) is None
+    assert distances.distance((4 * WIDTH, 0)) is None
+    rng = np.random.default_rng(2)
+    xs, ys = rng.integers(-WIDTH, 2 * WIDTH, 50), rng.integers(-HEIGHT, 2 * HEIGHT, 50)
+    steps = distances.steps(xs, ys)
+    for x, y, step in zip(xs.tolist(), ys.tolist(), steps.tolist()):
+        path = navigation.find_path(source, (x, y), avoid_mobs=False)
+        distance = distances.distance((x, y))
+        assert (None if path is None else len(path)) == distance
+        if distance:
+            assert distances.distance((x + step[0], y + step[1])) == distance - 1
+    assert navigation.distance_field([source], radius=1) is distances
+    with_mobs = navigation.distance_field([source], radius=1, avoid_mobs=True)
+    world.summon(Mob(Prop.Bush, None), (WIDTH, 0))
+    assert navigation.distance_field([source], radius=1) is distances
+    assert navigation.distance_field([source], radius=1, avoid_mobs=True) is not with_mobs
+
+
+def test_encounters_expire() -> None:
+    world = World.generate(500)
+    world.tick()
+    encounters = [mob for scene in world.get_loaded_scenes() for mob in scene.mobs
+                  if isinstance(mob.typ, KlistamEncounter)]
+    assert encounters
+    assert all(world.time - ENCOUNTER_TIME <= mob.typ.start <= world.time for mob in encounters)
+    world.time += ENCOUNTER_TIME
+    world.tick()
+    assert all(mob.position is None for mob in encounters)
+
+
+def test_world_with_mob_store() -> None:
+    world = World.generate(500)
+    world.mob_store = MobStore()
+    world.tick()
+    assert len(world.mob_store) and not any(isinstance(mob.typ, KlistamEncounter)
+                                            for scene in world.get_loaded_scenes() for mob in scene.mobs)
+    slot = int(world.mob_store.in_rect(-WIDTH * 4, -HEIGHT * 4, WIDTH * 7, HEIGHT * 7)[0])
+    position = Position(int(world.mob_store.x[slot]), int(world.mob_store.y[slot]))
+    scene = world.get_scene(position.scene)
+    assert scene.occupied[position.scene_coordinates[1], position.scene_coordinates[0]]
+    mob = world.mob_store.view(slot)
+    assert world.get_object_at(position) is mob
+    assert mob in list(world.get_visible_mobs(scene))
+    # Fields of the player and of stored mobs are taken, the scene learns of the new mob.
+    assert world.player and world.player.position
+    free = world.find_free_position(world.player.position)
+    xs = np.array([world.player.position.x, position.x, free.x])
+    ys = np.array([world.player.position.y, position.y, free.y])
+    slots = world.store_mobs(xs, ys, ENCOUNTER, 0)
+    assert len(slots) == 1 and world.get_object_at(free) is world.mob_store.view(int(slots[0]))
+    assert world.get_scene(free.scene).occupied[free.scene_coordinates[1], free.scene_coordinates[0]]
+    world.time += ENCOUNTER_TIME
+    world.tick()
+    assert mob.position is None
+
+
+def test_mobs_in_rect() -> None:
+    world = World.generate(500)
+    world.mob_store = MobStore()
+    world.tick()
+    # Across the corner of four scenes.
+    left, top, width, height = WIDTH // 2, HEIGHT // 2, WIDTH, HEIGHT
+    expected = {mob for coord in loaded_scene_coords((0, 0)) for mob in world.get_visible_mobs(world.get_scene(coord))
+                if mob.position and left <= mob.position.x < left + width and top <= mob.position.y < top + height}
+    mobs = list(world.get_mobs_in_rect(left, top, width, height))
+    assert world.player in mobs and len(mobs) == len(set(mobs)) and set(mobs) == expected
+
+
+def test_save_and_load(tmp_path) -> None:
+    world = World.generate(500)
+    world.tick()
+    assert world.player
+    world.summon(Mob(Prop.Bush, Sprite("bush")), (3, 3))
+    encounter = Mob(KlistamEncounter(Klistam(KlistamClass.load_classes()["wood_idol"], "Idolo"), 5, None),
+                    Sprite("encounter"))
+    world.summon(encounter, (-WIDTH * 2, 4))
+    world.time = 42
+    world.snapshot().write(tmp_path / "world.sav")
+    loaded = World.load(tmp_path / "world.sav")
+    assert loaded.generator.seed == 500 and loaded.time == 42
+    assert loaded.player and loaded.player.position == world.player.position
+    assert loaded.save_file and len(loaded.save_file) == len(world._scenes)
+    assert loaded.get_object_at((3, 3)).typ == Prop.Bush
+    restored = loaded.get_object_at((-WIDTH * 2, 4))
+    assert restored.typ == encounter.typ and restored.sprite == Sprite("encounter")
+    for coord, scene in world._scenes.items():
+        assert np.array_equal(loaded.get_scene(coord).terrain, scene.terrain)
+    # Scenes that were not read are carried over when saving again, over the save that is open.
+    loaded.get_scene((0, 0))
+    loaded.replace_save(loaded.snapshot().write_temporary(tmp_path / "world.sav"), tmp_path / "world.sav")
+    assert loaded.get_object_at((-WIDTH * 2, 4)).typ == encounter.typ
+    loaded.close()
+    again = World.load(tmp_path / "world.sav")
+    assert again.get_object_at((-WIDTH * 2, 4)).typ == encounter.typ
+    assert again.save_file and len(again.save_file) == len(world._scenes)
+    again.close()
+    world.close()
+
+
+def test_save_of_other_generator(tmp_path, monkeypatch) -> None:
+    world = World.generate(500)
+    world.tick()
+    world.snapshot().write(tmp_path / "world.sav")
+    world.close()
+    monkeypatch.setattr(create_world, "GENERATOR_VERSION", create_world.GENERATOR_VERSION + 1)
+    with pytest.raises(SaveFormatError):
+        World.load(tmp_path / "world.sav")
+
+
+def test_snapshot_holds_stored_scenes(tmp_path) -> None:
+    world = World.generate(500)
+    world.mob_store = MobStore()
+    world.capacity = (2 * LOAD_RADIUS + 1) ** 2
+    world.tick()
+    assert world.player
+    world.summon(world.player, (WIDTH * 3, 0))
+    world.tick()
+    far = (-LOAD_RADIUS - 1, 0)
+    assert world.store and far in world.store
+    encounter = world.find_free_position((far[0] * WIDTH, 2))
+    world.store_mobs(np.array([encounter.x]), np.array([encounter.y]), ENCOUNTER,
+                     world.mob_store.sprite_id_of(Sprite("encounter")), CLASSES.id_of("wood_idol"))
+    snapshot = world.snapshot()
+    # The world goes on while the snapshot waits to be written: the held scene is loaded, changed and stored again.
+    bush = world.find_free_position((far[0] * WIDTH, 8))
+    world.summon(Mob(Prop.Bush, Sprite("bush")), bush)
+    world.release_scene(far)
+    assert far in world.store
+    snapshot.write(tmp_path / "world.sav")
+    loaded = World.load(tmp_path / "world.sav")
+    assert loaded.get_object_at(bush) is None
+    assert isinstance(loaded.get_object_at(encounter).typ, KlistamEncounter)
+    loaded.close()
+    world.close()
+
+
+def test_terrain_cache(tmp_path) -> None:
+    world = World.generate(500)
+    world.terrain_cache = TerrainCache(tmp_path, world.generator.cache_key())
+    world.tick()
+    assert (-1, 0) in world.terrain_cache
+    cached = World.generate(500)
+    cached.terrain_cache = TerrainCache(tmp_path, cached.generator.cache_key())
+    assert (-1, 0) in cached.terrain_cache
+    for coord, scene in world._scenes.items():
+        assert np.array_equal(cached.get_scene(coord).terrain, scene.terrain)
+    assert WorldGenerator.generate(501).cache_key() != world.generator.cache_key()
+    world.close()
+    cached.close()
+
+
+def test_class_registry(tmp_path) -> None:
+    folder = tmp_path / "classes"
+    folder.mkdir()
+    (folder / "wood_idol.yml").write_text("id: wood_idol\nname: Wood Idol\ndescription: A wooden idol.\n")
+    registry = ClassRegistry(folder, snapshot_path=tmp_path / "classes.snapshot")
+    with ThreadPoolExecutor(4) as executor:
+        assert set(executor.map(registry.id_of, ["wood_idol"] * 8)) == {0}
+    assert registry.by_id(0).name == "Wood Idol" and (tmp_path / "classes.snapshot").exists()
+    assert not registry.refresh()
+    (folder / "stone_idol.yml").write_text("id: stone_idol\nname: Stone Idol\ndescription: A stone idol.\n")
+    (folder / "wood_idol.yml").write_text("id: wood_idol\nname: Old Idol\ndescription: A wooden idol.\n")
+    os.utime(folder / "wood_idol.yml", ns=(0, 1))
+    assert registry.refresh()
+    assert registry.id_of("wood_idol") == 0 and registry.id_of("stone_idol") == 1
+    assert registry["wood_idol"].name == "Old Idol"
+    # A new registry reads the snapshot instead of the class files.
+    (folder / "wood_idol.yml").write_text("not: [valid")
+    os.utime(folder / "wood_idol.yml", ns=(0, 1))
+    assert ClassRegistry(folder, snapshot_path=tmp_path / "classes.snapshot")["wood_idol"].name == "Old Idol"
+    assert json.loads((tmp_path / "classes.snapshot").read_text())[0] == SNAPSHOT_VERSION
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["classes", "classes.snapshot"]
+
+
+def test_tiered_ticks_are_statistically_equivalent() -> None:
+    def live_encounters(tick_intervals: tuple[int, ...] | None) -> int:
+        total = 0
+        for seed in range(3):
+            world = World.generate(seed)
+            world.spawn_rate = 1 / 1024
+            world.tick_intervals = tick_intervals
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _tick in range(ENCOUNTER_TIME + 400):
+                    world.tick()
+                # Looking at the scenes brings them up to date.
+                scenes = list(world.get_loaded_scenes())
+                world.tick_scenes(scenes)
+            total += sum(isinstance(mob.typ, KlistamEncounter) for scene in scenes for mob in scene.mobs)
+            world.close()
+        return total
+
+    every_tick = live_encounters(None)
+    tiered = live_encounters(TICK_INTERVALS)
+    # About 500 encounters each, so three standard deviations are about 15 %.
+    assert abs(tiered - every_tick) < 0.15 * every_tick
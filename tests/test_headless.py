@@ -0,0 +1,14 @@
+"""Tests for running the world without a display."""
+from klistam import headless
+from klistam.world.create_world import World
+
+
+def test_simulate() -> None:
+    world = World.generate(500)
+    assert world.player and world.player.position
+    start = world.player.position
+    result = headless.simulate(world, 100, path=["right"])
+    assert result.ticks == 100 and world.time == 100
+    assert world.player.position == start + (5, 0)
+    assert {"load", "spawn", "expire"} <= result.phases.keys()
+    assert result.phase_counts["spawn"] == 100
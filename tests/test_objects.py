@@ -1,5 +1,10 @@
 """Tests for the objects in the game."""
-from klistam.world.mob import Movement, Position
+import numpy as np
+
+from klistam.klista import CLASSES
+from klistam.world import WIDTH
+from klistam.world.mob import KlistamEncounter, Mob, Movement, Position, Prop, Sprite
+from klistam.world.mob_store import ENCOUNTER, MobStore
 
 
 def test_movement_offset() -> None:
@@ -11,8 +16,44 @@ def test_movement_offset() -> None:
     assert movement.offset[0] == -0. and movement.offset[1] == 0.
 
 
+def test_movement_interpolation() -> None:
+    mob = Mob(Prop.Player, movement=Movement.from_name("down"))
+    mob.advance_movement(0.25)
+    assert mob.movement
+    assert mob.movement.offset_at(0.) == (-0., -1.) and mob.movement.offset_at(1.) == mob.movement.offset
+    assert mob.movement.offset_at(0.5) == (-0., -0.875)
+
+
 def test_position() -> None:
     position = Position.from_tuple((-1, 3))
     assert position.scene == (-1, 0)
     assert position.scene_coordinates[1] == 3
     assert str(position) == "Position(-1, 3)"
+
+
+def test_position_value_type() -> None:
+    position = Position(-1, 3)
+    assert position == Position.from_tuple((-1, 3)) and hash(position) == hash(Position(-1, 3))
+    assert position + (WIDTH, 0) == Position(WIDTH - 1, 3)
+    assert {position: 1}[Position(-1, 3)] == 1
+    array = Position.to_array([position, Position(5, -7)])
+    assert array["y"].tolist() == [3, -7]
+    assert Position.from_array(array) == [position, Position(5, -7)]
+
+
+def test_mob_store() -> None:
+    store = MobStore()
+    sprite = store.sprite_id_of(Sprite("encounter"))
+    slots = store.add(np.array((0, 5, -3)), np.array((0, 1, 2)), ENCOUNTER, sprite, CLASSES.id_of("wood_idol"),
+                      start=np.array((0., 0., 10.)), end=np.array((5., 50., 15.)))
+    assert len(store) == 3
+    assert store.expired(10.).tolist() == [slots[0]]
+    assert store.in_rect(0, 0, 10, 10).tolist() == sorted(slots[:2].tolist())
+    mob = store.view(int(slots[1]))
+    assert mob.position == Position(5, 1) and isinstance(mob.typ, KlistamEncounter) and mob.typ.end == 50.
+    assert store.slot_at(Position(5, 1)) == slots[1] and store.slot_of(mob) == slots[1]
+    store.remove([int(slots[1])])
+    assert mob.position is None and store.slot_at(Position(5, 1)) is None
+    reused = store.add(np.array((7,)), np.array((7,)), Prop.Bush.value, sprite)
+    assert reused.tolist() == [slots[1]]
+    assert store.view(int(reused[0])).typ is Prop.Bush
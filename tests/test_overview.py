@@ -0,0 +1,34 @@
+import numpy as np
+import pygame
+
+from klistam.overview import Palette, downsample, generate_terrain, write_png, write_pyramid
+from klistam.world import HEIGHT, WIDTH
+from klistam.world.create_world import WorldGenerator
+
+
+def test_generate_terrain() -> None:
+    generator = WorldGenerator.generate(500)
+    corner, size = (-3, 2), (6, 3)
+    terrain = generate_terrain(500, corner, size, processes=1)
+    assert terrain.shape == (size[1] * HEIGHT, size[0] * WIDTH)
+    for x, y in [(-3, 2), (0, 3), (2, 4)]:
+        column, row = (x - corner[0]) * WIDTH, (y - corner[1]) * HEIGHT
+        assert np.array_equal(terrain[row:row + HEIGHT, column:column + WIDTH], generator.get_scene((x, y)).terrain)
+    assert np.array_equal(generate_terrain(500, corner, size, processes=2), terrain)
+
+
+def test_palette(tmp_path) -> None:
+    fields = WorldGenerator.generate(500).fields
+    terrain = np.array([[0, 5], [7, 7]])
+    colours = Palette.load(fields)
+    image = colours.render(terrain)
+    assert image.shape == (2, 2, 3) and np.array_equal(image[1, 0], image[1, 1])
+    tiles = Palette.load(fields, 4)
+    image = tiles.render(terrain)
+    assert image.shape == (8, 8, 3) and np.array_equal(image[4:, :4], tiles.tiles[7])
+    assert np.abs(downsample(downsample(image)).astype(int) - colours.render(terrain)).max() < 40
+    write_png(tmp_path / "map.png", image)
+    assert pygame.image.load(tmp_path / "map.png").get_size() == (8, 8)
+    assert write_pyramid(tmp_path / "pyramid", np.zeros((5, 9, 3), np.uint8), tile=4) == 3
+    assert pygame.image.load(tmp_path / "pyramid" / "0" / "0" / "0.png").get_size() == (3, 2)
+    assert pygame.image.load(tmp_path / "pyramid" / "2" / "1" / "2.png").get_size() == (1, 1)
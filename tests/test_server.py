@@ -0,0 +1,128 @@
+import asyncio
+import json
+
+from klistam.server import WorldServer, create_world
+from klistam.world.create_world import LOAD_RADIUS, SceneInterest, World, loaded_scene_coords
+from klistam.world.mob import DIRECTIONS
+
+
+def test_scene_interest_counts_players() -> None:
+    interest = SceneInterest()
+    interest.place("a", (0, 0))
+    interest.place("b", (1, 0))
+    added, released = interest.take_changes()
+    assert added == set(loaded_scene_coords((0, 0))) | set(loaded_scene_coords((1, 0))) and not released
+    assert interest.counts[0, 0] == 2 and interest.counts[-LOAD_RADIUS - 1, 0] == 1
+    assert sorted(interest.tiers()[0]) == [(0, 0), (1, 0)]
+    interest.place("a", (1, 0))
+    added, released = interest.take_changes()
+    assert not added and released == set(loaded_scene_coords((0, 0))) - set(loaded_scene_coords((1, 0)))
+    interest.remove("a")
+    interest.remove("b")
+    assert not interest.counts and interest.take_changes()[1] == set(loaded_scene_coords((1, 0)))
+
+
+def test_world_ticks_shared_scenes_once() -> None:
+    world = World.generate(500, player=False)
+    world.interest = SceneInterest()
+    world.interest.place("a", (0, 0))
+    world.interest.place("b", (1, 0))
+    world.tick()
+    due = world.get_interesting_scenes()
+    assert not due
+    world.tick_intervals = None
+    world.time += 1
+    due = world.get_interesting_scenes()
+    assert len(due) == len({scene.start_coord for scene in due}) == len(world.interest.counts)
+    world.interest.remove("a")
+    world.tick()
+    assert world.store and (-LOAD_RADIUS - 1, 0) in world.store
+    world.close()
+
+
+def test_capacity_keeps_scenes_of_interest() -> None:
+    world = World.generate(500, player=False)
+    world.interest = SceneInterest()
+    world.interest.place("a", (10, 0))
+    world.capacity = 1
+    world.tick()
+    world.evict_scenes()
+    assert all(coord in world._scenes for coord in world.interest.counts)
+    world.close()
+
+
+def test_malformed_messages_are_ignored() -> None:
+    server = WorldServer(create_world(500))
+    client = server.connect(Discard())
+    for message in ([1], "walk", {"type": "walk", "direction": [1]}, {"type": "walk", "direction": "up", "id": 1}):
+        server.receive(client, message)
+    assert client.direction == DIRECTIONS["up"] and client.acks == [1]
+    server.world.close()
+
+
+class Discard:
+    """A stream writer that drops what is written."""
+
+    def write(self, data: bytes) -> None:
+        pass
+
+
+class View:
+    """What a client knows of the mobs around its player."""
+
+    def __init__(self, reader: asyncio.StreamReader) -> None:
+        self.reader = reader
+        self.mobs: dict[tuple[int, int], set[tuple[int, int]]] = {}
+
+    async def read(self) -> dict:
+        message = json.loads(await self.reader.readline())
+        for scene in message.get("scenes", ()):
+            mobs = set() if "terrain" in scene else self.mobs[tuple(scene["coord"])]
+            mobs -= {tuple(position) for position in scene["removed"]}
+            mobs |= {(x, y) for x, y, _sprite in scene["added"]}
+            self.mobs[tuple(scene["coord"])] = mobs
+        for coord in message.get("forget", ()):
+            del self.mobs[tuple(coord)]
+        return message
+
+    def positions(self) -> set[tuple[int, int]]:
+        return set().union(*self.mobs.values())
+
+
+def test_server_sends_changes() -> None:
+    async def play() -> None:
+        server = WorldServer(create_world(500), rate=200)
+        ready: asyncio.Future[str] = asyncio.get_running_loop().create_future()
+        serving = asyncio.create_task(server.serve(ready=ready))
+        host, port = (await ready).rsplit(":", 1)
+        first_reader, first_writer = await asyncio.open_connection(host, int(port))
+        first = View(first_reader)
+        welcome = await first.read()
+        assert welcome["type"] == "welcome"
+        message = await first.read()
+        assert message["type"] == "tick" and len(message["scenes"]) == len(first.mobs) == 9
+        assert all("terrain" in scene for scene in message["scenes"])
+        second_reader, second_writer = await asyncio.open_connection(host, int(port))
+        second = View(second_reader)
+        other = tuple((await second.read())["player"])
+        assert all("terrain" in scene for scene in (await second.read())["scenes"])
+        while other not in first.positions():
+            await first.read()
+
+        start = tuple(welcome["player"])
+        direction, step = next((name, step) for name, step in DIRECTIONS.items()
+                               if (start[0] + step[0], start[1] + step[1]) not in first.positions())
+        first_writer.write(json.dumps({"type": "walk", "direction": direction, "id": 1}).encode() + b"\n")
+        while not (message := await first.read())["ack"]:
+            pass
+        assert message["ack"] == [1] and tuple(message["player"]) == (start[0] + step[0], start[1] + step[1])
+        # The second client hears of the walk as a change of the scenes it knows.
+        while start in second.positions() or tuple(message["player"]) not in second.positions():
+            assert not any("terrain" in scene for scene in (await second.read())["scenes"])
+
+        first_writer.close()
+        second_writer.close()
+        serving.cancel()
+        server.world.close()
+
+    asyncio.run(asyncio.wait_for(play(), 10))
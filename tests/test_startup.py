@@ -0,0 +1,59 @@
+"""Keeps the time until the game shows its first frame within a budget."""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Seconds. Generous, as the machines running the tests vary, but far below what loading scipy or generating the whole
+# ring of scenes before the first frame costs.
+IMPORT_BUDGET = 1.5
+OWN_IMPORT_BUDGET = 0.2
+FIRST_FRAME_BUDGET = 0.5
+# Modules that must not be imported when the game starts.
+HEAVY_MODULES = ("scipy", "yaml")
+
+STARTUP_SCRIPT = """
+import time
+import pygame
+from pathlib import Path
+from klistam.game import Game
+start = time.perf_counter()
+game = Game.create(save_path=Path(game_path))
+scene = game.world.get_player_scene()
+game.scene_view.draw(game.screen, scene, game.world.get_visible_mobs(scene))
+pygame.display.flip()
+print(time.perf_counter() - start)
+game.world.close()
+"""
+
+
+def parse_importtime(output: str) -> dict[str, tuple[float, float]]:
+    """The self and cumulative import time in seconds by module, from the output of python -X importtime."""
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(own) / 1e6, int(cumulative) / 1e6
+    return times
+
+
+def run_python(home: Path, *args: str) -> subprocess.CompletedProcess:
+    """Run Python with home as the home folder, so that the game keeps its files there and not in that of the user."""
+    environment = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", HOME=str(home),
+                       USERPROFILE=str(home), PYTHONPATH=str(Path(__file__).parents[1]))
+    return subprocess.run([sys.executable, *args], capture_output=True, text=True, env=environment, check=True)
+
+
+def test_import_budget(tmp_path: Path) -> None:
+    times = parse_importtime(run_python(tmp_path, "-X", "importtime", "-c", "import klistam.game").stderr)
+    assert not [name for name in times if name.split(".")[0] in HEAVY_MODULES]
+    assert times["klistam.game"][1] < IMPORT_BUDGET
+    assert sum(own for name, (own, _cumulative) in times.items() if name.startswith("klistam")) < OWN_IMPORT_BUDGET
+
+
+def test_first_frame_budget(tmp_path: Path) -> None:
+    script = f"game_path = {str(tmp_path / 'world.sav')!r}\n" + STARTUP_SCRIPT
+    first_frame = float(run_python(tmp_path, "-c", script).stdout.strip().splitlines()[-1])
+    assert first_frame < FIRST_FRAME_BUDGET
+    assert (tmp_path / ".klistam" / "classes.snapshot").exists()
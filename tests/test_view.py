@@ -0,0 +1,174 @@
+"""Tests for drawing the game with a dummy video driver."""
+import json
+import os
+import threading
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+import pytest
+
+from klistam.assets import AssetManager
+from klistam.game import HUD, KG, MINIMAP_PLAYER_COLOR, Camera, FixedTimestep, Game, Minimap, SceneView
+from klistam.overview import Palette
+from klistam.profiling import FrameProfiler
+from klistam.world import HEIGHT, WIDTH
+from klistam.world.create_world import World
+from klistam.world.mob import Movement
+
+
+@pytest.fixture
+def screen():
+    pygame.init()
+    yield pygame.display.set_mode((KG * WIDTH, KG * HEIGHT))
+    pygame.quit()
+
+
+@pytest.fixture
+def assets(screen) -> AssetManager:
+    return AssetManager.load(KG)
+
+
+def test_asset_manager(assets) -> None:
+    grass = assets.get_terrain("grass")
+    assert grass and grass.get_size() == (KG, KG)
+    assert grass.get_parent() is assets.atlases["terrain"]
+    assert assets.get_terrain("oak") is None
+    unknown = assets.get_sprite("does_not_exist", "object")
+    assert assets.get_sprite("does_not_exist", "player") is unknown
+
+
+def test_terrain_surface_is_cached(screen, assets) -> None:
+    world = World.generate(500)
+    scene = world.get_player_scene()
+    view = SceneView(assets)
+    surface = view.get_terrain_surface(screen, scene)
+    assert view.get_terrain_surface(screen, scene) is surface
+    for (y, x), terrain in np.ndenumerate(scene.fields.names[scene.terrain[:HEIGHT, :WIDTH]]):
+        view.draw_kachel(terrain=terrain, screen=screen, x=x, y=y)
+    assert pygame.image.tostring(surface, "RGB") == pygame.image.tostring(screen, "RGB")
+
+
+def test_dirty_rendering_matches_full_redraw(screen, assets) -> None:
+    world = World.generate(500)
+    scene = world.get_player_scene()
+    view = SceneView(assets, dirty_rendering=True)
+    assert view.draw(screen, scene) is None
+    assert view.draw(screen, scene) == []
+    assert world.player and world.player.position
+    world.player.movement = Movement.from_name("right")
+    world.summon(world.player, world.player.position + (1, 0))
+    world.player.movement.progress = 0.5
+    dirty = view.draw(screen, scene)
+    assert dirty and len(dirty) == 2
+    expected = screen.copy()
+    SceneView(assets).draw(expected, scene)
+    assert pygame.image.tostring(screen, "RGB") == pygame.image.tostring(expected, "RGB")
+
+
+def test_camera_across_scenes(screen, assets) -> None:
+    world = World.generate(500)
+    assert world.player and world.player.position
+    world.player.movement = Movement.from_name("right")
+    world.summon(world.player, world.player.position + (1, 0))
+    world.player.movement.progress = 0.5
+    camera = Camera()
+    camera.follow(world.player)
+    # The player at (10, 6) is shown half a field to the left of it, in the middle of the screen.
+    assert (camera.left, camera.top) == (KG * 10 - KG * WIDTH // 2, KG * 6 + KG // 2 - KG * HEIGHT // 2)
+    assert camera.get_scenes() == [(0, 0), (1, 0), (0, 1), (1, 1)]
+    view = SceneView(assets, dirty_rendering=True)
+    assert view.draw_view(screen, world, camera) is None
+    assert view.draw_view(screen, world, camera) == []
+    # The terrain of the four scenes put together, seen through the camera.
+    expected = pygame.Surface((2 * KG * WIDTH, 2 * KG * HEIGHT))
+    for x, y in camera.get_scenes():
+        expected.blit(view.get_terrain_surface(screen, world.get_scene((x, y))), (x * KG * WIDTH, y * KG * HEIGHT))
+    origin = camera.left, camera.top
+    expected = expected.subsurface(pygame.Rect(origin, screen.get_size())).copy()
+    for mob in sorted(world.get_mobs_in_rect(*camera.get_fields(2)), key=lambda mob: mob.position.y):
+        if mob.sprite:
+            expected.blit(*view.get_mob_sprite(mob, 1., origin))
+    assert pygame.image.tostring(screen, "RGB") == pygame.image.tostring(expected, "RGB")
+    world.player.movement.progress = 0.25
+    camera.follow(world.player)
+    assert view.draw_view(screen, world, camera) is None
+
+
+def test_profile_overlay(screen, assets, tmp_path) -> None:
+    world = World.generate(500)
+    profiler = FrameProfiler(history=2)
+    world.timer = profiler
+    view = SceneView(assets, hud=HUD(profiler), dirty_rendering=True)
+    scene = world.get_player_scene()
+    view.draw(screen, scene)
+    for _frame in range(3):
+        profiler.start_frame()
+        with profiler.phase("tick"):
+            world.tick()
+        with profiler.phase("draw"):
+            dirty = view.draw(screen, scene)
+    assert dirty and dirty[-1].topleft == (0, 0) and dirty[-1].width > 0
+    assert {"tick", "load", "spawn", "draw"} <= profiler.recent(2).keys()
+    profiler.export(tmp_path / "profile.json")
+    profiler.export(tmp_path / "trace.json", "chrome")
+    assert len(json.loads((tmp_path / "profile.json").read_text())["frames"]) == profiler.history
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert {"tick", "spawn"} <= {event["name"] for event in events} and all(event["dur"] >= 0 for event in events)
+
+
+def test_minimap(screen, assets) -> None:
+    world = World.generate(500)
+    world.tick_intervals = None
+    world.tick()
+    palette = Palette.from_images(world.generator.fields, assets.get_terrain, 2)
+    # The loaded images of the game look like the files.
+    assert np.array_equal(palette.tiles, Palette.load(world.generator.fields, 2).tiles)
+    minimap = Minimap(world, palette, radius=1)
+    view = SceneView(assets, hud=HUD(minimap=minimap), dirty_rendering=True)
+    scene = world.get_player_scene()
+    view.draw(screen, scene)
+    rect = screen.get_rect()
+    assert view.draw(screen, scene) == [pygame.Rect(rect.right - 3 * WIDTH * 2, 0, 3 * WIDTH * 2, 3 * HEIGHT * 2)]
+    assert world.player and world.player.position
+    x, y = world.player.position.coordinates
+    assert screen.get_at((rect.right - 3 * WIDTH * 2 + (x + WIDTH) * 2, (y + HEIGHT) * 2))[:3] == MINIMAP_PLAYER_COLOR
+    # The top left field of the scene to the right of the one of the player.
+    corner = rect.right - WIDTH * 2, HEIGHT * 2
+    field_id = world.get_scene((1, 0)).terrain[0, 0]
+    assert tuple(screen.get_at(corner)[:3]) == tuple(palette.tiles[field_id, 0, 0])
+
+
+def test_save_does_not_wait(screen, assets, tmp_path) -> None:
+    game = Game(screen, World.generate(500), SceneView(assets), save_path=tmp_path / "world.sav")
+    release = threading.Event()
+    snapshot = game.world.snapshot()
+    # Keeps the save thread busy like a long save.
+    game._saving = game._save_executor.submit(lambda: release.wait() and snapshot.write_temporary(game.save_path))
+    game.world.time += 1
+    game.save_game()
+    game.finish_save()
+    assert not game.save_path.exists()
+    release.set()
+    while game._saving and not game._saving.done():
+        release.wait(0.01)
+    game.finish_save()
+    first = World.load(game.save_path)
+    assert first.time == game.world.time - 1
+    first.close()
+    game.wait_for_save()
+    loaded = World.load(game.save_path)
+    assert loaded.time == game.world.time
+    loaded.close()
+    game.world.close()
+
+
+def test_fixed_timestep() -> None:
+    timestep = FixedTimestep(rate=8, max_ticks=3)
+    assert timestep.advance(100.) == 0
+    assert timestep.advance(100.3125) == 2 and timestep.alpha == 0.5
+    assert timestep.advance(100.375) == 1 and not timestep.behind
+    # After a long stall, the simulation only catches up max_ticks at a time and then goes on at its own pace.
+    assert timestep.advance(105.) == 3 and timestep.behind
+    assert timestep.advance(105.) == 3 and timestep.advance(105.) == 0 and not timestep.behind